@@ -0,0 +1,37 @@
+# app/api/health.py
+
+from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse
+from app.services.rule_set import get_rule_set
+
+router = APIRouter()
+
+
+@router.get("/health/live", include_in_schema=False)
+async def read_liveness() -> dict:
+    """
+    Report that the worker is running.
+
+    Returns:
+        dict: Always {"status": "alive"}.
+    """
+    return {"status": "alive"}
+
+
+@router.get("/health/ready", include_in_schema=False)
+async def read_readiness(request: Request) -> JSONResponse:
+    """
+    Report whether the worker should receive traffic.
+
+    The worker is ready once the database is bootstrapped and the rule set is loaded
+    and warmed up, and stops being ready as soon as it starts shutting down.
+
+    Args:
+        request (Request): The request, giving access to the application state.
+
+    Returns:
+        JSONResponse: 200 with the loaded rule set generation when ready, 503 otherwise.
+    """
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse({"status": "starting"}, status_code=503)
+    return JSONResponse({"status": "ready", "rule_set_version": get_rule_set().version})
@@ -0,0 +1,86 @@
+# app/api/metrics.py
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from app.api.v0.endpoints.transaction import (
+    cost_guard,
+    decision_cache,
+    metrics,
+    rule_executor,
+    shadow_evaluator,
+    velocity_store,
+)
+from app.db.pool import render_pool_metrics
+from app.db.session import get_pools
+
+router = APIRouter()
+
+# Decision cache counters exposed as Prometheus counters; the others are gauges
+DECISION_CACHE_COUNTERS = {
+    "hits",
+    "misses",
+    "evictions",
+    "expirations",
+    "invalidations",
+}
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def read_metrics() -> str:
+    """
+    Expose the metrics of this worker in the Prometheus text format.
+
+    Returns:
+        str: Sampled per-rule outcomes and evaluation times, sampled check-transaction
+        stage times, the decision cache counters, the size of the velocity store,
+        the shadow rule counters, the evaluation deadline misses and quarantines,
+        and the connection pool state.
+    """
+    lines = metrics.render()
+    for name, value in decision_cache.stats().items():
+        if name in DECISION_CACHE_COUNTERS:
+            metric, kind = f"rule_engine_decision_cache_{name}_total", "counter"
+        else:
+            metric, kind = f"rule_engine_decision_cache_{name}", "gauge"
+        lines += [f"# TYPE {metric} {kind}", f"{metric} {value}"]
+    for name, value in velocity_store.stats().items():
+        if name == "evictions":
+            metric, kind = "rule_engine_velocity_evictions_total", "counter"
+        else:
+            metric, kind = f"rule_engine_velocity_{name}", "gauge"
+        lines += [f"# TYPE {metric} {kind}", f"{metric} {value}"]
+    shadow = shadow_evaluator.stats()
+    lines += [
+        "# TYPE rule_engine_shadow_transactions_total counter",
+        f"rule_engine_shadow_transactions_total {shadow['transactions']}",
+        "# TYPE rule_engine_shadow_dropped_total counter",
+        f"rule_engine_shadow_dropped_total {shadow['dropped']}",
+        "# TYPE rule_engine_shadow_queued gauge",
+        f"rule_engine_shadow_queued {shadow['queued']}",
+        "# TYPE rule_engine_shadow_disagreements_total counter",
+    ]
+    lines += [
+        f'rule_engine_shadow_disagreements_total{{rule_id="{rule["rule_id"]}"}} '
+        f'{rule["disagreements"]}'
+        for rule in shadow["rules"]
+    ]
+    guard = cost_guard.stats()
+    lines += [
+        "# TYPE rule_engine_deadline_exceeded_total counter",
+        f"rule_engine_deadline_exceeded_total {guard['timeouts']}",
+        "# TYPE rule_engine_cost_guard_dropped_total counter",
+        f"rule_engine_cost_guard_dropped_total {guard['dropped']}",
+        "# TYPE rule_engine_quarantined_rules gauge",
+        f"rule_engine_quarantined_rules {len(guard['quarantined'])}",
+    ]
+    executor = rule_executor.stats()
+    lines += [
+        "# TYPE rule_engine_evaluations_abandoned gauge",
+        f"rule_engine_evaluations_abandoned {executor['abandoned']}",
+        "# TYPE rule_engine_evaluations_shed_total counter",
+        f"rule_engine_evaluations_shed_total {executor['shed']}",
+        "# TYPE rule_engine_worker_pool_recycles_total counter",
+        f"rule_engine_worker_pool_recycles_total {executor['recycled']}",
+    ]
+    lines += render_pool_metrics(get_pools())
+    return "\n".join(lines) + "\n"
@@ -1,10 +1,12 @@
 # app/api/v0/endpoints/__init__.py
 
 from fastapi import APIRouter
-from app.api.v0.endpoints import transaction, rules
+from app.api.v0.endpoints import backtests, lists, transaction, rules
 
 api_router = APIRouter()
 api_router.include_router(
     transaction.router, prefix="/transactions", tags=["transactions"]
 )
 api_router.include_router(rules.router, prefix="/rules", tags=["rules"])
+api_router.include_router(lists.router, prefix="/lists", tags=["lists"])
+api_router.include_router(backtests.router, prefix="/backtests", tags=["backtests"])
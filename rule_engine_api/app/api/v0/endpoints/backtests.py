@@ -0,0 +1,118 @@
+# app/api/v0/endpoints/backtests.py
+
+import asyncio
+import logging
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.v0.endpoints.rules import check_rules_compile
+from app.core.config import settings
+from app.db import async_crud
+from app.db.session import ReadSessionLocal, get_async_read_db
+from app.schemas.backtest import BacktestCreate, BacktestJob
+from app.services.backtest import (
+    BacktestError,
+    BacktestJobs,
+    BacktestQueueFullError,
+    rule_definitions,
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Backtests started through this worker, replaying transactions from the replica
+backtest_jobs = BacktestJobs(
+    ReadSessionLocal,
+    max_jobs=settings.backtest_max_jobs,
+    chunk_size=settings.backtest_chunk_size,
+    workers=settings.backtest_workers,
+)
+
+
+@router.post("/", response_model=BacktestJob, status_code=202)
+async def create_backtest(
+    backtest: BacktestCreate, db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Start replaying stored transactions against proposed rules, in the background.
+
+    Args:
+        backtest (BacktestCreate): The proposed rules, or none to replay the stored
+            rules, and the range of transactions to replay.
+        db (AsyncSession, optional): SQLAlchemy async session on the read replica. Defaults to Depends(get_async_read_db).
+
+    Returns:
+        BacktestJob: The job, whose progress and report are read by its ID.
+
+    Raises:
+        HTTPException: 422 if a rule does not compile or cannot be backtested, 503 if
+            `BACKTEST_MAX_JOBS` backtests are unfinished.
+    """
+    if backtest.rules is not None:
+        await asyncio.to_thread(check_rules_compile, backtest.rules)
+        rules = backtest.rules
+    else:
+        rules = await async_crud.get_rules_(db)
+    try:
+        job = backtest_jobs.submit(
+            rule_definitions(rules), backtest.start_id, backtest.end_id
+        )
+    except BacktestError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except BacktestQueueFullError as e:
+        logger.error("Backtest not queued: %s", e)
+        raise HTTPException(status_code=503, detail=str(e))
+    logger.info("Backtest %s of %s rules submitted", job.id, len(job.rules))
+    return job
+
+
+@router.get("/", response_model=List[BacktestJob])
+async def read_backtests():
+    """
+    List the backtests started through this worker.
+
+    Returns:
+        List[BacktestJob]: The jobs, oldest first.
+    """
+    return backtest_jobs.jobs()
+
+
+@router.get("/{job_id}", response_model=BacktestJob)
+async def read_backtest(job_id: str):
+    """
+    Read the progress, and once done the report, of a backtest.
+
+    Args:
+        job_id (str): The ID of the job.
+
+    Returns:
+        BacktestJob: The job.
+
+    Raises:
+        HTTPException: 404 if the job is unknown to this worker.
+    """
+    job = backtest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Backtest not found")
+    return job
+
+
+@router.delete("/{job_id}", response_model=BacktestJob)
+async def cancel_backtest(job_id: str):
+    """
+    Cancel a backtest; a running one stops before its next chunk of transactions.
+
+    Args:
+        job_id (str): The ID of the job.
+
+    Returns:
+        BacktestJob: The job.
+
+    Raises:
+        HTTPException: 404 if the job is unknown to this worker.
+    """
+    job = backtest_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Backtest not found")
+    return job
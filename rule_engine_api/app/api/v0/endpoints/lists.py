@@ -0,0 +1,162 @@
+# app/api/v0/endpoints/lists.py
+
+import logging
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db import async_crud
+from app.db.session import get_async_db
+from app.schemas.named_list import (
+    NamedList,
+    NamedListCreate,
+    NamedListUpdate,
+    NamedListUpdateResult,
+)
+from app.services.named_lists import normalize, registry
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def normalize_values(kind: str, values: List[str]) -> List[str]:
+    """
+    Normalize the values of a change to a named list, dropping duplicates.
+
+    Args:
+        kind (str): The kind of the list.
+        values (List[str]): The values to add or remove.
+
+    Returns:
+        List[str]: The distinct normalized values, in order.
+
+    Raises:
+        HTTPException: 422 if any of the values is not valid for the list.
+    """
+    normalized = {}
+    for value in values:
+        try:
+            normalized[normalize(kind, value)] = None
+        except ValueError as e:
+            raise HTTPException(
+                status_code=422, detail=f"Invalid {kind} value '{value}': {e}"
+            )
+    return list(normalized)
+
+
+@router.post("/", response_model=NamedList, status_code=201)
+async def create_list(
+    named_list: NamedListCreate, db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Create an empty named list.
+
+    Args:
+        named_list (NamedListCreate): The name and kind of the list.
+        db (AsyncSession, optional): SQLAlchemy async database session. Defaults to Depends(get_async_db).
+
+    Returns:
+        NamedList: The created list.
+
+    Raises:
+        HTTPException: 409 if a list with that name exists.
+    """
+    created = await async_crud.create_named_list(db, named_list.name, named_list.kind)
+    if created is None:
+        raise HTTPException(status_code=409, detail="List already exists")
+    await registry.refresh(db)
+    logger.info("List '%s' created", created.name)
+    return NamedList(name=created.name, kind=created.kind, size=0)
+
+
+@router.get("/", response_model=List[NamedList])
+async def read_lists():
+    """
+    Describe the named lists loaded by this worker.
+
+    Returns:
+        List[NamedList]: The name, kind and size of each list.
+    """
+    return [
+        NamedList(name=name, kind=kind, size=size)
+        for name, kind, size in registry.describe()
+    ]
+
+
+@router.get("/{name}/contains")
+async def list_contains(name: str, value: str):
+    """
+    Look a value up in a named list, as rules do.
+
+    Args:
+        name (str): The name of the list.
+        value (str): The value to look up.
+
+    Returns:
+        dict: Whether the value matches the list.
+
+    Raises:
+        HTTPException: 404 if the list does not exist.
+    """
+    try:
+        return {"list": name, "value": value, "match": registry.contains(name, value)}
+    except LookupError:
+        raise HTTPException(status_code=404, detail="List not found")
+
+
+@router.post("/{name}/entries", response_model=NamedListUpdateResult)
+async def update_list_entries(
+    name: str, update: NamedListUpdate, db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Add and remove values of a named list.
+
+    Only the changed values are sent to the workers, which update their indexes in
+    place instead of reloading the list.
+
+    Args:
+        name (str): The name of the list.
+        update (NamedListUpdate): The values to add and remove.
+        db (AsyncSession, optional): SQLAlchemy async database session. Defaults to Depends(get_async_db).
+
+    Returns:
+        NamedListUpdateResult: The number of values added and removed.
+
+    Raises:
+        HTTPException: 404 if the list does not exist, 422 if a value is not valid.
+    """
+    db_list = await async_crud.get_named_list(db, name)
+    if db_list is None:
+        raise HTTPException(status_code=404, detail="List not found")
+    add = normalize_values(db_list.kind, update.add)
+    remove = normalize_values(db_list.kind, update.remove)
+    added, removed = await async_crud.update_named_list_entries(
+        db, db_list, add, remove, keep_changes=settings.named_list_changes_retention
+    )
+    await registry.refresh(db)
+    logger.info("List '%s': %s values added, %s removed", name, added, removed)
+    return NamedListUpdateResult(
+        added=added, removed=removed, revision=registry.revision
+    )
+
+
+@router.delete("/{name}", status_code=204)
+async def delete_list(name: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    Delete a named list and its values.
+
+    Rules that look values up in a deleted list fail until it is created again.
+
+    Args:
+        name (str): The name of the list.
+        db (AsyncSession, optional): SQLAlchemy async database session. Defaults to Depends(get_async_db).
+
+    Raises:
+        HTTPException: 404 if the list does not exist.
+    """
+    if await async_crud.delete_named_list(db, name) is None:
+        raise HTTPException(status_code=404, detail="List not found")
+    await registry.refresh(db)
+    logger.info("List '%s' deleted", name)
+    return Response(status_code=204)
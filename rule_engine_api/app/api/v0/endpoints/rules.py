@@ -1,9 +1,15 @@
-from typing import List, Union
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.db.session import SessionLocal
-from app.db import crud
+import asyncio
+from typing import List, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.db.session import AsyncReadSessionLocal, get_async_db, get_async_read_db
+from app.db import async_crud
 from app.schemas.rule import Rule, RuleCreate, RuleUpdate
+from app.services.rule_compiler import RuleCompileError, validate_rule
+from app.services.rule_cost import check_rule_cost
+from app.services.rule_set import refresh_rule_set
 import logging
 
 # Configure logging
@@ -18,112 +24,268 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+def check_rules_compile(rules: List[RuleCreate]):
+    """
+    Reject rules that do not compile, or whose estimated cost is too high.
+
+    Args:
+        rules (List[RuleCreate]): The rules to check.
+
+    Raises:
+        HTTPException: 422 if any of the rules does not compile, has an operation whose
+            cost has no fixed bound, or costs more than `MAX_RULE_COST`.
+    """
+    for rule in rules:
+        try:
+            check_rule_cost(
+                validate_rule(rule.rule, rule.scope), settings.max_rule_cost
+            )
+        except RuleCompileError as e:
+            logger.error("Invalid rule '%s': %s", rule.description, e)
+            raise HTTPException(
+                status_code=422, detail=f"Invalid rule '{rule.description}': {e}"
+            )
 
 
 @router.post("/", response_model=Union[Rule, List[Rule]])
-def create_new_rule(
-    rules: Union[RuleCreate, List[RuleCreate]], db: Session = Depends(get_db)
+async def create_new_rule(
+    rules: Union[RuleCreate, List[RuleCreate]], db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a new rule or multiple rules.
 
     Args:
         rules (Union[RuleCreate, List[RuleCreate]]): A single rule or a list of rules to create.
-        db (Session, optional): SQLAlchemy database session. Defaults to Depends(get_db).
+        db (AsyncSession, optional): SQLAlchemy async database session. Defaults to Depends(get_async_db).
 
     Returns:
         Union[Rule, List[Rule]]: The created rule(s).
     """
     logger.info("Creating new rule(s)")
+    # Folding constants may take a while: keep the event loop free meanwhile
+    await asyncio.to_thread(
+        check_rules_compile, rules if isinstance(rules, list) else [rules]
+    )
     if isinstance(rules, list):
-        created_rules = crud.create_multiple_rules(db, rules)
+        created_rules = await async_crud.create_multiple_rules(db, rules)
+        await refresh_rule_set(db)
         logger.info("Multiple rules created successfully")
         return created_rules
     else:
-        created_rule = crud.create_rule(db, rules)
+        created_rule = await async_crud.create_rule(db, rules)
+        await refresh_rule_set(db)
         logger.info("Rule created successfully")
         return created_rule
 
 
+# Media type of the NDJSON rule export
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def rules_etag(generation: int, variant: str) -> str:
+    """
+    Build the entity tag of a rules API response.
+
+    Every rule change bumps the generation, so responses with the same tag have the
+    same content.
+
+    Args:
+        generation (int): The rule set generation stored in the database.
+        variant (str): Which rules the response holds, e.g. the page parameters.
+
+    Returns:
+        str: The quoted entity tag.
+    """
+    return f'"rules-{generation}-{variant}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Whether the If-None-Match header of a request lists an entity tag.
+
+    Args:
+        request (Request): The request.
+        etag (str): The entity tag.
+
+    Returns:
+        bool: True if the client already has the content tagged `etag`.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # Weak comparison, as required for If-None-Match
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in tags or "*" in tags
+
+
+@router.get(
+    "/export",
+    response_class=StreamingResponse,
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
+)
+async def export_rules(request: Request):
+    """
+    Stream every rule as NDJSON, one rule per line, ordered by ID.
+
+    Rules are fetched from the read replica in batches, so the export does not hold
+    the whole rule set in memory. Supports If-None-Match like `read_rules`.
+
+    Args:
+        request (Request): The request.
+
+    Returns:
+        StreamingResponse: The rules, with the ETag of their generation.
+    """
+    # The session outlives this function, until the last rule is sent
+    db = AsyncReadSessionLocal()
+    try:
+        # Read before the rules: a change committed in between then gets a new tag
+        etag = rules_etag(await async_crud.get_rule_set_generation(db), "export")
+    except BaseException:
+        await db.close()
+        raise
+    if etag_matches(request, etag):
+        await db.close()
+        return Response(status_code=304, headers={"ETag": etag})
+
+    async def lines():
+        try:
+            async for rule in async_crud.stream_rules(db):
+                yield Rule.model_validate(rule).model_dump_json() + "\n"
+        finally:
+            await db.close()
+
+    logger.info("Exporting rules")
+    return StreamingResponse(
+        lines(), media_type=NDJSON_MEDIA_TYPE, headers={"ETag": etag}
+    )
+
+
 @router.get("/{rule_id}", response_model=Rule)
-def read_rule(rule_id: int, db: Session = Depends(get_db)):
+async def read_rule(rule_id: int, db: AsyncSession = Depends(get_async_read_db)):
     """
     Read a rule by its ID.
 
     Args:
         rule_id (int): The ID of the rule to read.
-        db (Session, optional): SQLAlchemy database session. Defaults to Depends(get_db).
+        db (AsyncSession, optional): SQLAlchemy async session on the read replica. Defaults to Depends(get_async_read_db).
 
     Returns:
         Rule: The rule with the specified ID.
     """
     logger.info("Reading rule with ID: %s", rule_id)
-    db_rule = crud.get_rule(db, rule_id)
+    db_rule = await async_crud.get_rule(db, rule_id)
     if db_rule is None:
         raise HTTPException(status_code=404, detail="Rule not found")
     return db_rule
 
 
 @router.get("/", response_model=List[Rule])
-def read_rules(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+async def read_rules(
+    request: Request,
+    response: Response,
+    skip: int = 0,
+    limit: int = 10,
+    after: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
     """
     Read multiple rules with pagination.
 
+    Pages are ordered by ID. Pass the ID of the last rule of a page as `after` to get
+    the next one; its URL is also given by the Link header of full pages. Responses
+    carry an ETag of the rule set generation in the database and of the page, and an
+    If-None-Match request for an unchanged page is answered 304 without reading the
+    rules.
+
     Args:
+        request (Request): The request.
+        response (Response): The response, to set its headers.
         skip (int, optional): Number of records to skip. Defaults to 0.
         limit (int, optional): Maximum number of records to return. Defaults to 10.
-        db (Session, optional): SQLAlchemy database session. Defaults to Depends(get_db).
+        after (int, optional): Only return rules with a greater ID. Defaults to None.
+        db (AsyncSession, optional): SQLAlchemy async session on the read replica. Defaults to Depends(get_async_read_db).
 
     Returns:
         List[Rule]: List of rules.
     """
-    logger.info("Reading rules with skip=%s and limit=%s", skip, limit)
-    rules = crud.get_rules(db, skip=skip, limit=limit)
+    logger.info("Reading rules with skip=%s, limit=%s and after=%s", skip, limit, after)
+    # Read before the rules: a change committed in between then gets a new tag
+    etag = rules_etag(
+        await async_crud.get_rule_set_generation(db),
+        f"skip={skip}&limit={limit}&after={'' if after is None else after}",
+    )
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    rules = await async_crud.get_rules(db, skip=skip, limit=limit, after=after)
+
+    response.headers["ETag"] = etag
+    if rules and len(rules) == limit:
+        next_url = request.url.remove_query_params("skip").include_query_params(
+            after=rules[-1].id
+        )
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
     return rules
 
+
 @router.put("/{rule_id}", response_model=Rule)
-def update_existing_rule(rule_id: int, rule: RuleUpdate, db: Session = Depends(get_db)):
+async def update_existing_rule(
+    rule_id: int, rule: RuleUpdate, db: AsyncSession = Depends(get_async_db)
+):
     """
     Update an existing rule by its ID.
 
     Args:
         rule_id (int): The ID of the rule to update.
-        rule (RuleUpdate): The rule data to update.
-        db (Session, optional): SQLAlchemy database session. Defaults to Depends(get_db).
+        rule (RuleUpdate): The rule data to update; fields not given are kept.
+        db (AsyncSession, optional): SQLAlchemy async database session. Defaults to Depends(get_async_db).
 
     Returns:
         Rule: The updated rule.
+
+    Raises:
+        HTTPException: 404 if the rule does not exist, 422 if the updated rule does not
+            compile.
     """
     logger.info("Updating rule with ID: %s", rule_id)
-    db_rule = crud.update_rule(db, rule_id, rule)
+    db_rule = await async_crud.get_rule(db, rule_id)
+    if db_rule is None:
+        logger.error("Rule not found with ID: %s", rule_id)
+        raise HTTPException(status_code=404, detail="Rule not found")
+    # Check the rule as it will be stored, with the fields not given unchanged
+    updated = RuleCreate(
+        description=db_rule.description,
+        rule=db_rule.rule,
+        scope=db_rule.scope,
+        status=db_rule.status,
+    ).model_copy(update=rule.model_dump(exclude_unset=True))
+    await asyncio.to_thread(check_rules_compile, [updated])
+    db_rule = await async_crud.update_rule(db, rule_id, rule)
     if db_rule is None:
         logger.error("Rule not found with ID: %s", rule_id)
         raise HTTPException(status_code=404, detail="Rule not found")
+    await refresh_rule_set(db)
     logger.info("Rule updated successfully")
     return db_rule
 
+
 @router.delete("/{rule_id}", response_model=Rule)
-def delete_existing_rule(rule_id: int, db: Session = Depends(get_db)):
+async def delete_existing_rule(rule_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Delete an existing rule by its ID.
 
     Args:
         rule_id (int): The ID of the rule to delete.
-        db (Session, optional): SQLAlchemy database session. Defaults to Depends(get_db).
+        db (AsyncSession, optional): SQLAlchemy async database session. Defaults to Depends(get_async_db).
 
     Returns:
         Rule: The deleted rule.
     """
     logger.info("Deleting rule with ID: %s", rule_id)
-    db_rule = crud.delete_rule(db, rule_id)
+    db_rule = await async_crud.delete_rule(db, rule_id)
     if db_rule is None:
         logger.error("Rule not found with ID: %s", rule_id)
         raise HTTPException(status_code=404, detail="Rule not found")
+    await refresh_rule_set(db)
     logger.info("Rule deleted successfully")
     return db_rule
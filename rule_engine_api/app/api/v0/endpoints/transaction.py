@@ -1,12 +1,40 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.db.session import SessionLocal
-from app.db import crud
-from app.schemas.transaction import TransactionCreate
-from app.services.rule_engine import apply_rules
+from typing import Dict, List, Literal, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter, ValidationError
+from pydantic_core import to_json
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.session import AsyncSessionLocal, get_async_db, get_async_read_db
+from app.db import async_crud
+from app.schemas.ingestion import BulkIngestionResponse, ChunkResult
+from app.schemas.transaction import TransactionCreate, TransactionRecord
+from app.core.config import settings
+from app.services.batch_engine import apply_rule_set_batch
+from app.services.cost_guard import CostGuard
+from app.services.decision_cache import DecisionCache
+from app.services.ingestion import (
+    IngestionError,
+    InvalidRecord,
+    deduplicate,
+    iter_chunks,
+    iter_json_array,
+    iter_ndjson,
+)
+from app.services.metrics import Metrics
+from app.services.named_lists import registry
+from app.services.rule_executor import DeadlineExceeded, RuleExecutor
+from app.services.rule_set import RuleSet, get_or_load_rule_set, get_rule_set
+from app.services.shadow import ShadowEvaluator
+from app.services.velocity import VelocityStore
+from app.services.write_behind import ACK_FLUSH, QueueFullError, TransactionWriter
 from app.schemas.responses import StandardResponse
 import asyncio
+import email.message
+import json
+import time
 
 # Configure logging
 logging.basicConfig(
@@ -18,61 +46,766 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Decisions of this worker, keyed on the fields the rules read
+decision_cache = DecisionCache(
+    max_entries=settings.decision_cache_max_entries,
+    max_bytes=settings.decision_cache_max_bytes,
+    ttl=settings.decision_cache_ttl,
+)
+
+# Sampled timings of this worker, exposed on /metrics
+metrics = Metrics(sample_rate=settings.metrics_sample_rate)
+
+# Backend evaluating the rules of check-transaction
+rule_executor = RuleExecutor(
+    settings.rule_executor,
+    max_workers=settings.rule_executor_workers,
+    max_abandoned=settings.evaluation_max_abandoned,
+)
+
+# Sliding-window velocity aggregates, fed by check-transaction and save-transaction
+velocity_store = VelocityStore(
+    max_keys=settings.velocity_max_keys, buckets=settings.velocity_buckets
+)
+
+# Write-behind queue of save-transaction, used when enabled
+transaction_writer = TransactionWriter(
+    AsyncSessionLocal,
+    batch_size=settings.write_behind_batch_size,
+    flush_interval=settings.write_behind_flush_interval,
+    max_queue_size=settings.write_behind_queue_size,
+    enqueue_timeout=settings.write_behind_enqueue_timeout,
+    stop_timeout=settings.write_behind_stop_timeout,
+)
+
+# Background evaluation of shadow rules, after the responses
+shadow_evaluator = ShadowEvaluator(
+    max_queue_size=settings.shadow_queue_size, batch_size=settings.shadow_batch_size
+)
+
+# Quarantine of the rules that repeatedly run over their time budget
+cost_guard = CostGuard(
+    AsyncSessionLocal,
+    rule_budget_ms=settings.rule_budget_ms,
+    quarantine_strikes=settings.quarantine_strikes,
+    max_queue_size=settings.cost_guard_queue_size,
+    replay_timeout_ms=settings.cost_guard_replay_timeout_ms,
+)
+
+# Content types of newline-delimited JSON bodies
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/jsonl"}
+
+# Errors reported per chunk of a bulk ingestion
+MAX_CHUNK_ERRORS = 10
+
+
+def with_features(transaction: dict, rule_set: RuleSet) -> dict:
+    """
+    Record a transaction in the velocity windows, then return it with the velocity
+    features and list lookups of the rule set.
+
+    Args:
+        transaction (dict): Dictionary containing transaction data.
+        rule_set (RuleSet): The rule set the transaction is checked against.
+
+    Returns:
+        dict: The transaction, extended with one field per feature and lookup.
+    """
+    values = velocity_store.observe(transaction, rule_set.features)
+    return registry.resolve(values, rule_set.lookups)
+
+
+def build_response(check: Dict[str, Union[bool, str]]) -> StandardResponse:
+    """
+    Build the response for the evaluation result of a transaction.
+
+    Args:
+        check (dict): The evaluation result with 'has_succeeded' flag and 'message',
+            and a 'fallback' flag if it is the fallback decision.
+
+    Returns:
+        StandardResponse: Standardized response containing status information.
+    """
+    fallback = check.get("fallback")
+    if check["has_succeeded"]:
+        return StandardResponse(
+            status="approved",
+            status_code=200,
+            message="Transaction approved",
+            fallback=fallback,
+        )
+    rejection_message = f"Transaction rejected: {check['message']}"
+    return StandardResponse(
+        status="rejected",
+        status_code=400,
+        message=rejection_message,
+        fallback=fallback,
+    )
+
+
+# Message of the fallback decisions
+DEADLINE_MESSAGE = "Rule evaluation deadline exceeded"
+
+
+def fallback_check() -> Dict[str, Union[bool, str]]:
+    """
+    Return the decision used when the rules could not be evaluated in time.
+
+    Returns:
+        dict: The configured fallback decision, flagged as such.
+    """
+    return {
+        "has_succeeded": settings.evaluation_fallback == "approve",
+        "message": DEADLINE_MESSAGE,
+        "fallback": True,
+    }
+
+
+def evaluation_deadline() -> Optional[float]:
+    """
+    Return the seconds the rules of a transaction may take, or None without deadline.
+    """
+    deadline = settings.evaluation_deadline_ms / 1000
+    return deadline if deadline > 0 else None
+
+
+# The approved response never changes, so it is encoded once
+APPROVED_RESPONSE = (
+    build_response({"has_succeeded": True, "message": ""})
+    .model_dump_json(exclude_none=True)
+    .encode()
+)
+
+# Encoded rejected response, up to its message
+REJECTED_RESPONSE_PREFIX = b'{"status":"rejected","status_code":400,"message":'
+
 
-def get_db():
-    db = SessionLocal()
+def encode_response(check: Dict[str, Union[bool, str]]) -> bytes:
+    """
+    Encode the response for the evaluation result of a transaction.
+
+    The result is the JSON of `build_response(check)`, without building the model,
+    and without the 'fallback' flag unless it is set.
+
+    Args:
+        check (dict): The evaluation result with 'has_succeeded' flag and 'message'.
+
+    Returns:
+        bytes: The JSON response body.
+    """
+    if "fallback" in check:
+        return build_response(check).model_dump_json(exclude_none=True).encode()
+    if check["has_succeeded"]:
+        return APPROVED_RESPONSE
+    message = to_json(f"Transaction rejected: {check['message']}")
+    return REJECTED_RESPONSE_PREFIX + message + b"}"
+
+
+def is_json(request: Request) -> bool:
+    """
+    Whether FastAPI would parse the body of a request as JSON.
+
+    Args:
+        request (Request): The request.
+
+    Returns:
+        bool: True for application/json and application/*+json content types.
+    """
+    content_type = request.headers.get("content-type")
+    if not content_type:
+        return False
+    message = email.message.Message()
+    message["content-type"] = content_type
+    subtype = message.get_content_subtype()
+    return message.get_content_maintype() == "application" and (
+        subtype == "json" or subtype.endswith("+json")
+    )
+
+
+async def parse_body(
+    request: Request, adapter: TypeAdapter, model_adapter: TypeAdapter
+):
+    """
+    Validate a JSON request body straight into plain transaction records.
+
+    Args:
+        request (Request): The request.
+        adapter (TypeAdapter): Validates the body into TransactionRecords.
+        model_adapter (TypeAdapter): Validates it into TransactionCreate models, the
+            way FastAPI does, to report the same errors.
+
+    Returns:
+        The validated record, or list of records.
+
+    Raises:
+        RequestValidationError: With the errors FastAPI reports for the same request.
+    """
+    body = await request.body()
+    json_content = is_json(request)
+    if body and json_content:
+        try:
+            return adapter.validate_json(body)
+        except ValidationError:
+            pass
+
+    # Invalid requests only: validate again as FastAPI does, for identical errors
+    if not body:
+        raise RequestValidationError(
+            [
+                {
+                    "type": "missing",
+                    "loc": ("body",),
+                    "msg": "Field required",
+                    "input": None,
+                }
+            ]
+        )
+    if json_content:
+        try:
+            body = json.loads(body)
+        except json.JSONDecodeError as e:
+            raise RequestValidationError(
+                [
+                    {
+                        "type": "json_invalid",
+                        "loc": ("body", e.pos),
+                        "msg": "JSON decode error",
+                        "input": {},
+                        "ctx": {"error": e.msg},
+                    }
+                ]
+            )
     try:
-        yield db
-    finally:
-        db.close()
+        model_adapter.validate_python(body, from_attributes=True)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [
+                {**error, "loc": ("body", *error["loc"])}
+                for error in e.errors(include_url=False)
+            ]
+        )
+    # Not expected: the two validations accept the same bodies
+    return adapter.validate_python(body)
+
+
+transaction_adapter = TypeAdapter(TransactionRecord)
+transactions_adapter = TypeAdapter(List[TransactionRecord])
+transaction_model_adapter = TypeAdapter(TransactionCreate)
+transactions_model_adapter = TypeAdapter(List[TransactionCreate])
+
+
+async def run_check(
+    transaction_dict: dict, mode: Optional[str], db: AsyncSession, sampled: bool
+) -> Response:
+    """
+    Check a validated transaction and build the response.
+
+    Args:
+        transaction_dict (dict): Dictionary containing transaction data.
+        mode (str, optional): The evaluation mode, or None for the configured one.
+        db (AsyncSession): SQLAlchemy async database session.
+        sampled (bool): Whether to record the timings of this request.
+
+    Returns:
+        Response: The encoded StandardResponse.
+    """
+    start = time.perf_counter() if sampled else 0.0
+    rule_set = await get_or_load_rule_set(db)
+    if sampled:
+        loaded = time.perf_counter()
+        metrics.record_stage("rule_set", loaded - start)
+
+    # Velocity features and list lookups become fields, so they are part of the cache
+    # key too
+    values = with_features(transaction_dict, rule_set)
+    mode = mode or settings.rule_evaluation_mode
+    check = None
+    if settings.decision_cache_enabled:
+        cache_key = decision_cache.key(rule_set, values, mode)
+        check = decision_cache.get(cache_key)
+
+    if check is None:
+        observations = [] if sampled else None
+        try:
+            check = await rule_executor.evaluate(
+                values, rule_set, mode, observations, evaluation_deadline()
+            )
+        except DeadlineExceeded as e:
+            logger.warning("%s, using the fallback", e)
+            check = fallback_check()
+            cost_guard.submit(rule_set, [values])
+        else:
+            if settings.decision_cache_enabled:
+                decision_cache.put(cache_key, check)
+            if sampled:
+                metrics.record_rules(observations)
+                cost_guard.observe(rule_set, observations)
+    if sampled:
+        evaluated = time.perf_counter()
+        metrics.record_stage("evaluation", evaluated - loaded)
+
+    if check["has_succeeded"]:
+        logger.info("Transaction approved: %s", transaction_dict)
+    else:
+        logger.info("Transaction rejected: %s", transaction_dict)
+    if "fallback" not in check:
+        shadow_evaluator.submit(rule_set, (values,), (check["has_succeeded"],))
+
+    if sampled:
+        logged = time.perf_counter()
+    response = Response(content=encode_response(check), media_type="application/json")
+    if sampled:
+        metrics.record_stage("serialization", time.perf_counter() - logged)
+    return response
 
 
-@router.post("/check-transaction", response_model=StandardResponse)
 async def check_transaction(
-    transaction: TransactionCreate, db: Session = Depends(get_db)
+    transaction: TransactionCreate,
+    mode: Optional[Literal["full", "fail_fast"]] = None,
+    db: AsyncSession = Depends(get_async_read_db),
 ):
     """
     Check a transaction against rules and return approval status.
 
     Args:
         transaction (TransactionCreate): The transaction to check.
-        db (Session, optional): SQLAlchemy database session. Defaults to Depends(get_db).
+        mode (str, optional): "full" to report every failing rule, or "fail_fast" to stop
+            at the first one. Defaults to the configured rule evaluation mode.
+        db (AsyncSession, optional): SQLAlchemy async session on the read replica. Defaults to Depends(get_async_read_db).
 
     Returns:
         StandardResponse: Standardized response containing status information.
     """
-    rules = crud.get_rules(db)
-    transaction_dict = transaction.dict()
+    # Time the stages of a sample of the requests
+    sampled = metrics.sample()
+    start = time.perf_counter() if sampled else 0.0
+    response = await run_check(transaction.model_dump(), mode, db, sampled)
+    if sampled:
+        metrics.record_stage("total", time.perf_counter() - start)
+    return response
 
-    # Async rule evaluation
-    loop = asyncio.get_event_loop()
-    check = await loop.run_in_executor(None, apply_rules, transaction_dict, rules)
 
-    if check["has_succeeded"]:
-        logger.info("Transaction approved: %s", transaction_dict)
-        return StandardResponse(
-            status="approved", status_code=200, message="Transaction approved"
+async def check_transaction_fast(
+    request: Request,
+    mode: Optional[Literal["full", "fail_fast"]] = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    """
+    Check a transaction against rules and return approval status.
+
+    Same as `check_transaction`, but the body is validated straight from JSON into a
+    plain dictionary, without building a TransactionCreate model.
+
+    Args:
+        request (Request): The request, whose body is the transaction to check.
+        mode (str, optional): "full" to report every failing rule, or "fail_fast" to stop
+            at the first one. Defaults to the configured rule evaluation mode.
+        db (AsyncSession, optional): SQLAlchemy async session on the read replica. Defaults to Depends(get_async_read_db).
+
+    Returns:
+        StandardResponse: Standardized response containing status information.
+    """
+    sampled = metrics.sample()
+    start = time.perf_counter() if sampled else 0.0
+    transaction_dict = await parse_body(
+        request, transaction_adapter, transaction_model_adapter
+    )
+    if sampled:
+        metrics.record_stage("parsing", time.perf_counter() - start)
+    response = await run_check(transaction_dict, mode, db, sampled)
+    if sampled:
+        metrics.record_stage("total", time.perf_counter() - start)
+    return response
+
+
+async def check_batch(
+    transaction_dicts: List[dict], rule_set: RuleSet
+) -> List[Dict[str, Union[bool, str]]]:
+    """
+    Evaluate a batch of transactions on a thread, chunk by chunk, within the
+    evaluation deadline of each of its transactions and that of the whole batch.
+
+    Args:
+        transaction_dicts (List[dict]): The transactions, with their features.
+        rule_set (RuleSet): The rule set snapshot to apply.
+
+    Returns:
+        List[dict]: The evaluation result of each transaction, or the fallback
+        decision for those not evaluated when the deadline passed.
+    """
+    deadline = evaluation_deadline()
+    if deadline is None:
+        return await rule_executor.run_in_thread(
+            apply_rule_set_batch, transaction_dicts, rule_set
         )
-    else:
-        rejection_message = f"Transaction rejected: {check['message']}"
-        logger.info("Transaction rejected: %s", transaction_dict)
-        return StandardResponse(
-            status="rejected", status_code=400, message=rejection_message
+    loop = asyncio.get_running_loop()
+    end = loop.time() + min(
+        deadline * len(transaction_dicts),
+        settings.evaluation_batch_deadline_ms / 1000,
+    )
+    checks = []
+    size = settings.evaluation_batch_chunk_size
+    for start in range(0, len(transaction_dicts), size):
+        remaining = end - loop.time()
+        try:
+            if remaining <= 0:
+                raise DeadlineExceeded("Batch evaluation deadline exceeded")
+            checks += await rule_executor.run_in_thread(
+                apply_rule_set_batch,
+                transaction_dicts[start : start + size],
+                rule_set,
+                timeout=remaining,
+            )
+        except DeadlineExceeded as e:
+            unchecked = transaction_dicts[start:]
+            logger.warning(
+                "%s, using the fallback for %s transactions", e, len(unchecked)
+            )
+            cost_guard.submit(rule_set, unchecked)
+            return checks + [fallback_check() for _ in unchecked]
+    return checks
+
+
+def batch_response(
+    checks: List[Dict[str, Union[bool, str]]],
+    transaction_dicts: List[dict],
+    rule_set: RuleSet,
+) -> Response:
+    decisions = [check["has_succeeded"] for check in checks]
+    # The fallback decisions, at the end of the batch, are not passed to the shadow rules
+    evaluated = sum("fallback" not in check for check in checks)
+    if evaluated:
+        shadow_evaluator.submit(
+            rule_set, transaction_dicts[:evaluated], decisions[:evaluated]
         )
+    approved = sum(decisions)
+    logger.info(
+        "Batch checked: %s approved, %s rejected", approved, len(checks) - approved
+    )
+    content = b"[" + b",".join(encode_response(check) for check in checks) + b"]"
+    return Response(content=content, media_type="application/json")
+
+
+async def check_transactions(
+    transactions: List[TransactionCreate], db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Check a batch of transactions against rules and return their approval status.
+
+    Simple comparison and string rules are evaluated over the whole batch at once; the
+    results are the same as checking each transaction on its own.
+
+    Args:
+        transactions (List[TransactionCreate]): The transactions to check.
+        db (AsyncSession, optional): SQLAlchemy async session on the read replica. Defaults to Depends(get_async_read_db).
+
+    Returns:
+        List[StandardResponse]: One standardized response per transaction, in order.
+    """
+    rule_set = await get_or_load_rule_set(db)
+    transaction_dicts = [
+        with_features(transaction.model_dump(), rule_set)
+        for transaction in transactions
+    ]
+
+    checks = await check_batch(transaction_dicts, rule_set)
+    return batch_response(checks, transaction_dicts, rule_set)
+
+
+async def check_transactions_fast(
+    request: Request, db: AsyncSession = Depends(get_async_read_db)
+):
+    """
+    Check a batch of transactions against rules and return their approval status.
+
+    Same as `check_transactions`, but the body is validated straight from JSON into
+    plain dictionaries, without building TransactionCreate models.
+
+    Args:
+        request (Request): The request, whose body is the list of transactions.
+        db (AsyncSession, optional): SQLAlchemy async session on the read replica. Defaults to Depends(get_async_read_db).
+
+    Returns:
+        List[StandardResponse]: One standardized response per transaction, in order.
+    """
+    transaction_dicts = await parse_body(
+        request, transactions_adapter, transactions_model_adapter
+    )
+    rule_set = await get_or_load_rule_set(db)
+    transaction_dicts = [
+        with_features(transaction, rule_set) for transaction in transaction_dicts
+    ]
+
+    checks = await check_batch(transaction_dicts, rule_set)
+    return batch_response(checks, transaction_dicts, rule_set)
+
+
+def transaction_body_schema(schema: dict) -> dict:
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": schema}},
+        }
+    }
+
+
+# The fast path reads the body itself, so its schema is declared explicitly
+TRANSACTION_SCHEMA = {"$ref": "#/components/schemas/TransactionCreate"}
+if settings.fast_path_enabled:
+    router.add_api_route(
+        "/check-transaction",
+        check_transaction_fast,
+        methods=["POST"],
+        response_model=StandardResponse,
+        openapi_extra=transaction_body_schema(TRANSACTION_SCHEMA),
+    )
+    router.add_api_route(
+        "/check-transactions",
+        check_transactions_fast,
+        methods=["POST"],
+        response_model=List[StandardResponse],
+        openapi_extra=transaction_body_schema(
+            {"type": "array", "items": TRANSACTION_SCHEMA}
+        ),
+    )
+else:
+    router.add_api_route(
+        "/check-transaction",
+        check_transaction,
+        methods=["POST"],
+        response_model=StandardResponse,
+    )
+    router.add_api_route(
+        "/check-transactions",
+        check_transactions,
+        methods=["POST"],
+        response_model=List[StandardResponse],
+    )
+
+
+@router.get("/decision-cache")
+async def read_decision_cache_stats() -> Dict[str, int]:
+    """
+    Read the counters of the decision cache of this worker.
+
+    Returns:
+        Dict[str, int]: Hits, misses, evictions, expirations, invalidations, entries and
+        estimated bytes.
+    """
+    return decision_cache.stats()
+
+
+@router.get("/cost-guard")
+async def read_cost_guard_stats() -> dict:
+    """
+    Read the deadline misses of this worker and the rules it quarantined.
+
+    Returns:
+        dict: The number of checks that missed the evaluation deadline and of checks
+        not replayed to find their slow rules, the strikes of each rule, the rules
+        quarantined by this worker, and the evaluations past their deadline still
+        running or not started because of them.
+    """
+    return {**cost_guard.stats(), **rule_executor.stats()}
+
+
+@router.get("/shadow-rules")
+async def read_shadow_rule_stats() -> dict:
+    """
+    Read how the shadow rules of this worker compare with the live decisions.
+
+    Returns:
+        dict: The number of transactions evaluated, dropped and queued, the number of
+        approved transactions some shadow rule would have rejected, and per shadow rule
+        its counts of agreements and disagreements with the live decisions.
+    """
+    return shadow_evaluator.stats()
+
+
+def record_velocity(transaction_dict: dict) -> None:
+    """
+    Add a saved transaction to the velocity windows read by the current rules.
+
+    Args:
+        transaction_dict (dict): Dictionary containing transaction data.
+    """
+    rule_set = get_rule_set()
+    if rule_set is not None:
+        velocity_store.record(transaction_dict, rule_set.features)
 
 
 @router.post("/save-transaction")
-def save_transaction(transaction: TransactionCreate, db: Session = Depends(get_db)):
+async def save_transaction(
+    transaction: TransactionCreate, db: AsyncSession = Depends(get_async_db)
+):
     """
     Save a transaction to the database.
 
+    With write-behind enabled, the transaction is queued and inserted with others in a
+    single statement. Depending on the acknowledgment policy, the response is sent once
+    the transaction is committed, or with a 202 status once it is queued.
+
     Args:
         transaction (TransactionCreate): The transaction to save.
-        db (Session, optional): SQLAlchemy database session. Defaults to Depends(get_db).
+        db (AsyncSession, optional): SQLAlchemy async database session. Defaults to Depends(get_async_db).
 
     Returns:
         TransactionCreate: The saved transaction.
     """
-    db_transaction = crud.create_transaction(db, transaction)
+    if settings.write_behind_enabled:
+        record = transaction.model_dump()
+        wait_for_flush = settings.write_behind_ack == ACK_FLUSH
+        try:
+            transaction_id = await transaction_writer.submit(record, wait_for_flush)
+        except QueueFullError:
+            logger.error("Transaction queue is full")
+            raise HTTPException(status_code=503, detail="Transaction queue is full")
+        record_velocity(record)
+        if not wait_for_flush:
+            logger.info("Transaction queued: %s", record)
+            return JSONResponse(status_code=202, content=record)
+        logger.info("Transaction saved: %s", record)
+        return {**record, "id": transaction_id}
+
+    db_transaction = await async_crud.create_transaction(db, transaction)
+    record_velocity(transaction.model_dump())
     logger.info("Transaction saved: %s", db_transaction)
     return db_transaction
+
+
+def validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc']) or 'record'}: {detail['msg']}"
+        for detail in error.errors()
+    )
+
+
+async def ingest_chunk(
+    db: AsyncSession, index: int, offset: int, records: list, on_conflict: str
+) -> ChunkResult:
+    """
+    Validate and write one chunk of a bulk ingestion.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+        index (int): The position of the chunk in the body.
+        offset (int): The position in the body of the first record of the chunk.
+        records (list): The decoded records of the chunk.
+        on_conflict (str): "skip" or "upsert".
+
+    Returns:
+        ChunkResult: The counts of the chunk.
+    """
+    result = ChunkResult(chunk=index)
+
+    def fail(count: int, error: str) -> None:
+        result.failed += count
+        if len(result.errors) < MAX_CHUNK_ERRORS:
+            result.errors.append(error)
+
+    valid = []
+    for position, record in enumerate(records, start=offset):
+        if isinstance(record, InvalidRecord):
+            fail(1, f"Record {position}: {record.error}")
+            continue
+        try:
+            valid.append(TransactionCreate.model_validate(record).model_dump())
+        except ValidationError as e:
+            fail(1, f"Record {position}: {validation_message(e)}")
+
+    # Repeated transaction_ids in a chunk: the first one wins, or the last one on upsert
+    unique, result.skipped = deduplicate(valid, keep_last=on_conflict == "upsert")
+    if unique:
+        try:
+            inserted, updated, skipped = await async_crud.ingest_transactions(
+                db, unique, on_conflict
+            )
+        except SQLAlchemyError as e:
+            await db.rollback()
+            logger.error("Failed to write chunk %s: %s", index, e)
+            fail(
+                len(unique),
+                f"Chunk {index} could not be written: {e.__class__.__name__}",
+            )
+        else:
+            result.inserted += inserted
+            result.updated += updated
+            result.skipped += skipped
+    return result
+
+
+@router.post(
+    "/ingest-transactions",
+    response_model=BulkIngestionResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "type": "array",
+                        "items": {"$ref": "#/components/schemas/TransactionCreate"},
+                    }
+                },
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def ingest_transactions(
+    request: Request,
+    on_conflict: Literal["skip", "upsert"] = "skip",
+    chunk_size: int = Query(1000, ge=1, le=10_000),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Save a large number of transactions, streaming the body in chunks.
+
+    The body is either a JSON array of transactions or, with an application/x-ndjson
+    content type, one transaction per line. Each chunk is written with multi-row
+    inserts and committed on its own. Transactions whose transaction_id already exists
+    are skipped, or overwritten with `on_conflict=upsert`, so a backfill can safely be
+    sent again. Invalid records are counted as failed without failing their chunk.
+
+    Args:
+        request (Request): The request, whose body is read as it is received.
+        on_conflict (str, optional): "skip" or "upsert". Defaults to "skip".
+        chunk_size (int, optional): Number of records per chunk. Defaults to 1000.
+        db (AsyncSession, optional): SQLAlchemy async database session. Defaults to Depends(get_async_db).
+
+    Returns:
+        BulkIngestionResponse: The counts of each chunk and their totals. If the body is
+        malformed, the chunks committed before the error are reported with a 400 status.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type in NDJSON_CONTENT_TYPES:
+        records = iter_ndjson(request.stream())
+    else:
+        records = iter_json_array(request.stream())
+
+    response = BulkIngestionResponse()
+    offset = 0
+    try:
+        async for chunk in iter_chunks(records, chunk_size):
+            result = await ingest_chunk(
+                db, len(response.chunks), offset, chunk, on_conflict
+            )
+            offset += len(chunk)
+            response.chunks.append(result)
+            response.inserted += result.inserted
+            response.updated += result.updated
+            response.skipped += result.skipped
+            response.failed += result.failed
+    except IngestionError as e:
+        response.error = f"{e}; records from position {offset} on were not saved"
+        logger.error(response.error)
+        return JSONResponse(status_code=400, content=response.model_dump())
+
+    logger.info(
+        "Transactions ingested: %s inserted, %s updated, %s skipped, %s failed",
+        response.inserted,
+        response.updated,
+        response.skipped,
+        response.failed,
+    )
+    return response
@@ -1,3 +1,5 @@
+from typing import Literal, Optional
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
 
@@ -10,6 +12,77 @@ class Settings(BaseSettings):
         postgres_user (str): The username for the PostgreSQL database.
         postgres_password (str): The password for the PostgreSQL database.
         database_url (str): The URL for the PostgreSQL database connection.
+        database_replica_url (Optional[str]): The URL of a read replica. Rule reads
+            and rule set loading use it; every write goes to `database_url`.
+        db_pool_size (int): Connections kept open per pool and per worker.
+        db_max_overflow (int): Connections opened beyond `db_pool_size` under load.
+        db_pool_timeout (float): Seconds to wait for a connection before failing.
+        db_pool_pre_ping (bool): Whether to test connections when they are checked out.
+        db_pool_recycle (int): Seconds after which connections are replaced, or -1.
+        rule_set_poll_interval (float): Seconds between checks for rule changes made by
+            other workers.
+        named_lists_poll_interval (float): Seconds between checks for named list
+            changes made by other workers.
+        named_list_changes_retention (int): Number of latest named list changes kept
+            in the log; workers further behind reload the lists.
+        rule_evaluation_mode (str): Default evaluation mode of check-transaction, either
+            "full" to report every failing rule or "fail_fast" to stop at the first one.
+        rule_executor (str): Where check-transaction evaluates rules: "inline" on the
+            event loop, "thread" in a pool of threads, or "process" in a pool of
+            worker processes that scales CPU-heavy rule sets across cores.
+        rule_executor_workers (Optional[int]): Number of worker processes of the
+            "process" executor, or of threads of the "thread" executor. Defaults to
+            the number of CPUs for processes and to the thread pool default for threads.
+        fast_path_enabled (bool): Whether check-transaction and check-transactions
+            validate their JSON body straight into dictionaries instead of models.
+        metrics_sample_rate (float): Fraction of check-transaction requests whose
+            stages and rules are timed for /metrics, between 0 and 1.
+        velocity_max_keys (int): Maximum number of keys, e.g. client_ids, tracked per
+            velocity window of count() and total() rules.
+        velocity_buckets (int): Buckets per velocity window; windows are exact to one
+            bucket.
+        decision_cache_enabled (bool): Whether check-transaction caches decisions.
+        decision_cache_max_entries (int): Maximum number of cached decisions.
+        decision_cache_max_bytes (int): Maximum estimated memory of cached decisions.
+        decision_cache_ttl (float): Seconds a cached decision stays valid.
+        write_behind_enabled (bool): Whether save-transaction queues transactions and
+            inserts them in batches.
+        write_behind_ack (str): "enqueue" to answer once a transaction is queued, or
+            "flush" to answer once it is committed.
+        write_behind_batch_size (int): Maximum number of transactions per insert.
+        write_behind_flush_interval (float): Maximum seconds a transaction waits for its batch.
+        write_behind_queue_size (int): Maximum number of queued transactions.
+        write_behind_enqueue_timeout (float): Seconds to wait for room in a full queue
+            before answering 503.
+        write_behind_stop_timeout (float): Seconds to wait on shutdown for the queued
+            transactions to be flushed before dropping them.
+        shadow_queue_size (int): Maximum number of checks waiting for the shadow
+            rules; checks beyond it are dropped.
+        shadow_batch_size (int): Maximum number of checks evaluated by the shadow
+            rules per thread hop.
+        backtest_workers (int): Worker processes per backtest run by the API, 0 to
+            evaluate on a thread.
+        backtest_chunk_size (int): Transactions read and evaluated per backtest chunk.
+        backtest_max_jobs (int): Maximum number of backtest jobs kept, and of
+            unfinished ones.
+        max_rule_cost (int): Maximum estimated cost of a created or updated rule.
+        evaluation_deadline_ms (float): Milliseconds check-transaction waits for the
+            rules, per transaction for check-transactions, or 0 for no deadline.
+        evaluation_batch_deadline_ms (float): Longest wait of check-transactions for
+            the rules of a whole batch, however many transactions it holds.
+        evaluation_batch_chunk_size (int): Transactions of a check-transactions batch
+            evaluated per thread hop; past the deadline, the chunks not evaluated get
+            the fallback decision.
+        evaluation_fallback (str): Decision past the deadline, "approve" or "reject".
+        evaluation_max_abandoned (int): Maximum number of evaluations still running
+            past their deadline; beyond it the worker processes are replaced, or the
+            threads shed checks to the fallback.
+        rule_budget_ms (float): Longest evaluation of a rule without a strike.
+        quarantine_strikes (int): Strikes after which a rule is quarantined.
+        cost_guard_queue_size (int): Maximum number of checks over their deadline
+            waiting to be replayed; checks beyond it are dropped.
+        cost_guard_replay_timeout_ms (float): Longest replay of a check over its
+            deadline.
 
     Config:
         env_file (str): The file to load environment variables from.
@@ -19,6 +92,65 @@ class Settings(BaseSettings):
     postgres_user: str
     postgres_password: str
     database_url: str
+    database_replica_url: Optional[str] = None
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30.0
+    db_pool_pre_ping: bool = False
+    db_pool_recycle: int = -1
+    rule_set_poll_interval: float = 1.0
+    named_lists_poll_interval: float = 1.0
+    named_list_changes_retention: int = 100_000
+    rule_evaluation_mode: Literal["full", "fail_fast"] = "full"
+    rule_executor: Literal["inline", "thread", "process"] = "thread"
+    rule_executor_workers: Optional[int] = None
+    fast_path_enabled: bool = False
+    metrics_sample_rate: float = 0.01
+    velocity_max_keys: int = 100_000
+    velocity_buckets: int = 60
+    decision_cache_enabled: bool = True
+    decision_cache_max_entries: int = 100_000
+    decision_cache_max_bytes: int = 64 * 1024 * 1024
+    decision_cache_ttl: float = 60.0
+    write_behind_enabled: bool = False
+    write_behind_ack: Literal["enqueue", "flush"] = "flush"
+    write_behind_batch_size: int = 500
+    write_behind_flush_interval: float = 0.05
+    write_behind_queue_size: int = 10_000
+    write_behind_enqueue_timeout: float = 1.0
+    write_behind_stop_timeout: float = 10.0
+    shadow_queue_size: int = 10_000
+    shadow_batch_size: int = 256
+    backtest_workers: int = 2
+    backtest_chunk_size: int = 10_000
+    backtest_max_jobs: int = 32
+    max_rule_cost: int = 10_000
+    evaluation_deadline_ms: float = 100.0
+    evaluation_batch_deadline_ms: float = 1000.0
+    evaluation_batch_chunk_size: int = 256
+    evaluation_fallback: Literal["approve", "reject"] = "reject"
+    evaluation_max_abandoned: int = 4
+    rule_budget_ms: float = 10.0
+    quarantine_strikes: int = 3
+    cost_guard_queue_size: int = 100
+    cost_guard_replay_timeout_ms: float = 1000.0
+
+    @model_validator(mode="after")
+    def check_deadline_backend(self) -> "Settings":
+        """
+        Refuse an evaluation deadline that the inline backend could not enforce.
+
+        Raises:
+            ValueError: If `rule_executor` is "inline" and `evaluation_deadline_ms` is
+                set.
+        """
+        if self.rule_executor == "inline" and self.evaluation_deadline_ms > 0:
+            raise ValueError(
+                "The inline rule executor blocks the event loop and cannot enforce "
+                "EVALUATION_DEADLINE_MS: use the thread or process executor, or set "
+                "EVALUATION_DEADLINE_MS=0"
+            )
+        return self
 
     class Config:
         """
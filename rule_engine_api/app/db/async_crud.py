@@ -0,0 +1,590 @@
+# app/db/async_crud.py
+
+from typing import AsyncIterator, List, Optional, Tuple
+from sqlalchemy import (
+    Boolean,
+    delete,
+    func,
+    insert,
+    literal_column,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import models
+from app.db.models import (
+    NamedList,
+    NamedListChange,
+    NamedListEntry,
+    Rule,
+    RuleSetGeneration,
+)
+from app.schemas import transaction
+from app.schemas.rule import RuleCreate, RuleUpdate
+
+
+async def get_rules_(db: AsyncSession) -> List[Rule]:
+    """
+    Retrieve all rules from the database.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+
+    Returns:
+        List[Rule]: A list of all rules in the database.
+    """
+    result = await db.scalars(select(Rule).order_by(Rule.id))
+    return list(result)
+
+
+async def get_rule_set_generation(db: AsyncSession) -> int:
+    """
+    Retrieve the current generation of the rule set.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+
+    Returns:
+        int: The current generation, or 0 if the rules were never changed.
+    """
+    generation = await db.scalar(
+        select(RuleSetGeneration.generation).where(RuleSetGeneration.id == 1)
+    )
+    return generation or 0
+
+
+async def bump_rule_set_generation(db: AsyncSession) -> None:
+    """
+    Increment the rule set generation as part of the current transaction.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+    """
+    result = await db.execute(
+        update(RuleSetGeneration)
+        .where(RuleSetGeneration.id == 1)
+        .values(generation=RuleSetGeneration.generation + 1)
+    )
+    if result.rowcount == 0:
+        db.add(RuleSetGeneration(id=1, generation=1))
+
+
+async def create_transaction(
+    db: AsyncSession, transaction: transaction.TransactionCreate
+) -> models.Transaction:
+    """
+    Create a new transaction in the database.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+        transaction (TransactionCreate): The data for the new transaction.
+
+    Returns:
+        models.Transaction: The created transaction.
+    """
+    db_transaction = models.Transaction(**transaction.model_dump())
+    db.add(db_transaction)
+    await db.commit()
+    await db.refresh(db_transaction)
+    return db_transaction
+
+
+# INSERT statements supporting ON CONFLICT, for each database backend
+UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+# Bound parameters per statement, below the limits of asyncpg and SQLite
+MAX_PARAMETERS = 30_000
+
+
+async def ingest_transactions(
+    db: AsyncSession, records: List[dict], on_conflict: str
+) -> Tuple[int, int, int]:
+    """
+    Write transactions with multi-row inserts, keyed on transaction_id.
+
+    All the records are committed together. The counts are read from the statements
+    writing the rows, so concurrent ingests of the same transactions add up.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+        records (List[dict]): The validated transactions, with unique transaction_ids.
+        on_conflict (str): "skip" to keep existing transactions, or "upsert" to overwrite
+            them.
+
+    Returns:
+        Tuple[int, int, int]: The number of transactions inserted, updated and skipped.
+    """
+    table = models.Transaction.__table__
+    make_insert = UPSERT_INSERTS[db.get_bind().dialect.name]
+
+    def insert_rows(rows: List[dict], update_existing: bool):
+        statement = make_insert(table).values(rows)
+        if not update_existing:
+            return statement.on_conflict_do_nothing(index_elements=["transaction_id"])
+        return statement.on_conflict_do_update(
+            index_elements=["transaction_id"],
+            set_={
+                name: statement.excluded[name]
+                for name in rows[0]
+                if name != "transaction_id"
+            },
+        )
+
+    inserted = updated = 0
+    rows_per_statement = MAX_PARAMETERS // len(records[0])
+    for start in range(0, len(records), rows_per_statement):
+        rows = records[start : start + rows_per_statement]
+        if on_conflict != "upsert":
+            result = await db.execute(
+                insert_rows(rows, False).returning(table.c.transaction_id)
+            )
+            inserted += len(result.all())
+        elif db.get_bind().dialect.name == "postgresql":
+            # ON CONFLICT DO UPDATE returns both inserted and updated rows: only the
+            # inserted ones have no deleting transaction
+            result = await db.scalars(
+                insert_rows(rows, True).returning(literal_column("xmax = 0", Boolean))
+            )
+            flags = list(result)
+            inserted += sum(flags)
+            updated += len(flags) - sum(flags)
+        else:
+            # Insert the new rows first, then overwrite the others: SQLite holds the
+            # write lock from the first statement, so no other writer comes in between
+            result = await db.scalars(
+                insert_rows(rows, False).returning(table.c.transaction_id)
+            )
+            new = set(result)
+            inserted += len(new)
+            rows = [row for row in rows if row["transaction_id"] not in new]
+            if rows:
+                result = await db.execute(
+                    insert_rows(rows, True).returning(table.c.transaction_id)
+                )
+                updated += len(result.all())
+    await db.commit()
+
+    return inserted, updated, len(records) - inserted - updated
+
+
+async def create_rule(db: AsyncSession, rule: RuleCreate) -> Rule:
+    """
+    Create a new rule.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+        rule (RuleCreate): The data for the new rule.
+
+    Returns:
+        Rule: The created rule.
+    """
+    db_rule = Rule(**rule.model_dump())
+    db.add(db_rule)
+    await bump_rule_set_generation(db)
+    await db.commit()
+    await db.refresh(db_rule)
+    return db_rule
+
+
+async def create_multiple_rules(
+    db: AsyncSession, rules: List[RuleCreate]
+) -> List[Rule]:
+    """
+    Create multiple rules in a single operation.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+        rules (List[RuleCreate]): A list of data for the new rules.
+
+    Returns:
+        List[Rule]: A list of the created rules.
+    """
+    db_rules = [Rule(**rule.model_dump()) for rule in rules]
+    db.add_all(db_rules)
+    await bump_rule_set_generation(db)
+    await db.commit()
+    return db_rules
+
+
+async def get_rule(db: AsyncSession, rule_id: int) -> Optional[Rule]:
+    """
+    Retrieve a rule by its ID.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+        rule_id (int): The ID of the rule to retrieve.
+
+    Returns:
+        Rule: The rule with the specified ID, or None if not found.
+    """
+    return await db.get(Rule, rule_id)
+
+
+async def get_rules(
+    db: AsyncSession, skip: int = 0, limit: int = 10, after: Optional[int] = None
+) -> List[Rule]:
+    """
+    Retrieve a list of rules with pagination.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+        skip (int, optional): The number of records to skip. Defaults to 0.
+        limit (int, optional): The maximum number of records to return. Defaults to 10.
+        after (int, optional): Only return rules with a greater ID. Unlike `skip`, the
+            cost does not grow with the position of the page. Defaults to None.
+
+    Returns:
+        List[Rule]: A list of rules, ordered by ID.
+    """
+    query = select(Rule).order_by(Rule.id)
+    if after is not None:
+        query = query.where(Rule.id > after)
+    result = await db.scalars(query.offset(skip).limit(limit))
+    return list(result)
+
+
+async def stream_rules(db: AsyncSession, batch_size: int = 500) -> AsyncIterator[Rule]:
+    """
+    Iterate over all rules, fetched from the database in batches.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+        batch_size (int, optional): The number of rules fetched at once. Defaults to 500.
+
+    Yields:
+        Rule: The rules, ordered by ID.
+    """
+    result = await db.stream_scalars(
+        select(Rule).order_by(Rule.id).execution_options(yield_per=batch_size)
+    )
+    async for rule in result:
+        yield rule
+
+
+async def update_rule(
+    db: AsyncSession, rule_id: int, rule: RuleUpdate
+) -> Optional[Rule]:
+    """
+    Update an existing rule.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+        rule_id (int): The ID of the rule to update.
+        rule (RuleUpdate): The new data for the rule; fields not set are kept.
+
+    Returns:
+        Rule: The updated rule, or None if not found.
+    """
+    db_rule = await db.get(Rule, rule_id)
+    if db_rule:
+        for key, value in rule.model_dump(exclude_unset=True).items():
+            setattr(db_rule, key, value)
+        await bump_rule_set_generation(db)
+        await db.commit()
+        await db.refresh(db_rule)
+    return db_rule
+
+
+async def quarantine_rules(db: AsyncSession, rules: List[Tuple[int, str]]) -> List[int]:
+    """
+    Quarantine rules, unless they were changed or quarantined meanwhile.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+        rules (List[Tuple[int, str]]): The ID and logic of each rule to quarantine.
+
+    Returns:
+        List[int]: The IDs of the rules quarantined.
+    """
+    quarantined = []
+    for rule_id, logic in rules:
+        result = await db.execute(
+            update(Rule)
+            .where(Rule.id == rule_id, Rule.rule == logic, Rule.status != "quarantined")
+            .values(status="quarantined")
+        )
+        if result.rowcount:
+            quarantined.append(rule_id)
+    if quarantined:
+        await bump_rule_set_generation(db)
+    await db.commit()
+    return quarantined
+
+
+async def delete_rule(db: AsyncSession, rule_id: int) -> Optional[Rule]:
+    """
+    Delete an existing rule.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+        rule_id (int): The ID of the rule to delete.
+
+    Returns:
+        Rule: The deleted rule, or None if not found.
+    """
+    db_rule = await db.get(Rule, rule_id)
+    if db_rule:
+        await db.delete(db_rule)
+        await bump_rule_set_generation(db)
+        await db.commit()
+    return db_rule
+
+
+# Key of the PostgreSQL advisory lock serializing the changes to named lists
+NAMED_LISTS_LOCK_KEY = 0x4C495354
+
+
+async def lock_named_lists(db: AsyncSession) -> None:
+    """
+    Serialize the changes to named lists until the end of the current transaction.
+
+    Workers replay the change log in ID order, so a change must not commit after a
+    change with a greater ID was read. On PostgreSQL an advisory lock ensures it; SQLite
+    serializes the writers by itself.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        await db.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": NAMED_LISTS_LOCK_KEY}
+        )
+
+
+async def get_named_list(db: AsyncSession, name: str) -> Optional[NamedList]:
+    """
+    Retrieve a named list by its name.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+        name (str): The name of the list.
+
+    Returns:
+        NamedList: The list, or None if not found.
+    """
+    return await db.scalar(select(NamedList).where(NamedList.name == name))
+
+
+async def get_named_lists(db: AsyncSession) -> List[NamedList]:
+    """
+    Retrieve all named lists.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+
+    Returns:
+        List[NamedList]: The lists, ordered by name.
+    """
+    result = await db.scalars(select(NamedList).order_by(NamedList.name))
+    return list(result)
+
+
+async def create_named_list(
+    db: AsyncSession, name: str, kind: str
+) -> Optional[NamedList]:
+    """
+    Create an empty named list.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+        name (str): The name of the list.
+        kind (str): How the values of the list match.
+
+    Returns:
+        NamedList: The created list, or None if a list with that name exists.
+    """
+    await lock_named_lists(db)
+    if await get_named_list(db, name) is not None:
+        return None
+    db_list = NamedList(name=name, kind=kind)
+    db.add(db_list)
+    db.add(NamedListChange(list_name=name, operation="create", value=kind))
+    await db.commit()
+    await db.refresh(db_list)
+    return db_list
+
+
+async def delete_named_list(db: AsyncSession, name: str) -> Optional[NamedList]:
+    """
+    Delete a named list and its values.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+        name (str): The name of the list.
+
+    Returns:
+        NamedList: The deleted list, or None if not found.
+    """
+    await lock_named_lists(db)
+    db_list = await get_named_list(db, name)
+    if db_list:
+        await db.execute(
+            delete(NamedListEntry).where(NamedListEntry.list_id == db_list.id)
+        )
+        await db.delete(db_list)
+        db.add(NamedListChange(list_name=name, operation="delete"))
+        await db.commit()
+    return db_list
+
+
+async def update_named_list_entries(
+    db: AsyncSession,
+    db_list: NamedList,
+    add: List[str],
+    remove: List[str],
+    keep_changes: Optional[int] = None,
+) -> Tuple[int, int]:
+    """
+    Add and remove values of a named list, and log the changes for the other workers.
+
+    Values already present are not added again and values absent are not removed; only
+    the actual changes are logged.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+        db_list (NamedList): The list to change.
+        add (List[str]): The normalized values to add.
+        remove (List[str]): The normalized values to remove.
+        keep_changes (Optional[int]): The number of latest changes kept in the log,
+            older ones being deleted; None to keep every change.
+
+    Returns:
+        Tuple[int, int]: The number of values added and removed.
+    """
+    await lock_named_lists(db)
+    table = NamedListEntry.__table__
+    make_insert = UPSERT_INSERTS[db.get_bind().dialect.name]
+    added = []
+    rows_per_statement = MAX_PARAMETERS // 2
+    for start in range(0, len(add), rows_per_statement):
+        statement = (
+            make_insert(table)
+            .values(
+                [
+                    {"list_id": db_list.id, "value": value}
+                    for value in add[start : start + rows_per_statement]
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=["list_id", "value"])
+        )
+        added += await db.scalars(statement.returning(table.c.value))
+    removed = []
+    for start in range(0, len(remove), MAX_PARAMETERS):
+        removed += await db.scalars(
+            delete(table)
+            .where(
+                table.c.list_id == db_list.id,
+                table.c.value.in_(remove[start : start + MAX_PARAMETERS]),
+            )
+            .returning(table.c.value)
+        )
+    changes = [
+        {"list_name": db_list.name, "operation": operation, "value": value}
+        for operation, values in (("add", added), ("remove", removed))
+        for value in values
+    ]
+    rows_per_statement = MAX_PARAMETERS // 3
+    for start in range(0, len(changes), rows_per_statement):
+        await db.execute(
+            insert(NamedListChange).values(changes[start : start + rows_per_statement])
+        )
+    if keep_changes is not None and changes:
+        await prune_named_list_changes(db, keep_changes)
+    await db.commit()
+    return len(added), len(removed)
+
+
+async def prune_named_list_changes(db: AsyncSession, keep: int) -> None:
+    """
+    Delete the changes to the named lists older than the `keep` latest ones, as part of
+    the current transaction.
+
+    Workers whose revision is older than the changes left reload the lists instead of
+    replaying the log.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+        keep (int): The number of latest changes kept.
+    """
+    revision = await get_named_list_revision(db)
+    await db.execute(
+        delete(NamedListChange).where(NamedListChange.id <= revision - keep)
+    )
+
+
+async def get_named_list_revision(db: AsyncSession) -> int:
+    """
+    Retrieve the ID of the last change to the named lists.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+
+    Returns:
+        int: The ID of the last change, or 0 if the lists were never changed.
+    """
+    revision = await db.scalar(select(func.max(NamedListChange.id)))
+    return revision or 0
+
+
+async def get_oldest_named_list_change(db: AsyncSession) -> Optional[int]:
+    """
+    Retrieve the ID of the oldest change to the named lists still logged.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+
+    Returns:
+        Optional[int]: The ID of the oldest change, or None if the log is empty.
+    """
+    return await db.scalar(select(func.min(NamedListChange.id)))
+
+
+async def get_named_list_changes(
+    db: AsyncSession, after: int, limit: int
+) -> List[NamedListChange]:
+    """
+    Retrieve the changes to the named lists made after a revision.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+        after (int): Only return changes with a greater ID.
+        limit (int): The maximum number of changes to return.
+
+    Returns:
+        List[NamedListChange]: The changes, ordered by ID.
+    """
+    result = await db.scalars(
+        select(NamedListChange)
+        .where(NamedListChange.id > after)
+        .order_by(NamedListChange.id)
+        .limit(limit)
+    )
+    return list(result)
+
+
+async def stream_named_list_entries(
+    db: AsyncSession, batch_size: int = 10_000
+) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Iterate over the values of all named lists, fetched from the database in batches.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+        batch_size (int, optional): The number of values fetched at once. Defaults to
+            10000.
+
+    Yields:
+        Tuple[str, str]: The name of the list and the value.
+    """
+    result = await db.stream(
+        select(NamedList.name, NamedListEntry.value)
+        .join(NamedList, NamedList.id == NamedListEntry.list_id)
+        .execution_options(yield_per=batch_size)
+    )
+    async for name, value in result:
+        yield name, value
@@ -0,0 +1,78 @@
+# app/db/bootstrap.py
+
+import logging
+from typing import Dict, List
+from sqlalchemy import Connection, Engine, inspect, text
+from sqlalchemy.orm import Session
+from app.db import crud
+from app.db.models import Base
+
+logger = logging.getLogger(__name__)
+
+# Key of the PostgreSQL advisory lock serializing the bootstrap of all workers
+BOOTSTRAP_LOCK_KEY = 0x52554C45
+
+# Statements adding the columns of the rules table missing from older databases, which
+# create_all does not alter
+RULE_COLUMN_MIGRATIONS = {
+    "scope": (
+        "ALTER TABLE rules ADD COLUMN scope VARCHAR",
+        "CREATE INDEX ix_rules_scope ON rules (scope)",
+    ),
+    "status": (
+        "ALTER TABLE rules ADD COLUMN status VARCHAR NOT NULL DEFAULT 'active'",
+    ),
+}
+
+
+def add_missing_rule_columns(connection: Connection) -> List[str]:
+    """
+    Add the columns of the rules table missing from a database created before them.
+
+    Args:
+        connection (Connection): Connection in the bootstrap transaction.
+
+    Returns:
+        List[str]: The names of the columns added.
+    """
+    columns = {column["name"] for column in inspect(connection).get_columns("rules")}
+    added = []
+    for column, statements in RULE_COLUMN_MIGRATIONS.items():
+        if column not in columns:
+            for statement in statements:
+                connection.execute(text(statement))
+            added.append(column)
+    return added
+
+
+def bootstrap_database(engine: Engine, rules: List[Dict[str, str]]) -> int:
+    """
+    Create the tables, the rule set generation row and the missing initial rules, and
+    add the rule columns missing from older databases.
+
+    Everything runs in one transaction. On PostgreSQL it holds an advisory lock, so
+    workers starting together bootstrap one after the other and the later ones find
+    everything in place; SQLite serializes the writers by itself.
+
+    Args:
+        engine (Engine): SQLAlchemy engine of the database.
+        rules (List[Dict[str, str]]): The initial rules, with 'description' and 'rule'.
+
+    Returns:
+        int: The number of rules inserted.
+    """
+    with Session(engine) as db, db.begin():
+        if engine.dialect.name == "postgresql":
+            db.execute(
+                text("SELECT pg_advisory_xact_lock(:key)"), {"key": BOOTSTRAP_LOCK_KEY}
+            )
+        Base.metadata.create_all(db.connection())
+        added = add_missing_rule_columns(db.connection())
+        if added:
+            logger.info("Added the rule columns %s", ", ".join(added))
+        crud.ensure_rule_set_generation(db)
+        inserted = crud.insert_missing_rules(db, rules)
+        if inserted:
+            crud.bump_rule_set_generation(db)
+    logger.info("Database bootstrapped, %s initial rules inserted", inserted)
+    return inserted
@@ -1,8 +1,19 @@
+from sqlalchemy import (
+    String,
+    Text,
+    exists,
+    func,
+    insert,
+    literal,
+    select,
+    union_all,
+    update,
+)
 from sqlalchemy.orm import Session
 from app.db import models
 from app.schemas import transaction
-from typing import List
-from app.db.models import Rule
+from typing import Any, Collection, Dict, Iterator, List, Optional, Sequence, Tuple
+from app.db.models import NamedList, NamedListEntry, Rule, RuleSetGeneration
 from app.schemas.rule import RuleCreate, RuleUpdate
 
 
@@ -16,7 +27,86 @@ def get_rules_(db: Session) -> List[Rule]:
     Returns:
         List[Rule]: A list of all rules in the database.
     """
-    return db.query(models.Rule).all()
+    return db.query(models.Rule).order_by(models.Rule.id).all()
+
+
+def get_rule_set_generation(db: Session) -> int:
+    """
+    Retrieve the current generation of the rule set.
+
+    Args:
+        db (Session): SQLAlchemy database session.
+
+    Returns:
+        int: The current generation, or 0 if the rules were never changed.
+    """
+    generation = db.get(RuleSetGeneration, 1)
+    return generation.generation if generation else 0
+
+
+def ensure_rule_set_generation(db: Session) -> None:
+    """
+    Create the rule set generation row, if it does not exist yet, as part of the
+    current transaction.
+
+    Args:
+        db (Session): SQLAlchemy database session.
+    """
+    if db.get(RuleSetGeneration, 1) is None:
+        db.add(RuleSetGeneration(id=1, generation=0))
+        db.flush()
+
+
+def insert_missing_rules(db: Session, rules: List[Dict[str, str]]) -> int:
+    """
+    Insert the rules whose description is not in the database yet, as part of the
+    current transaction.
+
+    A single INSERT ... SELECT ... WHERE NOT EXISTS statement inserts them all.
+
+    Args:
+        db (Session): SQLAlchemy database session.
+        rules (List[Dict[str, str]]): The rules, with 'description' and 'rule'.
+
+    Returns:
+        int: The number of rules inserted.
+    """
+    if not rules:
+        return 0
+    # The first of several rules with the same description wins
+    unique = {}
+    for rule in rules:
+        unique.setdefault(rule["description"], rule)
+    candidates = union_all(
+        *(
+            select(
+                literal(rule["description"], String).label("description"),
+                literal(rule["rule"], Text).label("rule"),
+            )
+            for rule in unique.values()
+        )
+    ).subquery()
+    missing = select(candidates.c.description, candidates.c.rule).where(
+        ~exists().where(Rule.description == candidates.c.description)
+    )
+    result = db.execute(insert(Rule).from_select(["description", "rule"], missing))
+    return result.rowcount
+
+
+def bump_rule_set_generation(db: Session) -> None:
+    """
+    Increment the rule set generation as part of the current transaction.
+
+    Args:
+        db (Session): SQLAlchemy database session.
+    """
+    result = db.execute(
+        update(RuleSetGeneration)
+        .where(RuleSetGeneration.id == 1)
+        .values(generation=RuleSetGeneration.generation + 1)
+    )
+    if result.rowcount == 0:
+        db.add(RuleSetGeneration(id=1, generation=1))
 
 
 def create_transaction(
@@ -32,7 +122,7 @@ def create_transaction(
     Returns:
         models.Transaction: The created transaction.
     """
-    db_transaction = models.Transaction(**transaction.dict())
+    db_transaction = models.Transaction(**transaction.model_dump())
     db.add(db_transaction)
     db.commit()
     db.refresh(db_transaction)
@@ -53,8 +143,9 @@ def create_rule(db: Session, rule: RuleCreate) -> Rule:
     Returns:
         Rule: The created rule.
     """
-    db_rule = Rule(**rule.dict())
+    db_rule = Rule(**rule.model_dump())
     db.add(db_rule)
+    bump_rule_set_generation(db)
     db.commit()
     db.refresh(db_rule)
     return db_rule
@@ -71,8 +162,9 @@ def create_multiple_rules(db: Session, rules: List[RuleCreate]) -> List[Rule]:
     Returns:
         List[Rule]: A list of the created rules.
     """
-    db_rules = [Rule(**rule.dict()) for rule in rules]
+    db_rules = [Rule(**rule.model_dump()) for rule in rules]
     db.bulk_save_objects(db_rules)
+    bump_rule_set_generation(db)
     db.commit()
     return db_rules
 
@@ -91,7 +183,9 @@ def get_rule(db: Session, rule_id: int) -> Rule:
     return db.query(Rule).filter(Rule.id == rule_id).first()
 
 
-def get_rules(db: Session, skip: int = 0, limit: int = 10) -> List[Rule]:
+def get_rules(
+    db: Session, skip: int = 0, limit: int = 10, after: Optional[int] = None
+) -> List[Rule]:
     """
     Retrieve a list of rules with pagination.
 
@@ -99,11 +193,16 @@ def get_rules(db: Session, skip: int = 0, limit: int = 10) -> List[Rule]:
         db (Session): SQLAlchemy database session.
         skip (int, optional): The number of records to skip. Defaults to 0.
         limit (int, optional): The maximum number of records to return. Defaults to 10.
+        after (int, optional): Only return rules with a greater ID. Unlike `skip`, the
+            cost does not grow with the position of the page. Defaults to None.
 
     Returns:
-        List[Rule]: A list of rules.
+        List[Rule]: A list of rules, ordered by ID.
     """
-    return db.query(Rule).offset(skip).limit(limit).all()
+    query = db.query(Rule).order_by(Rule.id)
+    if after is not None:
+        query = query.filter(Rule.id > after)
+    return query.offset(skip).limit(limit).all()
 
 
 def update_rule(db: Session, rule_id: int, rule: RuleUpdate) -> Rule:
@@ -113,15 +212,16 @@ def update_rule(db: Session, rule_id: int, rule: RuleUpdate) -> Rule:
     Args:
         db (Session): SQLAlchemy database session.
         rule_id (int): The ID of the rule to update.
-        rule (RuleUpdate): The new data for the rule.
+        rule (RuleUpdate): The new data for the rule; fields not set are kept.
 
     Returns:
         Rule: The updated rule, or None if not found.
     """
     db_rule = db.query(Rule).filter(Rule.id == rule_id).first()
     if db_rule:
-        for key, value in rule.dict().items():
+        for key, value in rule.model_dump(exclude_unset=True).items():
             setattr(db_rule, key, value)
+        bump_rule_set_generation(db)
         db.commit()
         db.refresh(db_rule)
     return db_rule
@@ -141,5 +241,98 @@ def delete_rule(db: Session, rule_id: int) -> Rule:
     db_rule = db.query(Rule).filter(Rule.id == rule_id).first()
     if db_rule:
         db.delete(db_rule)
+        bump_rule_set_generation(db)
         db.commit()
     return db_rule
+
+
+def _transaction_range(statement, start_id: Optional[int], end_id: Optional[int]):
+    if start_id is not None:
+        statement = statement.where(models.Transaction.id >= start_id)
+    if end_id is not None:
+        statement = statement.where(models.Transaction.id <= end_id)
+    return statement
+
+
+def count_transactions(
+    db: Session, start_id: Optional[int] = None, end_id: Optional[int] = None
+) -> int:
+    """
+    Count the stored transactions in a range of IDs.
+
+    Args:
+        db (Session): SQLAlchemy database session.
+        start_id (Optional[int], optional): The first ID counted. Defaults to None.
+        end_id (Optional[int], optional): The last ID counted. Defaults to None.
+
+    Returns:
+        int: The number of transactions.
+    """
+    statement = _transaction_range(
+        select(func.count()).select_from(models.Transaction), start_id, end_id
+    )
+    return db.execute(statement).scalar_one()
+
+
+def stream_transactions(
+    db: Session,
+    fields: Sequence[str],
+    chunk_size: int = 10_000,
+    start_id: Optional[int] = None,
+    end_id: Optional[int] = None,
+) -> Iterator[List[Tuple[Any, ...]]]:
+    """
+    Iterate over the stored transactions in chunks, in ID order, through a server-side
+    cursor, so that only one chunk is held in memory at a time.
+
+    Args:
+        db (Session): SQLAlchemy database session.
+        fields (Sequence[str]): The columns to read, after the ID.
+        chunk_size (int, optional): The number of rows per chunk. Defaults to 10000.
+        start_id (Optional[int], optional): The first ID read. Defaults to None.
+        end_id (Optional[int], optional): The last ID read. Defaults to None.
+
+    Yields:
+        List[Tuple[Any, ...]]: The ID and the fields of each transaction of a chunk.
+    """
+    columns = [getattr(models.Transaction, field) for field in fields]
+    statement = _transaction_range(
+        select(models.Transaction.id, *columns), start_id, end_id
+    ).order_by(models.Transaction.id)
+    # Through the connection, to skip the ORM row processing
+    result = db.connection().execute(
+        statement.execution_options(stream_results=True, yield_per=chunk_size)
+    )
+    for partition in result.partitions():
+        yield [tuple(row) for row in partition]
+
+
+def get_named_list_values(
+    db: Session, names: Collection[str]
+) -> Dict[str, Tuple[str, List[str]]]:
+    """
+    Retrieve the kind and values of named lists.
+
+    Args:
+        db (Session): SQLAlchemy database session.
+        names (Collection[str]): The names of the lists.
+
+    Returns:
+        Dict[str, Tuple[str, List[str]]]: The kind and values of each list that exists,
+        by name.
+    """
+    lists = {
+        name: (kind, [])
+        for name, kind in db.execute(
+            select(NamedList.name, NamedList.kind).where(NamedList.name.in_(names))
+        )
+    }
+    rows = db.execute(
+        select(NamedList.name, NamedListEntry.value)
+        .join(NamedList, NamedList.id == NamedListEntry.list_id)
+        .where(NamedList.name.in_(names))
+        .execution_options(yield_per=10_000)
+    )
+    for name, value in rows:
+        lists[name][1].append(value)
+    return lists
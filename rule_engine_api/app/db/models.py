@@ -1,4 +1,12 @@
-from sqlalchemy import Column, Integer, String, Float, Text
+from sqlalchemy import (
+    Column,
+    ForeignKey,
+    Integer,
+    String,
+    Float,
+    Text,
+    UniqueConstraint,
+)
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -40,9 +48,84 @@ class Rule(Base):
         id (int): The primary key and unique identifier for the rule.
         description (str): A brief description of the rule.
         rule (str): The rule logic expressed as a string.
+        scope (str): The transactions the rule applies to, e.g. "merchant_id:M42" or
+            "client_id:C7", or None if it applies to every transaction.
+        status (str): "active" if the rule decides, "shadow" if it is only evaluated
+            to compare its outcomes with the decisions, or "quarantined" if it is not
+            evaluated because it repeatedly ran over its time budget.
     """
 
     __tablename__ = "rules"
     id = Column(Integer, primary_key=True, index=True)
     description = Column(String, index=True)
     rule = Column(Text, nullable=False)
+    scope = Column(String, index=True)
+    status = Column(String, nullable=False, default="active", server_default="active")
+
+
+class RuleSetGeneration(Base):
+    """
+    Counter bumped on every change to the rules, shared by all workers.
+
+    Attributes:
+        id (int): The primary key; the table holds a single row.
+        generation (int): The current generation of the rule set.
+    """
+
+    __tablename__ = "rule_set_generation"
+    id = Column(Integer, primary_key=True)
+    generation = Column(Integer, nullable=False, default=0)
+
+
+class NamedList(Base):
+    """
+    A named list of values that rules can look transactions up in.
+
+    Attributes:
+        id (int): The primary key.
+        name (str): The unique name rules refer to the list by.
+        kind (str): How values match: "exact", "cidr" for IP ranges, or "domain" for
+            email domains and their subdomains.
+    """
+
+    __tablename__ = "named_lists"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+    kind = Column(String, nullable=False)
+
+
+class NamedListEntry(Base):
+    """
+    A value of a named list, normalized for its kind.
+
+    Attributes:
+        id (int): The primary key.
+        list_id (int): The list the value belongs to.
+        value (str): The normalized value.
+    """
+
+    __tablename__ = "named_list_entries"
+    __table_args__ = (UniqueConstraint("list_id", "value"),)
+    id = Column(Integer, primary_key=True)
+    list_id = Column(
+        Integer, ForeignKey("named_lists.id", ondelete="CASCADE"), nullable=False
+    )
+    value = Column(String, nullable=False)
+
+
+class NamedListChange(Base):
+    """
+    A change to the named lists, replayed by workers to update their indexes in place.
+
+    Attributes:
+        id (int): The primary key; workers apply changes in increasing order.
+        list_name (str): The name of the changed list.
+        operation (str): "create", "delete", "add" or "remove".
+        value (str): The kind of a created list, or the added or removed value.
+    """
+
+    __tablename__ = "named_list_changes"
+    id = Column(Integer, primary_key=True)
+    list_name = Column(String, nullable=False)
+    operation = Column(String, nullable=False)
+    value = Column(String)
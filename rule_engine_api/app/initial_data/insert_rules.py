@@ -1,8 +1,8 @@
 # app/initial_data/insert_rules.py
 
 import json
-from app.db.session import SessionLocal
-from app.db.models import Rule
+from app.db.bootstrap import bootstrap_database
+from app.db.session import engine
 
 
 def read_rules_from_json(file_path):
@@ -21,23 +21,15 @@ def read_rules_from_json(file_path):
 
 def insert_initial_rules(rules):
     """
-    Insert initial rules into the database.
+    Insert the initial rules missing from the database.
 
     Args:
         rules (list): List of rules to insert into the database.
+
+    Returns:
+        int: The number of rules inserted.
     """
-    db = SessionLocal()
-    try:
-        for rule_data in rules:
-            existing_rule = (
-                db.query(Rule).filter_by(description=rule_data["description"]).first()
-            )
-            if not existing_rule:
-                rule = Rule(**rule_data)
-                db.add(rule)
-        db.commit()
-    finally:
-        db.close()
+    return bootstrap_database(engine, rules)
 
 
 if __name__ == "__main__":
@@ -1,26 +1,127 @@
 # app/main.py
 
+import asyncio
+import logging
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from app.api.health import router as health_router
+from app.api.metrics import router as metrics_router
 from app.api.v0.endpoints import api_router
-from app.db.session import engine
-from app.db.models import Base
-from app.initial_data.insert_rules import insert_initial_rules, read_rules_from_json
-
-# Create all database tables based on the models defined
-Base.metadata.create_all(bind=engine)
+from app.api.v0.endpoints.backtests import backtest_jobs
+from app.api.v0.endpoints.transaction import (
+    cost_guard,
+    rule_executor,
+    shadow_evaluator,
+    transaction_writer,
+    velocity_store,
+)
+from app.core.config import settings
+from app.db.bootstrap import bootstrap_database
+from app.db.session import AsyncReadSessionLocal, AsyncSessionLocal, engine
+from app.initial_data.insert_rules import read_rules_from_json
+from app.schemas.transaction import TransactionBase
+from app.services.batch_engine import get_batch_plan
+from app.services.named_lists import registry, watch_named_lists
+from app.services.rule_set import RuleSet, refresh_rule_set, watch_rule_set
 
-# Initialize the FastAPI application
-app = FastAPI()
-
-# Include the API router with a prefix for versioning
-app.include_router(api_router, prefix="/v0")
+logger = logging.getLogger(__name__)
 
 # Define the path to the JSON file containing initial rules
 initial_rules_file = os.path.join(
     os.path.dirname(__file__), "initial_data", "initial_rules.json"
 )
 
-# Insert initial rules into the database
-rules = read_rules_from_json(initial_rules_file)
-insert_initial_rules(rules)
+
+def warm_up_transaction(rule_set: RuleSet) -> dict:
+    """
+    Build a blank transaction with the velocity features and list lookups of a rule
+    set, as the checked transactions have them.
+
+    The features are read without recording the transaction, so that warming up does
+    not count in the velocity windows.
+
+    Args:
+        rule_set (RuleSet): The rule set to warm up.
+
+    Returns:
+        dict: The blank transaction, with one field per feature and lookup.
+    """
+    blank = {
+        name: field.annotation() for name, field in TransactionBase.model_fields.items()
+    }
+    blank.update(velocity_store.lookup(blank, rule_set.features))
+    return registry.resolve(blank, rule_set.lookups)
+
+
+async def warm_up() -> RuleSet:
+    """
+    Load the named lists, and load and compile the rule set, then evaluate a blank
+    transaction with it.
+
+    The evaluation starts the executor workers, if any, and builds the batch plan, so
+    that the first requests do not pay for them.
+
+    Returns:
+        RuleSet: The loaded rule set snapshot.
+    """
+    # From the primary, which already has the rules inserted by the bootstrap
+    async with AsyncSessionLocal() as db:
+        await registry.load(db)
+        rule_set = await refresh_rule_set(db)
+    blank = warm_up_transaction(rule_set)
+    # Not in fail_fast mode, whose rule order adapts to the outcomes it sees
+    await rule_executor.evaluate(blank, rule_set, "full")
+    await asyncio.to_thread(get_batch_plan, rule_set.route(blank))
+    return rule_set
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Bootstrap the database and warm up the rule set before serving, and run
+    background tasks for the lifetime of the application.
+
+    Args:
+        app (FastAPI): The FastAPI application.
+    """
+    app.state.ready = False
+    rules = read_rules_from_json(initial_rules_file)
+    await asyncio.to_thread(bootstrap_database, engine, rules)
+    rule_set = await warm_up()
+    logger.info("Rule set generation %s warmed up", rule_set.version)
+
+    # Pick up rule changes made through other workers, reading from the replica
+    watcher = asyncio.create_task(
+        watch_rule_set(AsyncReadSessionLocal, settings.rule_set_poll_interval)
+    )
+    # And named list changes, applied in place
+    lists_watcher = asyncio.create_task(
+        watch_named_lists(AsyncReadSessionLocal, settings.named_lists_poll_interval)
+    )
+    if settings.write_behind_enabled:
+        transaction_writer.start()
+    app.state.ready = True
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        watcher.cancel()
+        lists_watcher.cancel()
+        # Flush the transactions still queued before shutting down
+        await transaction_writer.stop()
+        await shadow_evaluator.stop()
+        await cost_guard.stop()
+        await backtest_jobs.stop()
+        rule_executor.shutdown()
+
+
+# Initialize the FastAPI application
+app = FastAPI(lifespan=lifespan)
+
+# Include the API router with a prefix for versioning
+app.include_router(api_router, prefix="/v0")
+
+# Expose the Prometheus metrics and the probes at conventional unversioned paths
+app.include_router(metrics_router)
+app.include_router(health_router)
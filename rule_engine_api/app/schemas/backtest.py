@@ -0,0 +1,92 @@
+# app/schemas/backtest.py
+
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from app.schemas.rule import RuleCreate
+
+
+class BacktestCreate(BaseModel):
+    """
+    Model for starting a backtest.
+
+    Attributes:
+        rules (Optional[List[RuleCreate]]): The proposed rules, or None to replay the
+            stored rules. Every rule is replayed as an active rule.
+        start_id (Optional[int]): The first transaction ID replayed.
+        end_id (Optional[int]): The last transaction ID replayed.
+    """
+
+    rules: Optional[List[RuleCreate]] = Field(default=None, min_length=1)
+    start_id: Optional[int] = None
+    end_id: Optional[int] = None
+
+
+class BacktestRuleReport(BaseModel):
+    """
+    Outcome of one rule over a backtest.
+
+    Attributes:
+        rule_id (int): The ID of the stored rule, or its position among the proposed
+            rules, from 1.
+        description (str): The description of the rule.
+        failures (int): The number of transactions the rule failed, errors included.
+        errors (int): The number of transactions the rule raised an error on.
+        failure_rate (float): The share of the transactions the rule failed.
+    """
+
+    rule_id: int
+    description: str
+    failures: int
+    errors: int
+    failure_rate: float
+
+
+class BacktestReport(BaseModel):
+    """
+    Outcome of a backtest.
+
+    Attributes:
+        transactions (int): The number of transactions replayed.
+        approved (int): The number of transactions every rule passed.
+        rejected (int): The number of transactions some rule failed.
+        approval_rate (float): The share of the transactions approved.
+        last_id (Optional[int]): The highest transaction ID replayed.
+        rules (List[BacktestRuleReport]): The outcome of each rule.
+    """
+
+    transactions: int
+    approved: int
+    rejected: int
+    approval_rate: float
+    last_id: Optional[int]
+    rules: List[BacktestRuleReport]
+
+
+class BacktestJob(BaseModel):
+    """
+    Model for a backtest run in the background.
+
+    Attributes:
+        id (str): The ID of the job.
+        status (str): "pending", "running", "succeeded", "failed" or "cancelled".
+        processed (int): The number of transactions replayed so far.
+        total (Optional[int]): The number of transactions to replay, once known.
+        report (Optional[BacktestReport]): The outcome, once succeeded.
+        error (Optional[str]): The error, once failed.
+        created_at (float): When the job was submitted, in seconds since the epoch.
+        started_at (Optional[float]): When the replay started.
+        finished_at (Optional[float]): When the replay ended.
+    """
+
+    id: str
+    status: str
+    processed: int
+    total: Optional[int]
+    report: Optional[BacktestReport]
+    error: Optional[str]
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,47 @@
+# app/schemas/ingestion.py
+
+from typing import List, Optional
+from pydantic import BaseModel
+
+
+class ChunkResult(BaseModel):
+    """
+    Outcome of one chunk of a bulk ingestion.
+
+    Attributes:
+        chunk (int): The position of the chunk in the body, starting at 0.
+        inserted (int): Number of new transactions written.
+        updated (int): Number of existing transactions overwritten.
+        skipped (int): Number of records whose transaction_id already existed or was
+            repeated in the chunk.
+        failed (int): Number of records that were invalid or could not be written.
+        errors (List[str]): The first errors of the chunk.
+    """
+
+    chunk: int
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+    failed: int = 0
+    errors: List[str] = []
+
+
+class BulkIngestionResponse(BaseModel):
+    """
+    Outcome of a bulk ingestion.
+
+    Attributes:
+        chunks (List[ChunkResult]): The outcome of each chunk, in order.
+        inserted (int): Total number of new transactions written.
+        updated (int): Total number of existing transactions overwritten.
+        skipped (int): Total number of records skipped.
+        failed (int): Total number of records that failed.
+        error (Optional[str]): Why the body could not be read to the end, if it could not.
+    """
+
+    chunks: List[ChunkResult] = []
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+    failed: int = 0
+    error: Optional[str] = None
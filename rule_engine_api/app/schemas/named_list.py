@@ -0,0 +1,62 @@
+# app/schemas/named_list.py
+
+from typing import List, Literal
+from pydantic import BaseModel, Field
+
+
+class NamedListCreate(BaseModel):
+    """
+    Model for creating a named list.
+
+    Attributes:
+        name (str): The name rules refer to the list by, e.g. "blocked_ips".
+        kind (str): How values match: "exact" for equal values ignoring case, "cidr" for
+            IP addresses in a network, or "domain" for email addresses of a domain or of
+            its subdomains.
+    """
+
+    name: str = Field(pattern=r"^[A-Za-z0-9_.-]{1,100}$")
+    kind: Literal["exact", "cidr", "domain"] = "exact"
+
+
+class NamedList(BaseModel):
+    """
+    Model for a named list loaded by the API.
+
+    Attributes:
+        name (str): The name of the list.
+        kind (str): How values match.
+        size (int): The number of values in the list.
+    """
+
+    name: str
+    kind: str
+    size: int
+
+
+class NamedListUpdate(BaseModel):
+    """
+    Model for changing the values of a named list.
+
+    Attributes:
+        add (List[str]): Values to add; values already present are ignored.
+        remove (List[str]): Values to remove; values absent are ignored.
+    """
+
+    add: List[str] = []
+    remove: List[str] = []
+
+
+class NamedListUpdateResult(BaseModel):
+    """
+    Outcome of a change to the values of a named list.
+
+    Attributes:
+        added (int): The number of values added.
+        removed (int): The number of values removed.
+        revision (int): The revision of the lists on this worker after the change.
+    """
+
+    added: int
+    removed: int
+    revision: int
@@ -1,11 +1,18 @@
+from typing import Optional
 from pydantic import BaseModel
 
 
 class StandardResponse(BaseModel):
     """
     Standardized response model.
+
+    Attributes:
+        fallback (Optional[bool]): True when the rules could not be evaluated before
+            the deadline and the status is the configured fallback decision; left out
+            of the response otherwise.
     """
 
     status: str
     status_code: int
     message: str
+    fallback: Optional[bool] = None
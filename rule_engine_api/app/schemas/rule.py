@@ -1,6 +1,7 @@
 # app/schemas/rule.py
 
-from pydantic import BaseModel
+from typing import Literal, Optional
+from pydantic import BaseModel, field_validator
 
 
 class RuleBase(BaseModel):
@@ -10,10 +11,19 @@ class RuleBase(BaseModel):
     Attributes:
         description (str): A brief description of the rule.
         rule (str): The rule logic as a string.
+        scope (Optional[str]): The transactions the rule applies to, e.g.
+            "merchant_id:M42" or "client_id:C7", or None if it applies to every
+            transaction.
+        status (str): "active" if the rule decides, "shadow" if it is only evaluated
+            after the response, to compare its outcomes with the decisions, or
+            "quarantined" if it is not evaluated because it repeatedly ran over its
+            time budget.
     """
 
     description: str
     rule: str
+    scope: Optional[str] = None
+    status: Literal["active", "shadow", "quarantined"] = "active"
 
 
 class RuleCreate(RuleBase):
@@ -27,15 +37,32 @@ class RuleCreate(RuleBase):
     pass
 
 
-class RuleUpdate(RuleBase):
+class RuleUpdate(BaseModel):
     """
     Model for updating an existing rule.
 
-    Inherits from:
-        RuleBase: The base model for rules.
+    Only the fields set in the request are changed: a rule keeps its scope and its
+    status unless they are given, and `"scope": null` makes it apply to every
+    transaction.
+
+    Attributes:
+        description (Optional[str]): The new description of the rule.
+        rule (Optional[str]): The new rule logic.
+        scope (Optional[str]): The new scope of the rule.
+        status (Optional[str]): The new status of the rule.
     """
 
-    pass
+    description: Optional[str] = None
+    rule: Optional[str] = None
+    scope: Optional[str] = None
+    status: Optional[Literal["active", "shadow", "quarantined"]] = None
+
+    @field_validator("description", "rule", "status")
+    @classmethod
+    def not_null(cls, value):
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
 
 
 class Rule(RuleBase):
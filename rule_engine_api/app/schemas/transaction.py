@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing_extensions import TypedDict
 
 
 class TransactionBase(BaseModel):
@@ -52,3 +53,11 @@ class Transaction(TransactionBase):
 
     class Config:
         from_attributes = True
+
+
+# Plain dictionary form of a transaction, validated like TransactionBase. Validating
+# JSON straight into it skips building a model instance and dumping it again.
+TransactionRecord = TypedDict(
+    "TransactionRecord",
+    {name: field.annotation for name, field in TransactionBase.model_fields.items()},
+)
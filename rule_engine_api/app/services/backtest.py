@@ -0,0 +1,504 @@
+# app/services/backtest.py
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+from sqlalchemy.orm import sessionmaker
+from app.db import crud
+from app.services.named_lists import NamedListRegistry
+from app.services.rule_compiler import ACTIVE, QUARANTINED, TRANSACTION_FIELDS
+from app.services.rule_executor import RuleDefinition
+from app.services.rule_fusion import FusedEvaluator, build_fused_evaluator
+from app.services.rule_set import RuleSet, assemble_rule_set, load_rule
+
+logger = logging.getLogger(__name__)
+
+# Columns of the stored transactions read by the rules, after the ID
+FIELDS = tuple(TRANSACTION_FIELDS)
+
+# Job statuses
+PENDING = "pending"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Callback receiving the number of transactions replayed so far and the total
+Progress = Callable[[int, int], None]
+
+
+class BacktestError(Exception):
+    """
+    Raised when a rule set cannot be backtested.
+    """
+
+
+class BacktestQueueFullError(Exception):
+    """
+    Raised when a backtest cannot be queued because too many are unfinished.
+    """
+
+
+class BacktestCancelled(Exception):
+    """
+    Raised when a backtest is cancelled before it replayed every transaction.
+    """
+
+
+class BacktestStats:
+    """
+    Aggregates of a backtest, merged from the partial aggregates of each chunk.
+
+    Attributes:
+        transactions (int): Number of transactions replayed.
+        approved (int): Number of transactions all the rules passed.
+        failures (Dict[int, int]): Number of transactions each rule failed, by rule ID.
+        errors (Dict[int, int]): Number of transactions each rule raised an error on, by
+            rule ID; these are counted as failures too.
+        last_id (Optional[int]): The highest transaction ID replayed.
+    """
+
+    def __init__(self):
+        self.transactions = 0
+        self.approved = 0
+        self.failures: Dict[int, int] = {}
+        self.errors: Dict[int, int] = {}
+        self.last_id: Optional[int] = None
+
+    def merge(self, other: "BacktestStats") -> None:
+        """
+        Add the aggregates of another part of the backtest to these.
+
+        Args:
+            other (BacktestStats): The partial aggregates.
+        """
+        self.transactions += other.transactions
+        self.approved += other.approved
+        for id, count in other.failures.items():
+            self.failures[id] = self.failures.get(id, 0) + count
+        for id, count in other.errors.items():
+            self.errors[id] = self.errors.get(id, 0) + count
+        if other.last_id is not None:
+            self.last_id = max(self.last_id or other.last_id, other.last_id)
+
+    def report(self, rules: Sequence[RuleDefinition]) -> dict:
+        """
+        Build the report of the backtest.
+
+        Args:
+            rules (Sequence[RuleDefinition]): The rules backtested.
+
+        Returns:
+            dict: The number of transactions replayed, approved and rejected, the
+            approval rate, and the failures, errors and failure rate of each rule.
+        """
+        total = self.transactions
+        return {
+            "transactions": total,
+            "approved": self.approved,
+            "rejected": total - self.approved,
+            "approval_rate": self.approved / total if total else 0.0,
+            "last_id": self.last_id,
+            "rules": [
+                {
+                    "rule_id": rule.id,
+                    "description": rule.description,
+                    "failures": self.failures.get(rule.id, 0),
+                    "errors": self.errors.get(rule.id, 0),
+                    "failure_rate": (
+                        self.failures.get(rule.id, 0) / total if total else 0.0
+                    ),
+                }
+                for rule in rules
+            ],
+        }
+
+
+def build_backtest_rule_set(rules: Sequence[RuleDefinition]) -> RuleSet:
+    """
+    Compile the rules of a backtest, every one of them as an active rule.
+
+    Args:
+        rules (Sequence[RuleDefinition]): The rules to backtest, in table order.
+
+    Returns:
+        RuleSet: The compiled rule set.
+
+    Raises:
+        BacktestError: If some rules use velocity functions, which stored transactions
+            cannot replay since they carry no timestamp.
+    """
+    rule_set = assemble_rule_set(
+        [load_rule(rule._replace(status=ACTIVE)) for rule in rules], 0
+    )
+    if rule_set.features:
+        raise BacktestError(
+            "Rules using velocity functions cannot be backtested: stored transactions "
+            "have no timestamp"
+        )
+    return rule_set
+
+
+class ChunkEvaluator:
+    """
+    Evaluate chunks of stored transactions against a rule set.
+
+    Each subset of the rules a transaction is routed to is fused like in
+    `apply_rule_set`, keeping the position of each failing rule so that failures are
+    counted per rule.
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[RuleDefinition],
+        lists: Dict[str, Tuple[str, List[str]]],
+    ):
+        self.rule_set = build_backtest_rule_set(rules)
+        self.registry = NamedListRegistry()
+        self.registry.replace(lists)
+        self._positions = {rule.id: i for i, rule in enumerate(self.rule_set.rules)}
+        self._evaluators: Dict[Tuple[str, ...], FusedEvaluator] = {}
+
+    def _evaluator(self, subset: RuleSet) -> FusedEvaluator:
+        evaluator = self._evaluators.get(subset.scope)
+        if evaluator is None:
+            evaluator = self._evaluators[subset.scope] = build_fused_evaluator(
+                subset.rules, [self._positions[rule.id] for rule in subset.rules]
+            )
+        return evaluator
+
+    def __call__(self, rows: List[Tuple]) -> BacktestStats:
+        stats = BacktestStats()
+        rules = self.rule_set.rules
+        failures, errors = stats.failures, stats.errors
+        lookups = self.rule_set.lookups
+        for row in rows:
+            transaction = dict(zip(FIELDS, row[1:]))
+            if lookups:
+                transaction = self.registry.resolve(transaction, lookups)
+            failed = self._evaluator(self.rule_set.route(transaction))(transaction)
+            if not failed:
+                stats.approved += 1
+            for position, message in failed:
+                rule = rules[position]
+                failures[rule.id] = failures.get(rule.id, 0) + 1
+                if message != rule.description:
+                    errors[rule.id] = errors.get(rule.id, 0) + 1
+        stats.transactions = len(rows)
+        if rows:
+            stats.last_id = rows[-1][0]
+        return stats
+
+
+# Evaluator of a worker process
+_worker_evaluator: Optional[ChunkEvaluator] = None
+
+
+def _init_worker(
+    rules: Sequence[RuleDefinition], lists: Dict[str, Tuple[str, List[str]]]
+) -> None:
+    """
+    Compile the rule set once when a worker process starts.
+    """
+    global _worker_evaluator
+    _worker_evaluator = ChunkEvaluator(rules, lists)
+
+
+def _evaluate_chunk(rows: List[Tuple]) -> BacktestStats:
+    return _worker_evaluator(rows)
+
+
+def run_backtest(
+    session_factory: sessionmaker,
+    rules: Sequence[RuleDefinition],
+    chunk_size: int = 10_000,
+    workers: Optional[int] = None,
+    start_id: Optional[int] = None,
+    end_id: Optional[int] = None,
+    progress: Optional[Progress] = None,
+    cancel: Optional[threading.Event] = None,
+) -> BacktestStats:
+    """
+    Replay stored transactions against a rule set.
+
+    Transactions are read in ID order through a server-side cursor, in chunks of
+    `chunk_size`, and each chunk is evaluated by a pool of worker processes. At most
+    two chunks per worker are in flight, and the partial aggregates of each chunk are
+    merged as soon as it is evaluated, so memory use does not grow with the number of
+    transactions.
+
+    Args:
+        session_factory (sessionmaker): Factory for database sessions.
+        rules (Sequence[RuleDefinition]): The rules to replay, in table order.
+        chunk_size (int, optional): Transactions per chunk. Defaults to 10000.
+        workers (Optional[int], optional): Number of worker processes, 0 to evaluate
+            in this process. Defaults to the number of CPUs.
+        start_id (Optional[int], optional): The first transaction ID replayed.
+            Defaults to None.
+        end_id (Optional[int], optional): The last transaction ID replayed. Defaults
+            to None.
+        progress (Optional[Progress], optional): Called after each chunk with the
+            number of transactions replayed and the total. Defaults to None.
+        cancel (Optional[threading.Event], optional): Set to stop the replay before
+            the next chunk. Defaults to None.
+
+    Returns:
+        BacktestStats: The aggregates of the whole replay.
+
+    Raises:
+        BacktestError: If the rules use velocity functions.
+        BacktestCancelled: If `cancel` was set before the end of the replay.
+    """
+    rules = tuple(rules)
+    rule_set = build_backtest_rule_set(rules)
+    workers = os.cpu_count() if workers is None else workers
+    stats = BacktestStats()
+    with session_factory() as db:
+        total = crud.count_transactions(db, start_id, end_id)
+        names = {lookup.list_name for lookup in rule_set.lookups}
+        lists = crud.get_named_list_values(db, names) if names else {}
+
+        def merge(part: BacktestStats) -> None:
+            stats.merge(part)
+            if progress is not None:
+                progress(stats.transactions, total)
+
+        if progress is not None:
+            progress(0, total)
+
+        def chunks():
+            for chunk in crud.stream_transactions(
+                db, FIELDS, chunk_size, start_id, end_id
+            ):
+                if cancel is not None and cancel.is_set():
+                    raise BacktestCancelled("Backtest cancelled")
+                yield chunk
+
+        if workers == 0:
+            evaluate = ChunkEvaluator(rules, lists)
+            for chunk in chunks():
+                merge(evaluate(chunk))
+            return stats
+
+        # Spawned workers do not inherit the event loop, threads or DB connections
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(rules, lists),
+        ) as pool:
+            pending: Set[Future] = set()
+            try:
+                for chunk in chunks():
+                    if len(pending) >= 2 * workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            merge(future.result())
+                    pending.add(pool.submit(_evaluate_chunk, chunk))
+                for future in pending:
+                    merge(future.result())
+            except BaseException:
+                pool.shutdown(cancel_futures=True)
+                raise
+    return stats
+
+
+class BacktestJob:
+    """
+    A backtest run in the background by the API.
+
+    Attributes:
+        id (str): The ID of the job.
+        status (str): "pending", "running", "succeeded", "failed" or "cancelled".
+        processed (int): Number of transactions replayed so far.
+        total (Optional[int]): Number of transactions to replay, once known.
+        report (Optional[dict]): The report, once succeeded.
+        error (Optional[str]): The error, once failed.
+    """
+
+    def __init__(self, rules: Sequence[RuleDefinition]):
+        self.id = uuid.uuid4().hex
+        self.rules = tuple(rules)
+        self.status = PENDING
+        self.processed = 0
+        self.total: Optional[int] = None
+        self.report: Optional[dict] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel = threading.Event()
+
+    def update(self, processed: int, total: int) -> None:
+        self.processed, self.total = processed, total
+
+
+class BacktestJobs:
+    """
+    Backtests run in the background, one at a time, on a thread driving the worker
+    processes.
+
+    Jobs are kept in memory by the API worker that started them; the oldest finished
+    jobs are forgotten beyond `max_jobs`, and no job is queued while `max_jobs` are
+    unfinished.
+
+    Attributes:
+        max_jobs (int): Maximum number of jobs kept, and of unfinished jobs.
+        chunk_size (int): Transactions per chunk.
+        workers (int): Number of worker processes per backtest, 0 to evaluate on a
+            thread of the API process.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker,
+        max_jobs: int = 32,
+        chunk_size: int = 10_000,
+        workers: int = 2,
+    ):
+        self.session_factory = session_factory
+        self.max_jobs = max_jobs
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self._jobs: "OrderedDict[str, BacktestJob]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def get(self, job_id: str) -> Optional[BacktestJob]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[BacktestJob]:
+        return list(self._jobs.values())
+
+    def submit(
+        self,
+        rules: Sequence[RuleDefinition],
+        start_id: Optional[int] = None,
+        end_id: Optional[int] = None,
+    ) -> BacktestJob:
+        """
+        Start a backtest in the background.
+
+        Args:
+            rules (Sequence[RuleDefinition]): The rules to replay, in table order.
+            start_id (Optional[int], optional): The first transaction ID replayed.
+                Defaults to None.
+            end_id (Optional[int], optional): The last transaction ID replayed.
+                Defaults to None.
+
+        Returns:
+            BacktestJob: The job, pending until the backtests started before are done.
+
+        Raises:
+            BacktestError: If the rules cannot be backtested.
+            BacktestQueueFullError: If `max_jobs` jobs are unfinished.
+        """
+        build_backtest_rule_set(rules)
+        unfinished = sum(
+            job.status not in (SUCCEEDED, FAILED, CANCELLED)
+            for job in self._jobs.values()
+        )
+        if unfinished >= self.max_jobs:
+            raise BacktestQueueFullError(f"{unfinished} backtests are unfinished")
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        job = BacktestJob(rules)
+        self._jobs[job.id] = job
+        self._forget()
+        task = asyncio.create_task(self._run(job, start_id, end_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def _forget(self) -> None:
+        finished = [
+            id
+            for id, job in self._jobs.items()
+            if job.status in (SUCCEEDED, FAILED, CANCELLED)
+        ]
+        for id in finished[: max(len(self._jobs) - self.max_jobs, 0)]:
+            del self._jobs[id]
+
+    async def _run(
+        self, job: BacktestJob, start_id: Optional[int], end_id: Optional[int]
+    ) -> None:
+        async with self._lock:
+            if job.cancel.is_set():
+                job.status, job.finished_at = CANCELLED, time.time()
+                return
+            job.status, job.started_at = RUNNING, time.time()
+            try:
+                stats = await asyncio.to_thread(
+                    run_backtest,
+                    self.session_factory,
+                    job.rules,
+                    self.chunk_size,
+                    self.workers,
+                    start_id,
+                    end_id,
+                    job.update,
+                    job.cancel,
+                )
+            except BacktestCancelled:
+                job.status = CANCELLED
+            except Exception as e:
+                logger.exception("Backtest %s failed", job.id)
+                job.status, job.error = FAILED, str(e)
+            else:
+                job.status, job.report = SUCCEEDED, stats.report(job.rules)
+            job.finished_at = time.time()
+
+    def cancel(self, job_id: str) -> Optional[BacktestJob]:
+        """
+        Cancel a pending or running backtest; a running one stops before its next
+        chunk.
+
+        Args:
+            job_id (str): The ID of the job.
+
+        Returns:
+            Optional[BacktestJob]: The job, or None if it is unknown.
+        """
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.cancel.set()
+        return job
+
+    async def stop(self) -> None:
+        """
+        Cancel every backtest and wait for the running one to stop.
+        """
+        for job in self._jobs.values():
+            job.cancel.set()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def rule_definitions(rules) -> List[RuleDefinition]:
+    """
+    Convert stored or submitted rules to the plain rules replayed.
+
+    Args:
+        rules: Rules with a description, a rule and a scope, and an ID for stored
+            rules; rules without an ID are numbered from 1, in order.
+
+    Returns:
+        List[RuleDefinition]: The rules, but the quarantined ones.
+    """
+    return [
+        RuleDefinition(
+            getattr(rule, "id", None) or index,
+            rule.description,
+            rule.rule,
+            rule.scope,
+            ACTIVE,
+        )
+        for index, rule in enumerate(rules, 1)
+        if rule.status != QUARANTINED
+    ]
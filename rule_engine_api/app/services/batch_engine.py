@@ -0,0 +1,393 @@
+# app/services/batch_engine.py
+
+import ast
+import operator
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+import numpy as np
+from app.services.rule_compiler import CompiledRule, field_name, field_type, is_field
+from app.services.rule_set import RuleSet
+
+# A vectorized rule takes the columns of a batch and returns the mask of passing rows
+VectorizedRule = Callable[[Dict[str, np.ndarray]], np.ndarray]
+
+_NUMERIC = "numeric"
+_STRING = "string"
+_BOOLEAN = "boolean"
+
+
+def _case_mapping(method: str) -> Callable[[np.ndarray], np.ndarray]:
+    """
+    Map the case of a string column with the Python method, in a new array sized to the
+    longest result: NumPy case mappings keep the width of their input and truncate the
+    strings that get longer, such as 'İ'.lower() or 'ß'.upper().
+    """
+    mapping = getattr(str, method)
+
+    def transform(column: np.ndarray) -> np.ndarray:
+        if not isinstance(column, np.ndarray):
+            return mapping(column)
+        return np.array([mapping(value) for value in column.tolist()], dtype=np.str_)
+
+    return transform
+
+
+_STRING_TRANSFORMS = {
+    "lower": _case_mapping("lower"),
+    "upper": _case_mapping("upper"),
+    "strip": np.char.strip,
+    "lstrip": np.char.lstrip,
+    "rstrip": np.char.rstrip,
+}
+_STRING_PREDICATES = {
+    "startswith": np.char.startswith,
+    "endswith": np.char.endswith,
+}
+_NUMERIC_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+}
+_ORDERING_OPERATORS = {
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+}
+_EQUALITY_OPERATORS = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+}
+
+
+class BatchPlan(NamedTuple):
+    """
+    How each rule of a rule set is evaluated over a batch.
+
+    Attributes:
+        rules (Tuple[CompiledRule, ...]): The rules, in table order.
+        vectorized (Tuple[Optional[VectorizedRule], ...]): The vectorized form of each rule,
+            or None if the rule is evaluated row by row.
+    """
+
+    rules: Tuple[CompiledRule, ...]
+    vectorized: Tuple[Optional[VectorizedRule], ...]
+
+
+class _Unsupported(Exception):
+    """
+    Raised internally when an expression has no exact vectorized equivalent.
+    """
+
+
+def _is_exact_number(value) -> bool:
+    """
+    Numbers that compare the same as Python numbers once converted to float64.
+    """
+    if isinstance(value, bool):
+        return False
+    return isinstance(value, float) or (isinstance(value, int) and abs(value) <= 2**53)
+
+
+def _vectorize(node: ast.expr) -> Tuple[str, Callable]:
+    """
+    Translate an expression into a function of the columns.
+
+    Only expressions whose NumPy evaluation matches Python semantics exactly, and which
+    cannot raise, are translated.
+
+    Returns:
+        Tuple[str, Callable]: The kind of value produced and the function producing it.
+    """
+    if is_field(node):
+        name = field_name(node)
+        if field_type(name) is bool:
+            # List lookups may be unknown lists, which fail when tested
+            raise _Unsupported()
+        kind = _NUMERIC if field_type(name) is float else _STRING
+        return kind, lambda columns: columns[name]
+
+    if isinstance(node, ast.Constant):
+        value = node.value
+        if _is_exact_number(value):
+            return _NUMERIC, lambda columns: value
+        if isinstance(value, str) and "\x00" not in value:
+            return _STRING, lambda columns: value
+        raise _Unsupported()
+
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+        method = node.func.attr
+        kind, target = _vectorize(node.func.value)
+        if kind != _STRING:
+            raise _Unsupported()
+        if method in _STRING_TRANSFORMS and not node.args:
+            transform = _STRING_TRANSFORMS[method]
+            return _STRING, lambda columns: transform(target(columns))
+        if method in _STRING_PREDICATES and len(node.args) == 1:
+            arg = node.args[0]
+            if not (isinstance(arg, ast.Constant) and isinstance(arg.value, str)):
+                raise _Unsupported()
+            predicate, affix = _STRING_PREDICATES[method], arg.value
+            if "\x00" in affix:
+                raise _Unsupported()
+            return _BOOLEAN, lambda columns: predicate(target(columns), affix)
+        raise _Unsupported()
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _NUMERIC_OPERATORS:
+        left_kind, left = _vectorize(node.left)
+        right_kind, right = _vectorize(node.right)
+        if left_kind != _NUMERIC or right_kind != _NUMERIC:
+            raise _Unsupported()
+        op = _NUMERIC_OPERATORS[type(node.op)]
+        return _NUMERIC, lambda columns: op(left(columns), right(columns))
+
+    if isinstance(node, ast.Compare):
+        nodes = [node.left] + node.comparators
+        parts = [
+            _compare(op_node, left_node, right_node)
+            for op_node, left_node, right_node in zip(node.ops, nodes, nodes[1:])
+        ]
+        if len(parts) == 1:
+            return _BOOLEAN, parts[0]
+        return _BOOLEAN, lambda columns: np.logical_and.reduce(
+            [part(columns) for part in parts]
+        )
+
+    if isinstance(node, ast.BoolOp):
+        operands = [_vectorize(value) for value in node.values]
+        if any(kind != _BOOLEAN for kind, _ in operands):
+            raise _Unsupported()
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        functions = [fn for _, fn in operands]
+        return _BOOLEAN, lambda columns: combine.reduce(
+            [fn(columns) for fn in functions]
+        )
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        kind, operand = _vectorize(node.operand)
+        if kind != _BOOLEAN:
+            raise _Unsupported()
+        return _BOOLEAN, lambda columns: np.logical_not(operand(columns))
+
+    raise _Unsupported()
+
+
+def _compare(op_node: ast.cmpop, left_node: ast.expr, right_node: ast.expr) -> Callable:
+    """
+    Translate a single comparison into a function returning a mask.
+    """
+    op_type = type(op_node)
+    left_kind, left = _vectorize(left_node)
+
+    if op_type in (ast.In, ast.NotIn):
+        values = getattr(right_node, "value", None)
+        if not isinstance(right_node, ast.Constant) or not isinstance(
+            values, (tuple, frozenset)
+        ):
+            raise _Unsupported()
+        if left_kind == _NUMERIC and all(_is_exact_number(v) for v in values):
+            choices = np.array(list(values), dtype=np.float64)
+        elif left_kind == _STRING and all(
+            isinstance(v, str) and "\x00" not in v for v in values
+        ):
+            choices = np.array(list(values), dtype=np.str_)
+        else:
+            raise _Unsupported()
+        invert = op_type is ast.NotIn
+        return lambda columns: np.isin(left(columns), choices, invert=invert)
+
+    right_kind, right = _vectorize(right_node)
+    if op_type in _ORDERING_OPERATORS:
+        if left_kind != _NUMERIC or right_kind != _NUMERIC:
+            raise _Unsupported()
+        op = _ORDERING_OPERATORS[op_type]
+    elif op_type in _EQUALITY_OPERATORS:
+        if left_kind != right_kind or left_kind == _BOOLEAN:
+            raise _Unsupported()
+        op = _EQUALITY_OPERATORS[op_type]
+    else:
+        raise _Unsupported()
+    return lambda columns: np.broadcast_to(
+        op(left(columns), right(columns)), _batch_size(columns)
+    )
+
+
+def _batch_size(columns: Dict[str, np.ndarray]) -> int:
+    return len(next(iter(columns.values())))
+
+
+def vectorize_rule(rule: CompiledRule) -> Optional[VectorizedRule]:
+    """
+    Build the vectorized form of a rule, if it has one.
+
+    Args:
+        rule (CompiledRule): The rule to vectorize.
+
+    Returns:
+        Optional[VectorizedRule]: A function returning the mask of passing rows, or None if
+        the rule must be evaluated row by row.
+    """
+    if rule.error is not None or rule.expression is None:
+        return None
+    try:
+        kind, fn = _vectorize(rule.expression)
+    except _Unsupported:
+        return None
+    return fn if kind == _BOOLEAN else None
+
+
+def build_batch_plan(rules: Sequence[CompiledRule]) -> BatchPlan:
+    """
+    Decide how each rule is evaluated over a batch.
+
+    Args:
+        rules (Sequence[CompiledRule]): The rules to plan.
+
+    Returns:
+        BatchPlan: The plan for the rules.
+    """
+    rules = tuple(rules)
+    return BatchPlan(rules, tuple(vectorize_rule(rule) for rule in rules))
+
+
+# Rule set version, and the plan of the whole rule set or of each of its subsets
+_cached_plans: Tuple[Optional[int], Dict[Optional[Tuple[str, ...]], BatchPlan]] = (
+    None,
+    {},
+)
+
+
+def get_batch_plan(rule_set: RuleSet) -> BatchPlan:
+    """
+    Return the batch plan of a rule set snapshot, building it once per version.
+
+    Args:
+        rule_set (RuleSet): The rule set snapshot, or one of its scoped subsets.
+
+    Returns:
+        BatchPlan: The plan for the rules of the snapshot.
+    """
+    global _cached_plans
+    version, plans = _cached_plans
+    if version != rule_set.version:
+        plans = {}
+        _cached_plans = (rule_set.version, plans)
+    # A routed rule set holds the rules of every scope, unlike its subsets
+    key = None if rule_set.routes is not None else rule_set.scope
+    plan = plans.get(key)
+    if plan is None:
+        plan = plans[key] = build_batch_plan(rule_set.rules)
+    return plan
+
+
+def to_columns(transactions: List[dict], fields) -> Dict[str, np.ndarray]:
+    """
+    Load transactions into one array per field.
+
+    Args:
+        transactions (List[dict]): The transactions of the batch.
+        fields (Iterable[str]): The fields to load.
+
+    Returns:
+        Dict[str, np.ndarray]: The columns, keyed by field name.
+    """
+    columns = {}
+    for name in fields:
+        values = [transaction[name] for transaction in transactions]
+        if field_type(name) is float:
+            columns[name] = np.array(values, dtype=np.float64)
+        else:
+            columns[name] = np.array(values, dtype=np.str_)
+    return columns
+
+
+def _has_nul(transactions: List[dict], fields) -> bool:
+    """
+    NumPy strips trailing NUL characters from strings, so such batches are not vectorized.
+    """
+    return any(
+        "\x00" in transaction[name]
+        for name in fields
+        if field_type(name) is str
+        for transaction in transactions
+    )
+
+
+def apply_rules_batch(
+    transactions: List[dict], plan: BatchPlan
+) -> List[Dict[str, Union[bool, str]]]:
+    """
+    Apply rules to a batch of transactions.
+
+    Vectorized rules run once over the whole batch; the other rules are evaluated row by
+    row. The result for each transaction is the same as `apply_rules` would return.
+
+    Args:
+        transactions (List[dict]): The transactions to check.
+        plan (BatchPlan): The evaluation plan of the rules.
+
+    Returns:
+        List[dict]: One evaluation result per transaction, in order.
+    """
+    fail_messages = [[] for _ in transactions]
+    vectorized_fields = {
+        name
+        for rule, fn in zip(plan.rules, plan.vectorized)
+        if fn is not None
+        for name in rule.fields
+    }
+    use_columns = bool(transactions) and not _has_nul(transactions, vectorized_fields)
+    columns = to_columns(transactions, vectorized_fields) if use_columns else None
+
+    for rule, vectorized in zip(plan.rules, plan.vectorized):
+        if vectorized is not None and columns is not None:
+            for index in np.flatnonzero(~vectorized(columns)):
+                fail_messages[index].append(rule.description)
+            continue
+        for index, transaction in enumerate(transactions):
+            try:
+                if rule.error is not None:
+                    raise rule.error
+                if not rule.fn(transaction):
+                    fail_messages[index].append(rule.description)
+            except Exception as e:
+                fail_messages[index].append(f"'{rule.description}' ==> {e}")
+
+    return [
+        {"has_succeeded": len(messages) == 0, "message": "\n".join(messages)}
+        for messages in fail_messages
+    ]
+
+
+def apply_rule_set_batch(
+    transactions: List[dict], rule_set: RuleSet
+) -> List[Dict[str, Union[bool, str]]]:
+    """
+    Apply a rule set to a batch of transactions.
+
+    If some rules are scoped, the transactions are grouped by the subset of the rules
+    that apply to them, and each group is evaluated with the plan of its subset.
+
+    Args:
+        transactions (List[dict]): The transactions to check.
+        rule_set (RuleSet): The rule set snapshot to apply.
+
+    Returns:
+        List[dict]: One evaluation result per transaction, in order.
+    """
+    if rule_set.routes is None:
+        return apply_rules_batch(transactions, get_batch_plan(rule_set))
+    groups: Dict[Tuple[str, ...], Tuple[RuleSet, List[int]]] = {}
+    for index, transaction in enumerate(transactions):
+        subset = rule_set.route(transaction)
+        group = groups.get(subset.scope)
+        if group is None:
+            group = groups[subset.scope] = (subset, [])
+        group[1].append(index)
+    checks: List[Optional[Dict[str, Union[bool, str]]]] = [None] * len(transactions)
+    for subset, indices in groups.values():
+        group_checks = apply_rules_batch(
+            [transactions[index] for index in indices], get_batch_plan(subset)
+        )
+        for index, check in zip(indices, group_checks):
+            checks[index] = check
+    return checks
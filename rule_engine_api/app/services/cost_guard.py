@@ -0,0 +1,272 @@
+# app/services/cost_guard.py
+
+import asyncio
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.db import async_crud
+from app.services.metrics import Observation
+from app.services.rule_set import RuleSet, refresh_rule_set
+
+logger = logging.getLogger(__name__)
+
+# A rule, by its ID and logic, so that changing it clears its strikes
+RuleKey = Tuple[int, str]
+
+
+class CostGuard:
+    """
+    Quarantine the rules that repeatedly run over their time budget.
+
+    A rule gets a strike every time one of its evaluations takes more than
+    `rule_budget_ms`: evaluations are timed on the sampled requests and, once a check
+    misses its deadline, a background task replays the transactions of the check rule
+    by rule, on a thread, to find the rules that made it slow. After
+    `quarantine_strikes` strikes a rule is quarantined in the database, so every worker
+    stops evaluating it, until it is updated.
+
+    Replays run one at a time on a single thread, and stop before their next rule
+    after `replay_timeout_ms`. A rule still running then gets its strike without
+    waiting for it, and the checks reported until it returns are dropped, so a slow
+    rule never holds more than that thread.
+
+    Attributes:
+        rule_budget_ms (float): Longest evaluation of a rule without a strike.
+        quarantine_strikes (int): Strikes after which a rule is quarantined.
+        max_queue_size (int): Maximum number of checks waiting to be replayed.
+        sample_size (int): Maximum number of transactions replayed per check.
+        replay_timeout_ms (float): Longest replay of a check.
+        timeouts (int): Number of checks that missed their deadline.
+        dropped (int): Number of checks not replayed because the queue was full or
+            the previous replay was still running past its timeout.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        rule_budget_ms: float = 10.0,
+        quarantine_strikes: int = 3,
+        max_queue_size: int = 100,
+        sample_size: int = 8,
+        replay_timeout_ms: float = 1000.0,
+    ):
+        self.session_factory = session_factory
+        self.rule_budget_ms = rule_budget_ms
+        self.quarantine_strikes = quarantine_strikes
+        self.max_queue_size = max_queue_size
+        self.sample_size = sample_size
+        self.replay_timeout_ms = replay_timeout_ms
+        self.timeouts = 0
+        self.dropped = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._quarantines: Set[asyncio.Task] = set()
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._replay: Optional[Future] = None
+        # The rule being replayed and when it started
+        self._replaying: Optional[tuple] = None
+        self._strikes: Dict[RuleKey, int] = {}
+        # Rules quarantined by this worker: ID -> description, logic, slowest time, when
+        self._quarantined: Dict[int, dict] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """
+        Start the background replay task on the running event loop.
+        """
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the background task, dropping the checks still queued, and wait for the
+        quarantines being written.
+        """
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await asyncio.gather(*self._quarantines, return_exceptions=True)
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._threads = None
+
+    def observe(self, rule_set: RuleSet, observations: List[Observation]) -> None:
+        """
+        Give strikes to the rules whose timed evaluations ran over budget.
+
+        Args:
+            rule_set (RuleSet): The rule set the observations were made on.
+            observations (List[Observation]): The outcome and evaluation time of the
+                rules of a sampled check.
+        """
+        budget = self.rule_budget_ms * 1_000_000
+        slow = {id: ns for id, _, ns in observations if ns > budget}
+        if slow:
+            self._strike(
+                [
+                    (rule, slow[rule.id] / 1_000_000)
+                    for rule in rule_set.rules
+                    if rule.id in slow
+                ]
+            )
+
+    def submit(self, rule_set: RuleSet, transactions: Sequence[dict]) -> bool:
+        """
+        Report a check that missed its deadline, to find the rules that made it slow.
+
+        Args:
+            rule_set (RuleSet): The rule set of the check.
+            transactions (Sequence[dict]): The transactions of the check, with their
+                velocity features and list lookups.
+
+        Returns:
+            bool: False if the check was dropped because the queue was full.
+        """
+        self.timeouts += 1
+        if not self.running:
+            self.start()
+        try:
+            self._queue.put_nowait((rule_set, transactions[: self.sample_size]))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        return True
+
+    def replay(self, rule_set: RuleSet, transactions: Sequence[dict]) -> List[tuple]:
+        """
+        Evaluate the rules of a check one by one, timing each of them, until the
+        replay has taken `replay_timeout_ms`.
+
+        Args:
+            rule_set (RuleSet): The rule set of the check.
+            transactions (Sequence[dict]): The transactions of the check.
+
+        Returns:
+            List[tuple]: Each rule that ran over budget, with its slowest time in ms.
+        """
+        slowest: Dict[int, tuple] = {}
+        stop_at = time.perf_counter() + self.replay_timeout_ms / 1000
+        for transaction in transactions:
+            for rule in rule_set.route(transaction).rules:
+                if rule.error is not None:
+                    continue
+                start = time.perf_counter()
+                if start > stop_at:
+                    return list(slowest.values())
+                self._replaying = (rule, start)
+                try:
+                    rule.fn(transaction)
+                except Exception:
+                    pass
+                finally:
+                    self._replaying = None
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                if elapsed_ms > max(
+                    self.rule_budget_ms, slowest.get(rule.id, (0, 0))[1]
+                ):
+                    slowest[rule.id] = (rule, elapsed_ms)
+        return list(slowest.values())
+
+    async def _run(self) -> None:
+        while True:
+            rule_set, transactions = await self._queue.get()
+            if self._replay is not None and not self._replay.done():
+                # The previous replay is stuck in a rule that already got its strike
+                self.dropped += 1
+                continue
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="cost-guard"
+                )
+            try:
+                self._replay = self._threads.submit(self.replay, rule_set, transactions)
+                replay = asyncio.wrap_future(self._replay)
+                done, _ = await asyncio.wait(
+                    {replay}, timeout=self.replay_timeout_ms / 1000
+                )
+                self._strike(replay.result() if done else self._running_rule())
+            except Exception:
+                logger.exception("Failed to replay a check over its deadline")
+
+    def _running_rule(self) -> List[tuple]:
+        """
+        Return the rule the replay is stuck in, if it already ran over budget.
+        """
+        replaying = self._replaying
+        if replaying is None:
+            return []
+        rule, start = replaying
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        return [(rule, elapsed_ms)] if elapsed_ms > self.rule_budget_ms else []
+
+    def _strike(self, slow: List[tuple]) -> None:
+        guilty = []
+        for rule, elapsed_ms in slow:
+            key = (rule.id, rule.rule)
+            strikes = self._strikes[key] = self._strikes.get(key, 0) + 1
+            logger.warning(
+                "Rule %s took %.1f ms, strike %s of %s",
+                rule.id,
+                elapsed_ms,
+                strikes,
+                self.quarantine_strikes,
+            )
+            if strikes >= self.quarantine_strikes:
+                del self._strikes[key]
+                guilty.append((rule, elapsed_ms))
+        if guilty:
+            task = asyncio.get_running_loop().create_task(self._quarantine(guilty))
+            self._quarantines.add(task)
+            task.add_done_callback(self._quarantines.discard)
+
+    async def _quarantine(self, guilty: List[tuple]) -> None:
+        try:
+            async with self.session_factory() as db:
+                quarantined = set(
+                    await async_crud.quarantine_rules(
+                        db, [(rule.id, rule.rule) for rule, _ in guilty]
+                    )
+                )
+                await refresh_rule_set(db)
+        except Exception:
+            logger.exception("Failed to quarantine rules")
+            return
+        for rule, elapsed_ms in guilty:
+            self._strikes.pop((rule.id, rule.rule), None)
+            if rule.id in quarantined:
+                logger.warning("Rule %s quarantined: %s", rule.id, rule.description)
+                self._quarantined[rule.id] = {
+                    "rule_id": rule.id,
+                    "description": rule.description,
+                    "rule": rule.rule,
+                    "slowest_ms": round(elapsed_ms, 3),
+                    "quarantined_at": time.time(),
+                }
+
+    def stats(self) -> dict:
+        """
+        Read the counters of the guard.
+
+        Returns:
+            dict: The number of checks that missed their deadline and of checks not
+            replayed, the strikes of each rule not quarantined yet, and the rules this
+            worker quarantined.
+        """
+        return {
+            "timeouts": self.timeouts,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "strikes": [
+                {"rule_id": id, "strikes": strikes}
+                for (id, _), strikes in self._strikes.items()
+            ],
+            "quarantined": list(self._quarantined.values()),
+        }
@@ -0,0 +1,166 @@
+# app/services/decision_cache.py
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple, Union
+from app.services.named_lists import UnknownList
+from app.services.rule_set import RuleSet
+
+Decision = Dict[str, Union[bool, str]]
+
+# Key part of the lookups in lists that do not exist, whose values compare by identity
+UNKNOWN_LIST = "<unknown list>"
+
+
+def _entry_size(key: Tuple, decision: Decision) -> int:
+    """
+    Estimate the memory held by a cache entry, in bytes.
+    """
+    return (
+        sys.getsizeof(key)
+        + sum(sys.getsizeof(part) for part in key)
+        + sys.getsizeof(decision)
+        + sys.getsizeof(decision["message"])
+    )
+
+
+class DecisionCache:
+    """
+    LRU and TTL cache of evaluation results.
+
+    Entries are keyed on the rule set version and on the values of only the fields the
+    rule set reads, so transactions that differ in fields no rule looks at share an
+    entry. A new rule set version drops every entry of the previous one.
+
+    Attributes:
+        max_entries (int): Maximum number of entries.
+        max_bytes (int): Maximum estimated memory held by the entries.
+        ttl (float): Seconds an entry stays valid.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 100_000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (expiry time, decision, estimated size)
+        self._entries: "OrderedDict[Tuple, Tuple[float, Decision, int]]" = OrderedDict()
+        self._bytes = 0
+        self._version: Optional[int] = None
+        self._fields: Tuple[str, ...] = ()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def key(self, rule_set: RuleSet, transaction: dict, mode: Hashable) -> Tuple:
+        """
+        Build the cache key of a transaction.
+
+        Args:
+            rule_set (RuleSet): The rule set snapshot the transaction is checked against.
+            transaction (dict): Dictionary containing transaction data.
+            mode (Hashable): The evaluation mode, which changes the result.
+
+        Returns:
+            Tuple: The rule set version, the mode and the values of the fields it reads.
+        """
+        if self._version is None or rule_set.version > self._version:
+            self._invalidate(rule_set)
+        if rule_set.version == self._version:
+            fields = self._fields
+        else:
+            # A request still holding an older snapshot; put() will not store it
+            fields = tuple(sorted(rule_set.fields))
+        return (rule_set.version, mode) + tuple(
+            UNKNOWN_LIST if isinstance(value, UnknownList) else value
+            for value in map(transaction.__getitem__, fields)
+        )
+
+    def _invalidate(self, rule_set: RuleSet) -> None:
+        with self._lock:
+            if self._version is not None and rule_set.version <= self._version:
+                return
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._fields = tuple(sorted(rule_set.fields))
+            self._version = rule_set.version
+
+    def get(self, key: Tuple) -> Optional[Decision]:
+        """
+        Return the cached decision for a key.
+
+        Args:
+            key (Tuple): The cache key.
+
+        Returns:
+            Optional[Decision]: The cached decision, or None on a miss.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] < self._clock():
+                del self._entries[key]
+                self._bytes -= entry[2]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple, decision: Decision) -> None:
+        """
+        Store a decision, evicting the least recently used entries beyond the limits.
+
+        Args:
+            key (Tuple): The cache key.
+            decision (Decision): The evaluation result.
+        """
+        if key[0] != self._version:
+            return
+        size = _entry_size(key, decision)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[2]
+            self._entries[key] = (self._clock() + self.ttl, decision, size)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the counters of the cache.
+
+        Returns:
+            Dict[str, int]: Hits, misses, evictions, expirations, invalidations, and the
+            current number of entries and estimated size in bytes.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
@@ -0,0 +1,191 @@
+# app/services/ingestion.py
+
+import codecs
+import json
+from typing import Any, AsyncIterator, List, Tuple, Union
+
+# Largest record accepted in a bulk body, in characters
+MAX_RECORD_SIZE = 1024 * 1024
+
+_WHITESPACE = " \t\r\n"
+
+
+class IngestionError(ValueError):
+    """
+    Raised when a bulk body is malformed beyond the record being read.
+    """
+
+
+class InvalidRecord:
+    """
+    Placeholder for a record that could not be decoded.
+
+    Attributes:
+        error (str): Why the record could not be decoded.
+    """
+
+    def __init__(self, error: str):
+        self.error = error
+
+
+async def _decode(body: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    async for data in body:
+        text = decoder.decode(data)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+async def iter_ndjson(
+    body: AsyncIterator[bytes],
+) -> AsyncIterator[Union[Any, InvalidRecord]]:
+    """
+    Decode a newline-delimited JSON body one line at a time.
+
+    Args:
+        body (AsyncIterator[bytes]): The body, as it is received.
+
+    Yields:
+        The decoded value of each non-empty line, or an InvalidRecord for a line that is
+        not valid JSON.
+    """
+    buffer = ""
+    async for text in _decode(body):
+        buffer += text
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                yield _loads(line)
+        if len(buffer) > MAX_RECORD_SIZE:
+            raise IngestionError("Record is too large")
+    if buffer.strip():
+        yield _loads(buffer)
+
+
+def _loads(line: str) -> Union[Any, InvalidRecord]:
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        return InvalidRecord(f"Invalid JSON: {e}")
+
+
+async def iter_json_array(
+    body: AsyncIterator[bytes],
+) -> AsyncIterator[Any]:
+    """
+    Decode the elements of a JSON array body one at a time, without loading it whole.
+
+    Args:
+        body (AsyncIterator[bytes]): The body, as it is received.
+
+    Yields:
+        The decoded value of each element of the array.
+
+    Raises:
+        IngestionError: If the body is not a well-formed JSON array.
+    """
+    decoder = json.JSONDecoder()
+    pieces = _decode(body)
+    buffer, position, eof = "", 0, False
+
+    async def read_more() -> bool:
+        nonlocal buffer, position, eof
+        if eof:
+            return False
+        try:
+            text = await pieces.__anext__()
+        except StopAsyncIteration:
+            eof = True
+            return False
+        buffer, position = buffer[position:] + text, 0
+        return True
+
+    async def peek() -> str:
+        # Skip whitespace and return the next character, or "" at the end of the body
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in _WHITESPACE:
+                position += 1
+            if position < len(buffer):
+                return buffer[position]
+            if not await read_more():
+                return ""
+
+    if await peek() != "[":
+        raise IngestionError("Body must be a JSON array")
+    position += 1
+    if await peek() == "]":
+        position += 1
+    else:
+        while True:
+            if await peek() == "":
+                raise IngestionError("Unexpected end of body")
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError as e:
+                    if len(buffer) - position > MAX_RECORD_SIZE:
+                        raise IngestionError("Record is too large")
+                    if await read_more():
+                        continue
+                    raise IngestionError(f"Invalid JSON: {e}")
+                # A number or literal may continue in the next piece of the body
+                if end == len(buffer) and await read_more():
+                    continue
+                break
+            position = end
+            yield value
+            separator = await peek()
+            position += 1
+            if separator == "]":
+                break
+            if separator != ",":
+                raise IngestionError("Expected ',' or ']' after an array element")
+    if await peek() != "":
+        raise IngestionError("Unexpected data after the array")
+
+
+async def iter_chunks(
+    records: AsyncIterator[Any], chunk_size: int
+) -> AsyncIterator[List[Any]]:
+    """
+    Group records into lists of at most `chunk_size`.
+
+    Args:
+        records (AsyncIterator[Any]): The records.
+        chunk_size (int): The maximum number of records per chunk.
+
+    Yields:
+        List[Any]: The records of each chunk.
+    """
+    chunk = []
+    async for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def deduplicate(records: List[dict], keep_last: bool) -> Tuple[List[dict], int]:
+    """
+    Keep a single record per transaction_id.
+
+    Args:
+        records (List[dict]): The records of a chunk.
+        keep_last (bool): Whether to keep the last record of each transaction_id instead
+            of the first one.
+
+    Returns:
+        Tuple[List[dict], int]: The unique records and the number of duplicates dropped.
+    """
+    unique = {}
+    for record in records:
+        key = record["transaction_id"]
+        if keep_last or key not in unique:
+            unique[key] = record
+    return list(unique.values()), len(records) - len(unique)
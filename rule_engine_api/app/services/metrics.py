@@ -0,0 +1,159 @@
+# app/services/metrics.py
+
+import random
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# Outcomes of a rule evaluation
+PASS = "pass"
+FAIL = "fail"
+ERROR = "error"
+
+# (rule id, outcome, evaluation time in nanoseconds)
+Observation = Tuple[int, str, int]
+
+# Histogram buckets, in seconds
+RULE_BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 1e-1)
+STAGE_BUCKETS = (1e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 1.0)
+
+
+class Histogram:
+    """
+    Distribution of observed values over fixed buckets.
+
+    Attributes:
+        buckets (Tuple[float, ...]): The upper bounds of the buckets, in increasing order.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        # One count per bucket, plus one for values above the last bound
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def render(self, name: str, labels: str) -> List[str]:
+        """
+        Render the histogram in the Prometheus text format.
+
+        Args:
+            name (str): The metric name.
+            labels (str): The labels shared by every sample, e.g. 'rule_id="1"'.
+
+        Returns:
+            List[str]: The bucket, sum and count samples.
+        """
+        prefix = f"{labels}," if labels else ""
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{prefix}le="{bound:g}"}} {cumulative}')
+        cumulative += self.counts[-1]
+        lines.append(f'{name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum:.9g}")
+        lines.append(f"{name}_count{suffix} {cumulative}")
+        return lines
+
+
+class Metrics:
+    """
+    Sampled per-rule and check-transaction timings, rendered for Prometheus.
+
+    Only a `sample_rate` fraction of the requests is measured, so the counts are those
+    of the sampled requests; with a rate of 0, the only cost left is one comparison per
+    request. Values are recorded from the event loop thread, so no lock is needed.
+
+    Attributes:
+        sample_rate (float): Fraction of the requests measured, between 0 and 1.
+    """
+
+    def __init__(self, sample_rate: float = 0.01):
+        self.sample_rate = sample_rate
+        # rule id -> {outcome: count}
+        self._rule_outcomes: Dict[int, Dict[str, int]] = {}
+        self._rule_times: Dict[int, Histogram] = {}
+        self._stage_times: Dict[str, Histogram] = {}
+
+    def sample(self) -> bool:
+        """
+        Decide whether to measure the current request.
+
+        Returns:
+            bool: True for a `sample_rate` fraction of the calls.
+        """
+        return self.sample_rate > 0 and (
+            self.sample_rate >= 1 or random.random() < self.sample_rate
+        )
+
+    def record_rules(self, observations: Iterable[Observation]) -> None:
+        """
+        Record the outcome and evaluation time of rules.
+
+        Args:
+            observations (Iterable[Observation]): (rule id, outcome, nanoseconds) of
+                each evaluated rule.
+        """
+        for rule_id, outcome, elapsed_ns in observations:
+            outcomes = self._rule_outcomes.get(rule_id)
+            if outcomes is None:
+                outcomes = self._rule_outcomes[rule_id] = {PASS: 0, FAIL: 0, ERROR: 0}
+                self._rule_times[rule_id] = Histogram(RULE_BUCKETS)
+            outcomes[outcome] += 1
+            self._rule_times[rule_id].observe(elapsed_ns / 1e9)
+
+    def record_stage(self, stage: str, seconds: float) -> None:
+        """
+        Record the time spent in a stage of check-transaction.
+
+        Args:
+            stage (str): The stage, e.g. "rule_set", "evaluation" or "serialization".
+            seconds (float): The time spent.
+        """
+        histogram = self._stage_times.get(stage)
+        if histogram is None:
+            histogram = self._stage_times[stage] = Histogram(STAGE_BUCKETS)
+        histogram.observe(seconds)
+
+    def render(self) -> List[str]:
+        """
+        Render every metric in the Prometheus text format.
+
+        Returns:
+            List[str]: The lines of the exposition.
+        """
+        lines = [
+            "# HELP rule_engine_metrics_sample_rate Fraction of requests measured.",
+            "# TYPE rule_engine_metrics_sample_rate gauge",
+            f"rule_engine_metrics_sample_rate {self.sample_rate:g}",
+            "# HELP rule_engine_rule_evaluations_total Sampled rule evaluations.",
+            "# TYPE rule_engine_rule_evaluations_total counter",
+        ]
+        for rule_id, outcomes in sorted(self._rule_outcomes.items()):
+            for outcome, count in outcomes.items():
+                lines.append(
+                    f"rule_engine_rule_evaluations_total"
+                    f'{{rule_id="{rule_id}",outcome="{outcome}"}} {count}'
+                )
+        lines += [
+            "# HELP rule_engine_rule_evaluation_seconds Sampled rule evaluation time.",
+            "# TYPE rule_engine_rule_evaluation_seconds histogram",
+        ]
+        for rule_id, histogram in sorted(self._rule_times.items()):
+            lines += histogram.render(
+                "rule_engine_rule_evaluation_seconds", f'rule_id="{rule_id}"'
+            )
+        lines += [
+            "# HELP rule_engine_check_transaction_seconds Sampled check-transaction "
+            "time per stage.",
+            "# TYPE rule_engine_check_transaction_seconds histogram",
+        ]
+        for stage, histogram in sorted(self._stage_times.items()):
+            lines += histogram.render(
+                "rule_engine_check_transaction_seconds", f'stage="{stage}"'
+            )
+        return lines
@@ -0,0 +1,377 @@
+# app/services/named_lists.py
+
+import asyncio
+import ipaddress
+import logging
+import re
+from typing import Dict, List, NamedTuple, Set, Tuple, Union
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.db import async_crud
+
+logger = logging.getLogger(__name__)
+
+# Kinds of lists, by how their values match
+EXACT = "exact"
+CIDR = "cidr"
+DOMAIN = "domain"
+KINDS = (EXACT, CIDR, DOMAIN)
+
+# Change log operations
+CREATE = "create"
+DELETE = "delete"
+ADD = "add"
+REMOVE = "remove"
+
+# Function that rules call to look a field up in a list
+LIST_FUNCTION = "in_list"
+
+LIST_NAME = re.compile(r"^[A-Za-z0-9_.-]{1,100}$")
+
+# Changes read from the database at once
+CHANGES_BATCH_SIZE = 10_000
+
+
+class ListLookup(NamedTuple):
+    """
+    A lookup of a transaction field in a named list, read by rules.
+
+    Compiled rules read it as the transaction field named by `key`, which is filled in
+    before evaluation, like velocity features.
+
+    Attributes:
+        list_name (str): The name of the list.
+        field (str): The transaction field looked up.
+    """
+
+    list_name: str
+    field: str
+
+    @property
+    def key(self) -> str:
+        return f"{LIST_FUNCTION}:{self.list_name}:{self.field}"
+
+
+def is_lookup_key(name: str) -> bool:
+    return name.startswith(f"{LIST_FUNCTION}:")
+
+
+def parse_lookup_key(name: str) -> ListLookup:
+    _, list_name, field = name.split(":")
+    return ListLookup(list_name, field)
+
+
+def normalize(kind: str, value: str) -> str:
+    """
+    Normalize a list value, so that equivalent values are stored once.
+
+    Args:
+        kind (str): The kind of the list.
+        value (str): The value to add to or remove from the list.
+
+    Returns:
+        str: The normalized value: lower case, and for CIDR lists the network in its
+        canonical form, e.g. "10.0.0.0/8" for "10.1.2.3/8".
+
+    Raises:
+        ValueError: If the value is empty, or not an IP network in a CIDR list.
+    """
+    value = value.strip().lower()
+    if kind == CIDR:
+        return str(ipaddress.ip_network(value, strict=False))
+    if kind == DOMAIN:
+        value = value.lstrip("@.")
+    if not value:
+        raise ValueError("List values must not be empty")
+    return value
+
+
+class ExactIndex:
+    """
+    Hashed set of values, matching values equal to one of them, ignoring case.
+    """
+
+    kind = EXACT
+
+    def __init__(self):
+        self.values: Set[str] = set()
+
+    def add(self, value: str) -> None:
+        self.values.add(value)
+
+    def discard(self, value: str) -> None:
+        self.values.discard(value)
+
+    def contains(self, value: str) -> bool:
+        return value.strip().lower() in self.values
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+
+class DomainIndex(ExactIndex):
+    """
+    Hashed set of domains, matching email addresses of a domain or of its subdomains.
+
+    An address matches if one of the suffixes of its domain is in the set, e.g.
+    "a@mail.example.com" matches "mail.example.com" and "example.com": the cost grows
+    with the number of labels of the domain, not with the size of the list.
+    """
+
+    kind = DOMAIN
+
+    def contains(self, value: str) -> bool:
+        domain = value.rpartition("@")[2].strip().lower()
+        values = self.values
+        while domain:
+            if domain in values:
+                return True
+            domain = domain.partition(".")[2]
+        return False
+
+
+class CidrIndex:
+    """
+    IP networks grouped by prefix length, matching addresses in one of them.
+
+    A lookup masks the address once per prefix length present in the list and checks
+    the result in a hashed set, so its cost is bounded by the 33 IPv4 and 129 IPv6
+    prefix lengths, whatever the size of the list.
+    """
+
+    kind = CIDR
+
+    def __init__(self):
+        # (IP version, prefix length) -> network addresses, as integers
+        self.networks: Dict[Tuple[int, int], Set[int]] = {}
+
+    def add(self, value: str) -> None:
+        network = ipaddress.ip_network(value)
+        key = (network.version, network.prefixlen)
+        self.networks.setdefault(key, set()).add(int(network.network_address))
+
+    def discard(self, value: str) -> None:
+        network = ipaddress.ip_network(value)
+        key = (network.version, network.prefixlen)
+        addresses = self.networks.get(key)
+        if addresses is not None:
+            addresses.discard(int(network.network_address))
+            if not addresses:
+                del self.networks[key]
+
+    def contains(self, value: str) -> bool:
+        try:
+            address = ipaddress.ip_address(value.strip())
+        except ValueError:
+            return False
+        number, bits = int(address), address.max_prefixlen
+        for (version, prefixlen), addresses in self.networks.items():
+            if version != address.version:
+                continue
+            shift = bits - prefixlen
+            if (number >> shift) << shift in addresses:
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return sum(len(addresses) for addresses in self.networks.values())
+
+
+ListIndex = Union[ExactIndex, DomainIndex, CidrIndex]
+
+INDEXES = {EXACT: ExactIndex, CIDR: CidrIndex, DOMAIN: DomainIndex}
+
+
+class UnknownList:
+    """
+    Value of a lookup in a list that does not exist, failing the rules that use it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __bool__(self):
+        raise LookupError(f"Unknown list '{self.name}'")
+
+
+class NamedListRegistry:
+    """
+    In-memory indexes of the named lists, kept in sync with the database.
+
+    The lists are loaded once, then updated in place by replaying the change log, so
+    an update of a large list costs the size of the update, not of the list. Lookups
+    and updates run on the event loop thread, so lookups never see a partial update.
+
+    Attributes:
+        revision (int): The ID of the last change applied.
+    """
+
+    def __init__(self):
+        self._indexes: Dict[str, ListIndex] = {}
+        self._lock = asyncio.Lock()
+        self.revision = 0
+
+    def contains(self, name: str, value: str) -> bool:
+        """
+        Look a value up in a list.
+
+        Args:
+            name (str): The name of the list.
+            value (str): The value to look up.
+
+        Returns:
+            bool: Whether the value matches the list.
+
+        Raises:
+            LookupError: If the list does not exist.
+        """
+        index = self._indexes.get(name)
+        if index is None:
+            raise LookupError(f"Unknown list '{name}'")
+        return index.contains(value)
+
+    def resolve(self, transaction: dict, lookups: Tuple[ListLookup, ...]) -> dict:
+        """
+        Return a transaction with the result of the list lookups of a rule set.
+
+        Args:
+            transaction (dict): Dictionary containing transaction data.
+            lookups (Tuple[ListLookup, ...]): The lookups of the rule set.
+
+        Returns:
+            dict: The transaction, extended with one field per lookup, or the
+            transaction itself if there are no lookups.
+        """
+        if not lookups:
+            return transaction
+        values = {}
+        for lookup in lookups:
+            index = self._indexes.get(lookup.list_name)
+            values[lookup.key] = (
+                UnknownList(lookup.list_name)
+                if index is None
+                else index.contains(transaction[lookup.field])
+            )
+        return {**transaction, **values}
+
+    def describe(self) -> List[Tuple[str, str, int]]:
+        """
+        Describe the loaded lists.
+
+        Returns:
+            List[Tuple[str, str, int]]: The name, kind and size of each list, by name.
+        """
+        return [
+            (name, index.kind, len(index))
+            for name, index in sorted(self._indexes.items())
+        ]
+
+    def replace(self, lists: Dict[str, Tuple[str, List[str]]]) -> None:
+        """
+        Replace the indexes with lists given by value, e.g. in a process without a
+        database session.
+
+        Args:
+            lists (Dict[str, Tuple[str, List[str]]]): The kind and values of each list,
+                by name.
+        """
+        indexes = {}
+        for name, (kind, values) in lists.items():
+            index = indexes[name] = INDEXES[kind]()
+            for value in values:
+                index.add(value)
+        self._indexes = indexes
+
+    async def load(self, db: AsyncSession) -> None:
+        """
+        Load every list from the database, replacing the current indexes.
+
+        Args:
+            db (AsyncSession): SQLAlchemy async database session.
+        """
+        async with self._lock:
+            await self._load(db)
+
+    async def _load(self, db: AsyncSession) -> None:
+        # Read the revision first: changes committed while loading are replayed
+        revision = await async_crud.get_named_list_revision(db)
+        indexes = {
+            named_list.name: INDEXES[named_list.kind]()
+            for named_list in await async_crud.get_named_lists(db)
+        }
+        async for name, value in async_crud.stream_named_list_entries(db):
+            index = indexes.get(name)
+            if index is not None:
+                index.add(value)
+        self._indexes, self.revision = indexes, revision
+        await self._apply_changes(db)
+        logger.info("Loaded %s named lists at revision %s", len(indexes), self.revision)
+
+    async def refresh(self, db: AsyncSession) -> int:
+        """
+        Apply the changes made since the last load or refresh.
+
+        Args:
+            db (AsyncSession): SQLAlchemy async database session.
+
+        Returns:
+            int: The number of changes applied, 0 if the lists were reloaded because
+            the log no longer holds the changes since the last load or refresh.
+        """
+        async with self._lock:
+            oldest = await async_crud.get_oldest_named_list_change(db)
+            if oldest is not None and oldest > self.revision + 1:
+                # The changes after our revision were pruned from the log
+                await self._load(db)
+                return 0
+            return await self._apply_changes(db)
+
+    async def _apply_changes(self, db: AsyncSession) -> int:
+        applied = 0
+        while True:
+            changes = await async_crud.get_named_list_changes(
+                db, self.revision, CHANGES_BATCH_SIZE
+            )
+            for change in changes:
+                self._apply(change.list_name, change.operation, change.value)
+                self.revision = change.id
+            applied += len(changes)
+            if len(changes) < CHANGES_BATCH_SIZE:
+                return applied
+
+    def _apply(self, name: str, operation: str, value: str) -> None:
+        # Replaying a change already loaded leaves the indexes unchanged
+        if operation == CREATE:
+            index = self._indexes.get(name)
+            if index is None or index.kind != value:
+                self._indexes[name] = INDEXES[value]()
+        elif operation == DELETE:
+            self._indexes.pop(name, None)
+        else:
+            index = self._indexes.get(name)
+            if index is None:
+                return
+            if operation == ADD:
+                index.add(value)
+            else:
+                index.discard(value)
+
+
+# Named lists of this worker
+registry = NamedListRegistry()
+
+
+async def watch_named_lists(session_factory: async_sessionmaker, interval: float):
+    """
+    Keep the named lists in sync with changes made by other workers.
+
+    Args:
+        session_factory (async_sessionmaker): Factory for async database sessions.
+        interval (float): Seconds between two checks for changes.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_factory() as db:
+                await registry.refresh(db)
+        except Exception:
+            logger.exception("Failed to refresh the named lists")
@@ -0,0 +1,251 @@
+# app/services/predicate_index.py
+
+import ast
+import math
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Set, Tuple
+from app.services.rule_compiler import CompiledRule, field_name, field_type, is_field
+from app.services.rule_fusion import (
+    FusedEvaluator,
+    _error_message,
+    build_fused_evaluator,
+)
+
+# Comparison operators that can be indexed, and their mirror when the constant is on
+# the left, e.g. `100 > transaction['amount']` is `transaction['amount'] < 100`
+_OPERATORS = {
+    ast.Lt: ("<", ">"),
+    ast.LtE: ("<=", ">="),
+    ast.Gt: (">", "<"),
+    ast.GtE: (">=", "<="),
+    ast.Eq: ("==", "=="),
+    ast.NotEq: ("!=", "!="),
+}
+
+_MISSING = object()
+
+# Below this number of indexable rules, the fused evaluator alone is faster
+MIN_INDEXED_RULES = 16
+
+
+class Predicate(NamedTuple):
+    """
+    A rule of the shape `transaction['field'] <op> constant`.
+
+    Attributes:
+        field (str): The field compared.
+        operator (str): "<", "<=", ">", ">=", "==" or "!=".
+        value (Any): The constant compared to, a number or a string like the field.
+    """
+
+    field: str
+    operator: str
+    value: Any
+
+
+def _is_number(value) -> bool:
+    return (
+        isinstance(value, (int, float))
+        and not isinstance(value, bool)
+        and not (isinstance(value, float) and math.isnan(value))
+    )
+
+
+def match_predicate(rule: CompiledRule) -> Optional[Predicate]:
+    """
+    Recognize a rule that compares one field to a constant.
+
+    Only comparisons whose result an index lookup reproduces exactly are recognized:
+    numbers against numeric fields, strings against text fields.
+
+    Args:
+        rule (CompiledRule): The rule to inspect.
+
+    Returns:
+        Optional[Predicate]: The comparison, or None if the rule has another shape.
+    """
+    node = rule.expression
+    if rule.error is not None or not (
+        isinstance(node, ast.Compare) and len(node.ops) == 1
+    ):
+        return None
+    operators = _OPERATORS.get(type(node.ops[0]))
+    if operators is None:
+        return None
+    left, right = node.left, node.comparators[0]
+    if is_field(left) and isinstance(right, ast.Constant):
+        field, constant, operator = left, right.value, operators[0]
+    elif is_field(right) and isinstance(left, ast.Constant):
+        field, constant, operator = right, left.value, operators[1]
+    else:
+        return None
+    name = field_name(field)
+    kind = field_type(name)
+    if (kind is float and _is_number(constant)) or (
+        kind is str and isinstance(constant, str)
+    ):
+        return Predicate(name, operator, constant)
+    return None
+
+
+class _Thresholds:
+    """
+    Constants of one ordering operator on a field, sorted, with the position of their
+    rule.
+    """
+
+    def __init__(self, entries: List[Tuple[Any, int]]):
+        entries.sort(key=lambda entry: entry[0])
+        self.values = [value for value, _ in entries]
+        self.positions = [position for _, position in entries]
+
+
+class _FieldIndex:
+    """
+    The indexed rules reading one field.
+
+    For a value of the field, the failing rules are a prefix or a suffix of the sorted
+    thresholds of each ordering operator, and the hashed constants of the equality
+    operators, so finding them costs a few bisections and dictionary lookups plus the
+    number of failing rules.
+    """
+
+    def __init__(self, field: str, kind: type):
+        self.field = field
+        self.kind = kind
+        self.rules: List[Tuple[int, CompiledRule]] = []
+        self._ordered: Dict[str, List[Tuple[Any, int]]] = {
+            "<": [],
+            "<=": [],
+            ">": [],
+            ">=": [],
+        }
+        # Constant -> positions of the rules failing when the field equals it
+        self.not_equal: Dict[Any, List[int]] = {}
+        # Constant -> positions of the rules passing when the field equals it
+        self.equal: Dict[Any, Set[int]] = {}
+        self.equal_positions: List[int] = []
+
+    def add(self, position: int, rule: CompiledRule, predicate: Predicate) -> None:
+        self.rules.append((position, rule))
+        if predicate.operator == "!=":
+            self.not_equal.setdefault(predicate.value, []).append(position)
+        elif predicate.operator == "==":
+            self.equal.setdefault(predicate.value, set()).add(position)
+            self.equal_positions.append(position)
+        else:
+            self._ordered[predicate.operator].append((predicate.value, position))
+
+    def freeze(self) -> None:
+        self.lt, self.le, self.gt, self.ge = (
+            _Thresholds(self._ordered[operator]) for operator in ("<", "<=", ">", ">=")
+        )
+        del self._ordered
+
+    def accepts(self, value) -> bool:
+        # Values of another type, or NaN, are compared rule by rule instead
+        if self.kind is str:
+            return type(value) is str
+        return type(value) in (int, float) and value == value
+
+    def failing(self, value) -> List[int]:
+        """
+        Return the positions of the rules failing for a value of the field.
+        """
+        # `field < c` fails when c <= value, `field <= c` when c < value, and so on
+        lt, le, gt, ge = self.lt, self.le, self.gt, self.ge
+        failed = lt.positions[: bisect_right(lt.values, value)]
+        failed += le.positions[: bisect_left(le.values, value)]
+        failed += gt.positions[bisect_left(gt.values, value) :]
+        failed += ge.positions[bisect_right(ge.values, value) :]
+        failed += self.not_equal.get(value, ())
+        if self.equal_positions:
+            passed = self.equal.get(value)
+            failed += (
+                self.equal_positions
+                if passed is None
+                else [p for p in self.equal_positions if p not in passed]
+            )
+        return failed
+
+
+class PredicateIndex:
+    """
+    Evaluator of a rule set finding its failing comparison rules by index lookups.
+
+    Rules of the shape `transaction['field'] <op> constant` are grouped per field into
+    sorted thresholds and hashed constants; the other rules are evaluated by a fused
+    evaluator. The cost of a check grows with the number of failing comparison rules
+    and of other rules, not with the number of comparison rules.
+
+    Calling the index returns the same failure messages, in the same order, as
+    `apply_rules`.
+
+    Attributes:
+        fields (Dict[str, _FieldIndex]): The indexed rules, by field.
+        indexed (int): The number of indexed rules.
+    """
+
+    def __init__(self, rules: Sequence[CompiledRule]):
+        self.fields: Dict[str, _FieldIndex] = {}
+        self._descriptions: Dict[int, str] = {}
+        residual: List[Tuple[int, CompiledRule]] = []
+        for position, rule in enumerate(rules):
+            predicate = match_predicate(rule)
+            if predicate is None:
+                residual.append((position, rule))
+                continue
+            index = self.fields.get(predicate.field)
+            if index is None:
+                index = self.fields[predicate.field] = _FieldIndex(
+                    predicate.field, field_type(predicate.field)
+                )
+            index.add(position, rule, predicate)
+            self._descriptions[position] = rule.description
+        for index in self.fields.values():
+            index.freeze()
+        self.indexed = len(self._descriptions)
+        self._residual = build_fused_evaluator(
+            [rule for _, rule in residual], [position for position, _ in residual]
+        )
+
+    def __call__(self, transaction: dict) -> List[str]:
+        failures: List[Tuple[int, str]] = self._residual(transaction)
+        failed: List[int] = []
+        for field, index in self.fields.items():
+            value = transaction.get(field, _MISSING)
+            if index.accepts(value):
+                failed += index.failing(value)
+                continue
+            # Missing field or unexpected type: the rules report it as usual
+            for position, rule in index.rules:
+                try:
+                    if not rule.fn(transaction):
+                        failures.append((position, rule.description))
+                except Exception as e:
+                    failures.append((position, _error_message(rule.description, e)))
+        failed.sort()
+        descriptions = self._descriptions
+        if not failures:
+            return [descriptions[position] for position in failed]
+        failures += [(position, descriptions[position]) for position in failed]
+        failures.sort(key=itemgetter(0))
+        return [message for _, message in failures]
+
+
+def build_rule_set_evaluator(rules: Sequence[CompiledRule]) -> FusedEvaluator:
+    """
+    Build the evaluator of a whole rule set.
+
+    Args:
+        rules (Sequence[CompiledRule]): The rules, in table order.
+
+    Returns:
+        FusedEvaluator: A predicate index if at least MIN_INDEXED_RULES rules are simple
+        comparisons, otherwise the fused evaluator of the rules.
+    """
+    indexable = sum(match_predicate(rule) is not None for rule in rules)
+    if indexable >= MIN_INDEXED_RULES:
+        return PredicateIndex(rules)
+    return build_fused_evaluator(rules)
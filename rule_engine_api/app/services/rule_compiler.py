@@ -0,0 +1,688 @@
+# app/services/rule_compiler.py
+
+import ast
+import re
+from typing import Any, Callable, Dict, FrozenSet, NamedTuple, Optional, Tuple
+from app.schemas.transaction import TransactionBase
+from app.services.named_lists import (
+    LIST_FUNCTION,
+    LIST_NAME,
+    ListLookup,
+    is_lookup_key,
+)
+from app.services.velocity import (
+    VELOCITY_FUNCTIONS,
+    Feature,
+    is_feature_key,
+    parse_window,
+)
+
+# Transaction fields that rules may read, with their types
+TRANSACTION_FIELDS: Dict[str, type] = {
+    name: field.annotation for name, field in TransactionBase.model_fields.items()
+}
+
+# Transaction fields that may scope rules to some transactions
+SCOPE_FIELDS = ("merchant_id", "client_id")
+
+# Rule statuses: active rules decide, shadow rules are only evaluated for comparison
+# and quarantined rules, which repeatedly ran over their time budget, are not evaluated
+ACTIVE = "active"
+SHADOW = "shadow"
+QUARANTINED = "quarantined"
+
+# Functions that rules may call
+SAFE_FUNCTIONS: Dict[str, Callable] = {
+    "abs": abs,
+    "bool": bool,
+    "float": float,
+    "int": int,
+    "len": len,
+    "max": max,
+    "min": min,
+    "round": round,
+    "str": str,
+}
+
+# Methods that rules may call on values
+SAFE_METHODS = frozenset(
+    {
+        "count",
+        "endswith",
+        "find",
+        "isalnum",
+        "isalpha",
+        "isdigit",
+        "lower",
+        "lstrip",
+        "rstrip",
+        "split",
+        "startswith",
+        "strip",
+        "upper",
+    }
+)
+
+_ALLOWED_OPERATORS = (
+    ast.And,
+    ast.Or,
+    ast.Not,
+    ast.USub,
+    ast.UAdd,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.FloorDiv,
+    ast.Mod,
+    ast.Pow,
+    ast.Eq,
+    ast.NotEq,
+    ast.Lt,
+    ast.LtE,
+    ast.Gt,
+    ast.GtE,
+    ast.In,
+    ast.NotIn,
+    ast.Is,
+    ast.IsNot,
+)
+
+# Upper bound on the size of constants produced by folding
+MAX_CONSTANT_SIZE = 10_000
+
+# Upper bound on the size of integers produced by folding, in bits
+MAX_CONSTANT_BITS = 64 * 1024
+
+# Width and precision of the conversion specifiers of %-formatting
+_FORMAT_SPECIFIER = re.compile(r"%(?:\([^)]*\))?[-+ #0]*(\*|\d*)(?:\.(\*|\d*))?")
+
+
+class RuleCompileError(ValueError):
+    """
+    Raised when a rule expression is not valid or uses a construct that is not allowed.
+    """
+
+
+class CompiledRule(NamedTuple):
+    """
+    A rule compiled into a Python callable.
+
+    Attributes:
+        id (int): The identifier of the rule.
+        description (str): A brief description of the rule.
+        rule (str): The rule logic as a string.
+        fn (Optional[Callable[[dict], Any]]): The compiled rule, taking the transaction dictionary.
+        fields (FrozenSet[str]): The transaction fields the rule reads.
+        expression (Optional[ast.expr]): The validated and folded expression.
+        error (Optional[Exception]): The compilation error, if the rule could not be compiled.
+        scope (Optional[str]): The transactions the rule applies to, e.g.
+            "merchant_id:M42", or None if it applies to every transaction.
+        status (str): "active" if the rule decides, "shadow" if it is only evaluated
+            to compare its outcomes with the decisions, "quarantined" if it is not
+            evaluated.
+    """
+
+    id: int
+    description: str
+    rule: str
+    fn: Optional[Callable[[dict], Any]]
+    fields: FrozenSet[str]
+    expression: Optional[ast.expr]
+    error: Optional[Exception]
+    scope: Optional[str] = None
+    status: str = ACTIVE
+
+
+def is_field(node: ast.AST) -> bool:
+    """
+    Check whether a node is a `transaction['field']` lookup.
+
+    Args:
+        node (ast.AST): The node to check.
+
+    Returns:
+        bool: True if the node reads a transaction field.
+    """
+    return (
+        isinstance(node, ast.Subscript)
+        and isinstance(node.value, ast.Name)
+        and node.value.id == "transaction"
+    )
+
+
+def field_name(node: ast.Subscript) -> str:
+    """
+    Return the name of the field read by a `transaction['field']` lookup.
+
+    Args:
+        node (ast.Subscript): A node for which `is_field` is True.
+
+    Returns:
+        str: The field name.
+    """
+    return node.slice.value
+
+
+class _Validator(ast.NodeVisitor):
+    """
+    Walk a parsed rule, rejecting anything outside the whitelist and collecting fields.
+    """
+
+    def __init__(self):
+        self.fields = set()
+
+    def generic_visit(self, node):
+        raise RuleCompileError(f"'{type(node).__name__}' is not allowed in rules")
+
+    def visit_Expression(self, node):
+        self.visit(node.body)
+
+    def _visit_operator(self, op):
+        if not isinstance(op, _ALLOWED_OPERATORS):
+            raise RuleCompileError(
+                f"Operator '{type(op).__name__}' is not allowed in rules"
+            )
+
+    def visit_BoolOp(self, node):
+        self._visit_operator(node.op)
+        for value in node.values:
+            self.visit(value)
+
+    def visit_UnaryOp(self, node):
+        self._visit_operator(node.op)
+        self.visit(node.operand)
+
+    def visit_BinOp(self, node):
+        self._visit_operator(node.op)
+        self.visit(node.left)
+        self.visit(node.right)
+
+    def visit_Compare(self, node):
+        for op in node.ops:
+            self._visit_operator(op)
+        self.visit(node.left)
+        for comparator in node.comparators:
+            self.visit(comparator)
+
+    def visit_IfExp(self, node):
+        self.visit(node.test)
+        self.visit(node.body)
+        self.visit(node.orelse)
+
+    def visit_Constant(self, node):
+        pass
+
+    def visit_List(self, node):
+        for elt in node.elts:
+            self.visit(elt)
+
+    visit_Tuple = visit_List
+    visit_Set = visit_List
+
+    def visit_Name(self, node):
+        if node.id == "transaction":
+            raise RuleCompileError(
+                "'transaction' may only be used as transaction['field']"
+            )
+        raise RuleCompileError(f"Unknown name '{node.id}'")
+
+    def visit_Subscript(self, node):
+        if isinstance(node.value, ast.Name) and node.value.id == "transaction":
+            key = node.slice
+            if not (isinstance(key, ast.Constant) and isinstance(key.value, str)):
+                raise RuleCompileError(
+                    "Transaction fields must be read as transaction['field']"
+                )
+            if key.value not in TRANSACTION_FIELDS:
+                raise RuleCompileError(f"Unknown transaction field '{key.value}'")
+            self.fields.add(key.value)
+            return
+        self.visit(node.value)
+        self.visit(node.slice)
+
+    def visit_Slice(self, node):
+        for part in (node.lower, node.upper, node.step):
+            if part is not None:
+                self.visit(part)
+
+    def visit_Call(self, node):
+        if node.keywords:
+            raise RuleCompileError("Keyword arguments are not allowed in rules")
+        if isinstance(node.func, ast.Name) and node.func.id in VELOCITY_FUNCTIONS:
+            velocity_feature(node)
+            return
+        if isinstance(node.func, ast.Name) and node.func.id == LIST_FUNCTION:
+            list_lookup(node)
+            return
+        if isinstance(node.func, ast.Name):
+            if node.func.id not in SAFE_FUNCTIONS:
+                raise RuleCompileError(
+                    f"Function '{node.func.id}' is not allowed in rules"
+                )
+        elif isinstance(node.func, ast.Attribute):
+            if node.func.attr not in SAFE_METHODS:
+                raise RuleCompileError(
+                    f"Method '{node.func.attr}' is not allowed in rules"
+                )
+            self.visit(node.func.value)
+        else:
+            raise RuleCompileError(
+                "Only named functions and methods may be called in rules"
+            )
+        for arg in node.args:
+            if isinstance(arg, ast.Starred):
+                raise RuleCompileError("Argument unpacking is not allowed in rules")
+            self.visit(arg)
+
+
+def velocity_feature(node: ast.Call) -> Feature:
+    """
+    Validate a call to a velocity function, e.g. `count(client_id, '10m')`.
+
+    Args:
+        node (ast.Call): The call of `count` or `total`.
+
+    Returns:
+        Feature: The aggregate the call reads.
+
+    Raises:
+        RuleCompileError: If the arguments are not a text field name and a window.
+    """
+    function = node.func.id
+    usage = f"{function}() takes a field name and a window, e.g. {function}(client_id, '10m')"
+    if len(node.args) != 2:
+        raise RuleCompileError(usage)
+    dimension, window = node.args
+    if not isinstance(dimension, ast.Name) or not (
+        isinstance(window, ast.Constant) and isinstance(window.value, str)
+    ):
+        raise RuleCompileError(usage)
+    if TRANSACTION_FIELDS.get(dimension.id) is not str:
+        raise RuleCompileError(
+            f"{function}() groups transactions by a text field, not '{dimension.id}'"
+        )
+    try:
+        seconds = parse_window(window.value)
+    except ValueError as e:
+        raise RuleCompileError(str(e)) from e
+    return Feature(function, dimension.id, seconds)
+
+
+def list_lookup(node: ast.Call) -> ListLookup:
+    """
+    Validate a call to `in_list`, e.g. `in_list('blocked_ips', transaction['ip_address'])`.
+
+    Args:
+        node (ast.Call): The call of `in_list`.
+
+    Returns:
+        ListLookup: The lookup the call makes.
+
+    Raises:
+        RuleCompileError: If the arguments are not a list name and a text field.
+    """
+    usage = (
+        f"{LIST_FUNCTION}() takes a list name and a transaction field, "
+        f"e.g. {LIST_FUNCTION}('blocked_ips', transaction['ip_address'])"
+    )
+    if len(node.args) != 2:
+        raise RuleCompileError(usage)
+    name, field = node.args
+    if not (
+        isinstance(name, ast.Constant)
+        and isinstance(name.value, str)
+        and isinstance(field, ast.Subscript)
+        and isinstance(field.value, ast.Name)
+        and field.value.id == "transaction"
+        and isinstance(field.slice, ast.Constant)
+        and isinstance(field.slice.value, str)
+    ):
+        raise RuleCompileError(usage)
+    if not LIST_NAME.match(name.value):
+        raise RuleCompileError(f"Invalid list name '{name.value}'")
+    if TRANSACTION_FIELDS.get(field.slice.value) is not str:
+        raise RuleCompileError(
+            f"{LIST_FUNCTION}() looks up a text field, not '{field.slice.value}'"
+        )
+    return ListLookup(name.value, field.slice.value)
+
+
+class _FeatureRewriter(ast.NodeTransformer):
+    """
+    Replace each velocity and list lookup call by a read of the field filled in before
+    evaluation, so that every evaluation path treats it like a transaction field.
+    """
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        if not isinstance(node.func, ast.Name):
+            return node
+        if node.func.id in VELOCITY_FUNCTIONS:
+            key = velocity_feature(node).key
+        elif node.func.id == LIST_FUNCTION:
+            key = list_lookup(node).key
+        else:
+            return node
+        return ast.copy_location(
+            ast.Subscript(
+                value=ast.Name(id="transaction", ctx=ast.Load()),
+                slice=ast.Constant(value=key),
+                ctx=ast.Load(),
+            ),
+            node,
+        )
+
+
+def field_type(name: str) -> type:
+    """
+    Return the type of a field read by compiled rules.
+
+    Args:
+        name (str): A transaction field, a velocity feature key or a list lookup key.
+
+    Returns:
+        type: The type of the field; velocity features are numbers and list lookups
+        booleans.
+    """
+    if is_feature_key(name):
+        return float
+    if is_lookup_key(name):
+        return bool
+    return TRANSACTION_FIELDS[name]
+
+
+def format_width(template: Any) -> Optional[int]:
+    """
+    Return the widest padding a %-format template may produce.
+
+    Args:
+        template (Any): The left operand of `%`.
+
+    Returns:
+        Optional[int]: The largest width or precision of the conversion specifiers of
+        the template, 0 if it is not text, or None if a width or precision is read
+        from the formatted values ('*').
+    """
+    if isinstance(template, bytes):
+        template = template.decode("latin-1")
+    if not isinstance(template, str):
+        return 0
+    widest = 0
+    for match in _FORMAT_SPECIFIER.finditer(template.replace("%%", "")):
+        for size in match.groups():
+            if size == "*":
+                return None
+            if size:
+                widest = max(widest, int(size))
+    return widest
+
+
+def _is_constant(node: ast.AST) -> bool:
+    return isinstance(node, ast.Constant)
+
+
+def _check_constant_size(value: Any) -> None:
+    if (
+        isinstance(value, (str, bytes, tuple, frozenset))
+        and len(value) > MAX_CONSTANT_SIZE
+    ):
+        raise RuleCompileError("Constant expression is too large")
+
+
+def _result_bits(op: ast.operator, left: Any, right: Any) -> int:
+    """
+    Return an upper bound on the size in bits of an integer operation, without
+    computing it, or 0 if the operation does not grow integers.
+    """
+    if not isinstance(left, int) or not isinstance(right, int):
+        return 0
+    if isinstance(op, ast.Pow) and right > 0:
+        return left.bit_length() * right
+    if isinstance(op, ast.Mult):
+        return left.bit_length() + right.bit_length()
+    if isinstance(op, ast.LShift) and right > 0:
+        return left.bit_length() + right
+    return 0
+
+
+class _Folder(ast.NodeTransformer):
+    """
+    Replace sub-expressions made only of constants by their value.
+    """
+
+    def _fold(self, node):
+        if isinstance(node, ast.BinOp):
+            left, right = node.left.value, node.right.value
+            if (
+                isinstance(node.op, ast.Pow)
+                and isinstance(right, (int, float))
+                and abs(right) > 1000
+            ):
+                raise RuleCompileError("Constant exponent is too large")
+            # Nested powers, products and shifts grow without bound otherwise
+            if _result_bits(node.op, left, right) > MAX_CONSTANT_BITS:
+                raise RuleCompileError("Constant expression is too large")
+            if isinstance(node.op, ast.Mod):
+                # Formatting pads to its widths before the result can be measured
+                width = format_width(left)
+                if width is None or width > MAX_CONSTANT_SIZE:
+                    raise RuleCompileError("Constant expression is too large")
+            if isinstance(node.op, ast.Mult):
+                for sequence, count in ((left, right), (right, left)):
+                    if isinstance(sequence, (str, bytes, tuple)) and isinstance(
+                        count, int
+                    ):
+                        if len(sequence) * count > MAX_CONSTANT_SIZE:
+                            raise RuleCompileError("Constant expression is too large")
+        expression = ast.fix_missing_locations(ast.Expression(body=node))
+        try:
+            value = eval(compile(expression, "<rule>", "eval"), {"__builtins__": {}})
+        except Exception as e:
+            raise RuleCompileError(
+                f"Constant expression cannot be evaluated: {e}"
+            ) from e
+        _check_constant_size(value)
+        return ast.copy_location(ast.Constant(value=value), node)
+
+    def visit_BinOp(self, node):
+        self.generic_visit(node)
+        if _is_constant(node.left) and _is_constant(node.right):
+            return self._fold(node)
+        return node
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if _is_constant(node.operand):
+            return self._fold(node)
+        return node
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        if all(_is_constant(value) for value in node.values):
+            return self._fold(node)
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if _is_constant(node.left) and all(_is_constant(c) for c in node.comparators):
+            return self._fold(node)
+        return node
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        if _is_constant(node.test):
+            return node.body if node.test.value else node.orelse
+        return node
+
+    def visit_List(self, node):
+        self.generic_visit(node)
+        if all(_is_constant(elt) for elt in node.elts):
+            return ast.copy_location(
+                ast.Constant(value=tuple(elt.value for elt in node.elts)), node
+            )
+        return node
+
+    visit_Tuple = visit_List
+
+    def visit_Set(self, node):
+        self.generic_visit(node)
+        if all(_is_constant(elt) for elt in node.elts):
+            try:
+                value = frozenset(elt.value for elt in node.elts)
+            except TypeError as e:
+                raise RuleCompileError(
+                    f"Constant expression cannot be evaluated: {e}"
+                ) from e
+            return ast.copy_location(ast.Constant(value=value), node)
+        return node
+
+
+def parse_rule(source: str) -> ast.Expression:
+    """
+    Parse and validate a rule, and fold its constant sub-expressions.
+
+    Args:
+        source (str): The rule logic as a string.
+
+    Returns:
+        ast.Expression: The validated and folded expression tree.
+
+    Raises:
+        RuleCompileError: If the rule is not valid or uses a construct that is not allowed.
+    """
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as e:
+        raise RuleCompileError(f"Invalid rule syntax: {e.msg}") from e
+    _Validator().visit(tree)
+    tree = _FeatureRewriter().visit(tree)
+    return ast.fix_missing_locations(_Folder().visit(tree))
+
+
+def collect_fields(node: ast.AST) -> FrozenSet[str]:
+    """
+    Collect the transaction fields read by an expression.
+
+    Args:
+        node (ast.AST): The expression to inspect.
+
+    Returns:
+        FrozenSet[str]: The names of the fields read.
+    """
+    return frozenset(field_name(n) for n in ast.walk(node) if is_field(n))
+
+
+def build_function(
+    expression: ast.expr,
+    name: str = "<rule>",
+    namespace: Optional[Dict[str, Any]] = None,
+) -> Callable[[dict], Any]:
+    """
+    Turn a validated expression into a function of the transaction.
+
+    Args:
+        expression (ast.expr): The validated expression.
+        name (str, optional): The file name used in tracebacks. Defaults to "<rule>".
+        namespace (Optional[Dict[str, Any]], optional): Extra names made available to the
+            expression. Defaults to None.
+
+    Returns:
+        Callable[[dict], Any]: A function taking the transaction dictionary.
+    """
+    lambda_node = ast.Lambda(
+        args=ast.arguments(
+            posonlyargs=[],
+            args=[ast.arg(arg="transaction")],
+            kwonlyargs=[],
+            kw_defaults=[],
+            defaults=[],
+        ),
+        body=expression,
+    )
+    tree = ast.fix_missing_locations(ast.Expression(body=lambda_node))
+    scope = {"__builtins__": {}, **SAFE_FUNCTIONS, **(namespace or {})}
+    return eval(compile(tree, name, "eval"), scope)
+
+
+def parse_scope(scope: str) -> Tuple[str, str]:
+    """
+    Parse the scope of a rule, such as 'merchant_id:M42'.
+
+    Args:
+        scope (str): The scope of the rule.
+
+    Returns:
+        Tuple[str, str]: The field and the value the transactions must have.
+
+    Raises:
+        RuleCompileError: If the field is not one of SCOPE_FIELDS or the value is empty.
+    """
+    field, _, value = scope.partition(":")
+    if field not in SCOPE_FIELDS or not value:
+        raise RuleCompileError(
+            f"Invalid scope '{scope}', expected e.g. 'merchant_id:M42' or "
+            "'client_id:C7'"
+        )
+    return field, value
+
+
+def compile_rule(
+    rule_id: int,
+    description: str,
+    source: str,
+    scope: Optional[str] = None,
+    status: str = ACTIVE,
+) -> CompiledRule:
+    """
+    Compile a rule into a callable.
+
+    Args:
+        rule_id (int): The identifier of the rule.
+        description (str): A brief description of the rule.
+        source (str): The rule logic as a string.
+        scope (Optional[str], optional): The transactions the rule applies to, or None
+            for every transaction. Defaults to None.
+        status (str, optional): "active", "shadow" or "quarantined". Defaults to
+            "active".
+
+    Returns:
+        CompiledRule: The compiled rule.
+
+    Raises:
+        RuleCompileError: If the rule is not valid or uses a construct that is not
+            allowed, or if the scope is not valid.
+    """
+    if scope is not None:
+        parse_scope(scope)
+    tree = parse_rule(source)
+    fn = build_function(tree.body, f"<rule {rule_id}>")
+    return CompiledRule(
+        rule_id,
+        description,
+        source,
+        fn,
+        collect_fields(tree.body),
+        tree.body,
+        None,
+        scope,
+        status,
+    )
+
+
+def validate_rule(source: str, scope: Optional[str] = None) -> CompiledRule:
+    """
+    Check that a rule compiles.
+
+    Args:
+        source (str): The rule logic as a string.
+        scope (Optional[str], optional): The scope of the rule. Defaults to None.
+
+    Returns:
+        CompiledRule: The compiled rule, without ID or description.
+
+    Raises:
+        RuleCompileError: If the rule is not valid or uses a construct that is not
+            allowed, or if the scope is not valid.
+    """
+    return compile_rule(0, "", source, scope)
@@ -0,0 +1,183 @@
+# app/services/rule_cost.py
+
+import ast
+from typing import List, NamedTuple, Tuple
+from app.services.rule_compiler import (
+    TRANSACTION_FIELDS,
+    CompiledRule,
+    RuleCompileError,
+    field_name,
+    format_width,
+    is_field,
+)
+
+# Methods whose cost grows with the length of the text they are called on
+_LINEAR_METHODS = frozenset({"count", "find", "split"})
+
+# Functions and methods returning text
+_TEXT_FUNCTIONS = frozenset({"str"})
+_TEXT_METHODS = frozenset({"lower", "lstrip", "rstrip", "strip", "upper"})
+
+
+class RuleCost(NamedTuple):
+    """
+    Static estimate of the cost of evaluating a rule.
+
+    Attributes:
+        cost (int): The estimated number of elementary operations of one evaluation,
+            reading a field or comparing two values costing 1.
+        unbounded (Tuple[str, ...]): The operations whose cost depends on values read
+            at evaluation time and has no fixed bound.
+    """
+
+    cost: int
+    unbounded: Tuple[str, ...]
+
+
+def _may_be_sequence(node: ast.expr) -> bool:
+    """
+    Whether an expression may evaluate to text or to a sequence that `*` repeats.
+    """
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, (str, bytes, tuple))
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return True
+    if is_field(node):
+        return TRANSACTION_FIELDS.get(field_name(node)) is str
+    if isinstance(node, ast.Call):
+        func = node.func
+        if isinstance(func, ast.Name):
+            return func.id in _TEXT_FUNCTIONS
+        return isinstance(func, ast.Attribute) and (
+            func.attr in _TEXT_METHODS or func.attr == "split"
+        )
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.Add, ast.Mult)):
+        return _may_be_sequence(node.left) or _may_be_sequence(node.right)
+    if isinstance(node, ast.IfExp):
+        return _may_be_sequence(node.body) or _may_be_sequence(node.orelse)
+    if isinstance(node, ast.BoolOp):
+        return any(_may_be_sequence(value) for value in node.values)
+    return False
+
+
+class _CostEstimator(ast.NodeVisitor):
+    """
+    Sum the cost of the nodes of a compiled rule expression.
+    """
+
+    def __init__(self):
+        self.cost = 0
+        self.unbounded: List[str] = []
+
+    def generic_visit(self, node):
+        self.cost += 1
+        super().generic_visit(node)
+
+    def visit_Constant(self, node):
+        pass
+
+    def visit_Subscript(self, node):
+        self.cost += 1
+        if not is_field(node):
+            self.visit(node.value)
+            self.visit(node.slice)
+
+    def visit_Compare(self, node):
+        self.cost += len(node.ops)
+        for op, comparator in zip(node.ops, node.comparators):
+            # Membership in a tuple scans it; in a frozenset it is a lookup
+            if (
+                isinstance(op, (ast.In, ast.NotIn))
+                and isinstance(comparator, ast.Constant)
+                and isinstance(comparator.value, (tuple, str))
+            ):
+                self.cost += len(comparator.value)
+        self.visit(node.left)
+        for comparator in node.comparators:
+            self.visit(comparator)
+
+    def visit_BinOp(self, node):
+        self.cost += 1
+        left, right = node.left, node.right
+        if isinstance(node.op, ast.Mult):
+            for sequence, count in ((left, right), (right, left)):
+                if not _may_be_sequence(sequence):
+                    continue
+                if isinstance(count, ast.Constant):
+                    if isinstance(count.value, int):
+                        self.cost += abs(count.value)
+                elif not _may_be_sequence(count):
+                    self.unbounded.append(
+                        f"'{ast.unparse(node)}' repeats a value a number of times "
+                        "read at evaluation"
+                    )
+                    break
+        elif isinstance(node.op, ast.Mod) and isinstance(left, ast.Constant):
+            width = format_width(left.value)
+            if width is None:
+                self.unbounded.append(
+                    f"'{ast.unparse(node)}' pads to a width read at evaluation"
+                )
+            else:
+                self.cost += width
+        elif isinstance(node.op, ast.Pow):
+            if not isinstance(right, ast.Constant):
+                self.unbounded.append(
+                    f"'{ast.unparse(node)}' raises to a power read at evaluation"
+                )
+            elif isinstance(right.value, (int, float)):
+                self.cost += int(abs(right.value)) // 8
+        self.visit(left)
+        self.visit(right)
+
+    def visit_Call(self, node):
+        self.cost += 2
+        if isinstance(node.func, ast.Attribute):
+            if node.func.attr in _LINEAR_METHODS:
+                self.cost += 2
+            self.visit(node.func.value)
+        for arg in node.args:
+            self.visit(arg)
+
+
+def estimate_rule_cost(rule: CompiledRule) -> RuleCost:
+    """
+    Estimate the cost of evaluating a compiled rule, without running it.
+
+    Args:
+        rule (CompiledRule): The rule; velocity functions and list lookups count as
+            field reads, their values being computed before evaluation.
+
+    Returns:
+        RuleCost: The estimated cost and the operations without a fixed bound.
+    """
+    estimator = _CostEstimator()
+    if rule.expression is not None:
+        estimator.visit(rule.expression)
+    return RuleCost(estimator.cost, tuple(estimator.unbounded))
+
+
+def check_rule_cost(rule: CompiledRule, max_cost: int) -> RuleCost:
+    """
+    Reject a rule that may be too expensive to evaluate.
+
+    Args:
+        rule (CompiledRule): The compiled rule.
+        max_cost (int): The highest estimated cost accepted.
+
+    Returns:
+        RuleCost: The estimated cost of the rule.
+
+    Raises:
+        RuleCompileError: If the rule has an operation without a fixed bound, or an
+            estimated cost above `max_cost`.
+    """
+    cost = estimate_rule_cost(rule)
+    if cost.unbounded:
+        raise RuleCompileError(f"Unbounded cost: {cost.unbounded[0]}")
+    if cost.cost > max_cost:
+        raise RuleCompileError(
+            f"Estimated cost {cost.cost} exceeds the limit of {max_cost}; "
+            "use a set or a named list for large collections"
+        )
+    return cost
@@ -0,0 +1,479 @@
+# app/services/rule_executor.py
+
+import asyncio
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+from app.services.metrics import Observation
+from app.services.rule_compiler import CompiledRule
+from app.services.rule_engine import (
+    FAIL_FAST,
+    apply_rule_set,
+    apply_rules,
+    apply_rules_fail_fast,
+)
+from app.services.rule_set import RuleSet, assemble_rule_set, load_rule
+
+logger = logging.getLogger(__name__)
+
+# Executor backends
+INLINE = "inline"
+THREAD = "thread"
+PROCESS = "process"
+
+Decision = Dict[str, Union[bool, str]]
+
+# Rule definitions by ID: (description, rule logic, scope, status)
+Definitions = Dict[int, Tuple[str, str, Optional[str], str]]
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when an evaluation did not finish before its deadline, or was not started
+    because too many evaluations past their deadline are still running.
+    """
+
+
+class RuleDefinition(NamedTuple):
+    """
+    The plain data of a rule, as sent to worker processes.
+    """
+
+    id: int
+    description: str
+    rule: str
+    scope: Optional[str]
+    status: str
+
+
+class RuleSetDelta(NamedTuple):
+    """
+    The changes turning one rule set version into another.
+
+    Attributes:
+        base (Optional[int]): The version the changes apply to, or None for a full
+            rule set that applies to any version.
+        version (int): The resulting version.
+        changed (Tuple[RuleDefinition, ...]): The rules added or modified.
+        removed (Tuple[int, ...]): The IDs of the rules deleted.
+        order (Tuple[int, ...]): The IDs of all the rules of the result, in table order.
+    """
+
+    base: Optional[int]
+    version: int
+    changed: Tuple[RuleDefinition, ...]
+    removed: Tuple[int, ...]
+    order: Tuple[int, ...]
+
+
+class Stale(NamedTuple):
+    """
+    Answer of a worker process whose rule set is not the requested version.
+    """
+
+    version: Optional[int]
+
+
+def evaluate(
+    transaction: dict,
+    rule_set: RuleSet,
+    mode: str,
+    observations: Optional[List[Observation]] = None,
+) -> Decision:
+    """
+    Apply a rule set to a transaction in the given evaluation mode.
+
+    Args:
+        transaction (dict): Dictionary containing transaction data.
+        rule_set (RuleSet): The rule set snapshot to apply.
+        mode (str): "full" or "fail_fast".
+        observations (List[Observation], optional): If given, the outcome and evaluation
+            time of each evaluated rule are appended to it.
+
+    Returns:
+        Decision: The evaluation result with 'has_succeeded' flag and 'message'.
+    """
+    if mode == FAIL_FAST:
+        return apply_rules_fail_fast(transaction, rule_set, observations=observations)
+    if observations is not None:
+        # Rule by rule, to time each of them, with the same result as the fused function
+        return apply_rules(transaction, rule_set.route(transaction).rules, observations)
+    return apply_rule_set(transaction, rule_set)
+
+
+def field_order(rule_set: RuleSet) -> Tuple[str, ...]:
+    """
+    Return the fields sent to worker processes for a rule set, in order.
+    """
+    return tuple(sorted(rule_set.fields))
+
+
+def definitions(rule_set: RuleSet) -> Definitions:
+    return {
+        rule.id: (rule.description, rule.rule, rule.scope, rule.status)
+        for rule in rule_set.rules
+    }
+
+
+def make_delta(
+    base: Optional[int], old: Optional[Definitions], rule_set: RuleSet
+) -> RuleSetDelta:
+    """
+    Compute the changes between the rules of an older version and a snapshot.
+
+    Args:
+        base (Optional[int]): The older version.
+        old (Optional[Definitions]): The rules of the older version, or None if they are
+            unknown, in which case every rule is sent.
+        rule_set (RuleSet): The snapshot to reach.
+
+    Returns:
+        RuleSetDelta: The changes.
+    """
+    new = definitions(rule_set)
+    if old is None:
+        base, old = None, {}
+    changed = tuple(
+        RuleDefinition(id, *definition)
+        for id, definition in new.items()
+        if old.get(id) != definition
+    )
+    removed = tuple(id for id in old if id not in new)
+    return RuleSetDelta(base, rule_set.version, changed, removed, tuple(new))
+
+
+# State of a worker process
+_worker_rules: Dict[int, CompiledRule] = {}
+_worker_rule_set: Optional[RuleSet] = None
+_worker_fields: Tuple[str, ...] = ()
+
+
+def _apply_delta(delta: RuleSetDelta) -> bool:
+    global _worker_rule_set, _worker_fields
+    if delta.base is not None and (
+        _worker_rule_set is None or _worker_rule_set.version != delta.base
+    ):
+        return False
+    if delta.base is None:
+        _worker_rules.clear()
+    for id in delta.removed:
+        _worker_rules.pop(id, None)
+    for definition in delta.changed:
+        _worker_rules[definition.id] = load_rule(definition)
+    _worker_rule_set = assemble_rule_set(
+        [_worker_rules[id] for id in delta.order], delta.version
+    )
+    _worker_fields = field_order(_worker_rule_set)
+    return True
+
+
+def _init_worker(delta: RuleSetDelta) -> None:
+    """
+    Compile the rule set once when a worker process starts.
+    """
+    _apply_delta(delta)
+
+
+def _evaluate_in_worker(
+    version: int,
+    mode: str,
+    values: Tuple[Any, ...],
+    delta: Optional[RuleSetDelta] = None,
+    sample: bool = False,
+) -> Union[Tuple[Decision, Optional[List[Observation]]], Stale]:
+    """
+    Evaluate a transaction in a worker process.
+
+    Args:
+        version (int): The rule set version to evaluate against.
+        mode (str): "full" or "fail_fast".
+        values (Tuple[Any, ...]): The values of the fields read by the rules, in
+            `field_order`.
+        delta (Optional[RuleSetDelta]): Changes to apply before evaluating.
+        sample (bool): Whether to time each rule.
+
+    Returns:
+        The evaluation result and, if sampled, the observations of the rules; or Stale
+        with the version of this worker if it does not hold the requested version.
+    """
+    if delta is not None:
+        _apply_delta(delta)
+    if _worker_rule_set is None or _worker_rule_set.version != version:
+        return Stale(_worker_rule_set.version if _worker_rule_set else None)
+    transaction = dict(zip(_worker_fields, values))
+    observations = [] if sample else None
+    return evaluate(transaction, _worker_rule_set, mode, observations), observations
+
+
+def _terminate(pool: ProcessPoolExecutor) -> None:
+    """
+    Shut a process pool down without waiting for the evaluations it runs.
+    """
+    # The processes of a pool are not public; terminating them fails its evaluations
+    processes = list((getattr(pool, "_processes", None) or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+class RuleExecutor:
+    """
+    Run rule evaluations inline, in a thread pool, or in a pool of worker processes.
+
+    Worker processes compile the rule set when they start. Afterwards each evaluation
+    only carries the rule set version and the values of the fields the rules read; a
+    worker holding another version answers Stale and the evaluation is sent again with
+    the rules that changed since that version.
+
+    An evaluation past its deadline cannot be interrupted: its thread or worker process
+    keeps running it, abandoned. Once `max_abandoned` abandoned evaluations are still
+    running, the worker processes are terminated and replaced; threads cannot be, so
+    evaluations on threads fail at once with DeadlineExceeded until some finish.
+
+    Attributes:
+        backend (str): "inline", "thread" or "process".
+        max_workers (Optional[int]): Number of worker processes or threads. Defaults to
+            the number of CPUs for processes, and to the Python default for threads.
+        history_size (int): Number of past rule set versions kept to compute deltas.
+        max_abandoned (int): Maximum number of evaluations past their deadline still
+            running.
+        abandoned (int): Number of evaluations past their deadline still running.
+        shed (int): Number of evaluations not started because of them.
+        recycled (int): Number of times the worker processes were replaced.
+    """
+
+    def __init__(
+        self,
+        backend: str = THREAD,
+        max_workers: Optional[int] = None,
+        history_size: int = 8,
+        max_abandoned: int = 4,
+    ):
+        self.backend = backend
+        self.max_workers = max_workers
+        self.history_size = history_size
+        self.max_abandoned = max_abandoned
+        self.shed = 0
+        self.recycled = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._history: "OrderedDict[int, Definitions]" = OrderedDict()
+        # Abandoned evaluations by the pool running them; they finish on other threads
+        self._abandoned: Dict[Future, Any] = {}
+        self._abandoned_lock = threading.Lock()
+
+    @property
+    def abandoned(self) -> int:
+        return len(self._abandoned)
+
+    async def evaluate(
+        self,
+        transaction: dict,
+        rule_set: RuleSet,
+        mode: str,
+        observations: Optional[List[Observation]] = None,
+        timeout: Optional[float] = None,
+    ) -> Decision:
+        """
+        Apply a rule set to a transaction on the configured backend.
+
+        Args:
+            transaction (dict): Dictionary containing transaction data.
+            rule_set (RuleSet): The rule set snapshot to apply.
+            mode (str): "full" or "fail_fast".
+            observations (List[Observation], optional): If given, the outcome and
+                evaluation time of each evaluated rule are appended to it.
+            timeout (Optional[float]): Seconds to wait for the result; ignored inline,
+                where the evaluation blocks the event loop.
+
+        Returns:
+            Decision: The evaluation result with 'has_succeeded' flag and 'message'.
+
+        Raises:
+            DeadlineExceeded: If the evaluation did not finish within `timeout`, or too
+                many evaluations past their deadline are still running.
+        """
+        if self.backend == INLINE:
+            return evaluate(transaction, rule_set, mode, observations)
+        if self.backend == THREAD:
+            evaluation = self._run_in_thread(
+                evaluate, transaction, rule_set, mode, observations
+            )
+        else:
+            evaluation = self._evaluate_in_pool(
+                transaction, rule_set, mode, observations
+            )
+        return await self._within(evaluation, timeout)
+
+    async def run_in_thread(
+        self, func: Callable, *args, timeout: Optional[float] = None
+    ) -> Any:
+        """
+        Run a function on the evaluation threads, e.g. the evaluation of a batch.
+
+        Args:
+            func (Callable): The function.
+            *args: Its arguments.
+            timeout (Optional[float]): Seconds to wait for the result.
+
+        Returns:
+            Any: The result of the function.
+
+        Raises:
+            DeadlineExceeded: If the function did not return within `timeout`, or too
+                many evaluations past their deadline are still running.
+        """
+        return await self._within(self._run_in_thread(func, *args), timeout)
+
+    async def _within(self, evaluation, timeout: Optional[float]) -> Any:
+        if self.abandoned >= self.max_abandoned:
+            if self._pool is not None:
+                self._recycle_pool()
+            if self.abandoned >= self.max_abandoned:
+                evaluation.close()
+                self.shed += 1
+                raise DeadlineExceeded(
+                    f"{self.abandoned} evaluations past their deadline are running"
+                )
+        if timeout is None:
+            return await evaluation
+        try:
+            return await asyncio.wait_for(evaluation, timeout)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"Evaluation took more than {timeout:.3f}s")
+
+    async def _await(self, future: Future, owner: Any) -> Any:
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # Past the deadline: drop the evaluation if it has not started yet
+            if not future.cancel() and not future.done():
+                with self._abandoned_lock:
+                    self._abandoned[future] = owner
+                future.add_done_callback(self._release)
+            raise
+
+    def _release(self, future: Future) -> None:
+        with self._abandoned_lock:
+            self._abandoned.pop(future, None)
+
+    async def _run_in_thread(self, func: Callable, *args) -> Any:
+        if self._threads is None:
+            # Not the default executor, which abandoned evaluations would starve
+            self._threads = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="rule-evaluation"
+            )
+        return await self._await(self._threads.submit(func, *args), self._threads)
+
+    async def _evaluate_in_pool(
+        self,
+        transaction: dict,
+        rule_set: RuleSet,
+        mode: str,
+        observations: Optional[List[Observation]],
+    ) -> Decision:
+        self._remember(rule_set)
+        pool = self._get_pool(rule_set)
+        values = tuple(transaction[name] for name in field_order(rule_set))
+
+        def run(delta: Optional[RuleSetDelta]):
+            return self._await(
+                pool.submit(
+                    _evaluate_in_worker,
+                    rule_set.version,
+                    mode,
+                    values,
+                    delta,
+                    observations is not None,
+                ),
+                pool,
+            )
+
+        try:
+            result = await run(None)
+            if isinstance(result, Stale):
+                # Send the changes since the version of the worker that answered
+                old = self._history.get(result.version)
+                result = await run(make_delta(result.version, old, rule_set))
+            if isinstance(result, Stale):
+                # Another worker took it: the full rule set applies to any version
+                result = await run(make_delta(None, None, rule_set))
+        except BrokenProcessPool:
+            if pool is not self._pool:
+                raise DeadlineExceeded("The worker processes were replaced")
+            logger.error("A rule evaluation worker process died, restarting the pool")
+            self._pool = None
+            raise
+        check, worker_observations = result
+        if observations is not None:
+            observations.extend(worker_observations)
+        return check
+
+    def _recycle_pool(self) -> None:
+        """
+        Terminate the worker processes running abandoned evaluations; a new pool is
+        started by the next evaluation.
+        """
+        pool, self._pool = self._pool, None
+        logger.warning(
+            "Replacing the rule evaluation worker processes, %s evaluations past their "
+            "deadline are running",
+            self.abandoned,
+        )
+        self.recycled += 1
+        with self._abandoned_lock:
+            for future, owner in list(self._abandoned.items()):
+                if owner is pool:
+                    del self._abandoned[future]
+        _terminate(pool)
+
+    def _remember(self, rule_set: RuleSet) -> None:
+        if rule_set.version in self._history:
+            return
+        self._history[rule_set.version] = definitions(rule_set)
+        while len(self._history) > self.history_size:
+            self._history.popitem(last=False)
+
+    def _get_pool(self, rule_set: RuleSet) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawned workers do not inherit the event loop, threads or DB connections
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(make_delta(None, None, rule_set),),
+            )
+        return self._pool
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Read the counters of evaluations past their deadline.
+
+        Returns:
+            Dict[str, int]: The number of abandoned evaluations still running, of
+            evaluations not started because of them, and of pool replacements.
+        """
+        return {
+            "abandoned": self.abandoned,
+            "shed": self.shed,
+            "recycled": self.recycled,
+        }
+
+    def shutdown(self) -> None:
+        """
+        Stop the worker processes and threads, if any.
+        """
+        if self._pool is not None:
+            if self._pool in self._abandoned.values():
+                # Waiting for abandoned evaluations could take forever
+                _terminate(self._pool)
+            else:
+                self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._threads = None
@@ -0,0 +1,191 @@
+# app/services/rule_fusion.py
+
+import ast
+import copy
+from collections import Counter
+from typing import Callable, List, Optional, Sequence
+from app.services.rule_compiler import SAFE_FUNCTIONS, CompiledRule, is_field
+
+# A fused evaluator takes a transaction and returns the messages of the failing rules
+FusedEvaluator = Callable[[dict], List[str]]
+
+# Sub-expressions worth computing only once
+_CACHEABLE = (ast.Call, ast.BinOp, ast.UnaryOp, ast.Subscript, ast.Compare)
+
+# Marks a shared sub-expression that was not computed yet for this transaction
+_UNSET = object()
+
+
+def _error_message(description: str, error: Exception) -> str:
+    return f"'{description}' ==> {error}"
+
+
+def _reads_field(node: ast.AST) -> bool:
+    return any(is_field(child) for child in ast.walk(node))
+
+
+def _shared_expressions(expressions: Sequence[ast.expr]) -> List[str]:
+    """
+    Find the sub-expressions that appear more than once across the rules.
+
+    Returns:
+        List[str]: The `ast.dump` of each shared sub-expression.
+    """
+    counts = Counter(
+        ast.dump(node)
+        for expression in expressions
+        for node in ast.walk(expression)
+        if isinstance(node, _CACHEABLE) and not is_field(node) and _reads_field(node)
+    )
+    return [key for key, count in counts.items() if count > 1]
+
+
+class _CacheSharedExpressions(ast.NodeTransformer):
+    """
+    Replace each shared sub-expression by a lazily computed local variable.
+
+    `expr` becomes `(_cN if _cN is not _UNSET else (_cN := expr))`, so a shared
+    sub-expression is computed at most once per transaction, and only when a rule
+    actually reaches it. If computing it raises, it stays unset and the error is
+    reported by every rule that reaches it, as with separate evaluation.
+    """
+
+    def __init__(self, names):
+        self.names = names
+
+    def visit(self, node):
+        name = self.names.get(ast.dump(node)) if isinstance(node, _CACHEABLE) else None
+        node = self.generic_visit(node)
+        if name is None:
+            return node
+        return ast.IfExp(
+            test=ast.Compare(
+                left=ast.Name(id=name, ctx=ast.Load()),
+                ops=[ast.IsNot()],
+                comparators=[ast.Name(id="_UNSET", ctx=ast.Load())],
+            ),
+            body=ast.Name(id=name, ctx=ast.Load()),
+            orelse=ast.NamedExpr(target=ast.Name(id=name, ctx=ast.Store()), value=node),
+        )
+
+
+def _call(function: str, *args: ast.expr) -> ast.Call:
+    return ast.Call(
+        func=ast.Name(id=function, ctx=ast.Load()), args=list(args), keywords=[]
+    )
+
+
+def _failure(message: ast.expr, position: Optional[int]) -> ast.expr:
+    if position is None:
+        return message
+    return ast.Tuple(elts=[ast.Constant(value=position), message], ctx=ast.Load())
+
+
+def _check_rule(
+    rule: CompiledRule, expression: ast.expr, position: Optional[int] = None
+) -> ast.stmt:
+    """
+    Build the statement checking one rule and recording its failure message.
+    """
+    description = ast.Constant(value=rule.description)
+    return ast.Try(
+        body=[
+            ast.If(
+                test=ast.UnaryOp(op=ast.Not(), operand=expression),
+                body=[ast.Expr(value=_call("_fail", _failure(description, position)))],
+                orelse=[],
+            )
+        ],
+        handlers=[
+            ast.ExceptHandler(
+                type=ast.Name(id="_Exception", ctx=ast.Load()),
+                name="_e",
+                body=[
+                    ast.Expr(
+                        value=_call(
+                            "_fail",
+                            _failure(
+                                _call(
+                                    "_error_message",
+                                    description,
+                                    ast.Name(id="_e", ctx=ast.Load()),
+                                ),
+                                position,
+                            ),
+                        )
+                    )
+                ],
+            )
+        ],
+        orelse=[],
+        finalbody=[],
+    )
+
+
+def build_fused_evaluator(
+    rules: Sequence[CompiledRule], positions: Optional[Sequence[int]] = None
+) -> FusedEvaluator:
+    """
+    Compile a whole rule set into a single function.
+
+    Sub-expressions shared by several rules, such as
+    `transaction['email_address'].lower()`, are computed once per transaction. The
+    function returns the same failure messages, in the same order, as `apply_rules`.
+
+    Args:
+        rules (Sequence[CompiledRule]): The rules to fuse, in table order.
+        positions (Optional[Sequence[int]], optional): The position of each rule in
+            its rule set. If given, each failure is returned as a (position, message)
+            pair, to be merged with failures found otherwise. Defaults to None.
+
+    Returns:
+        FusedEvaluator: A function taking the transaction dictionary and returning the
+        messages of the failing rules.
+    """
+    shared = _shared_expressions([r.expression for r in rules if r.error is None])
+    names = {key: f"_c{index}" for index, key in enumerate(shared)}
+    transformer = _CacheSharedExpressions(names)
+
+    body: List[ast.stmt] = [
+        ast.Assign(
+            targets=[ast.Name(id="_failures", ctx=ast.Store())],
+            value=ast.List(elts=[], ctx=ast.Load()),
+        ),
+        ast.Assign(
+            targets=[ast.Name(id="_fail", ctx=ast.Store())],
+            value=ast.Attribute(
+                value=ast.Name(id="_failures", ctx=ast.Load()),
+                attr="append",
+                ctx=ast.Load(),
+            ),
+        ),
+    ]
+    if names:
+        body.append(
+            ast.Assign(
+                targets=[ast.Name(id=name, ctx=ast.Store()) for name in names.values()],
+                value=ast.Name(id="_UNSET", ctx=ast.Load()),
+            )
+        )
+    for index, rule in enumerate(rules):
+        position = positions[index] if positions is not None else None
+        if rule.error is not None:
+            message = ast.Constant(value=_error_message(rule.description, rule.error))
+            body.append(ast.Expr(value=_call("_fail", _failure(message, position))))
+        else:
+            expression = transformer.visit(copy.deepcopy(rule.expression))
+            body.append(_check_rule(rule, expression, position))
+    body.append(ast.Return(value=ast.Name(id="_failures", ctx=ast.Load())))
+
+    module = ast.parse("def fused_rules(transaction):\n    pass")
+    module.body[0].body = body
+    module = ast.fix_missing_locations(module)
+    scope = {
+        "__builtins__": {},
+        **SAFE_FUNCTIONS,
+        "_UNSET": _UNSET,
+        "_Exception": Exception,
+        "_error_message": _error_message,
+    }
+    exec(compile(module, "<fused rules>", "exec"), scope)
+    return scope["fused_rules"]
@@ -0,0 +1,337 @@
+# app/services/rule_set.py
+
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Sequence, Tuple
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.db import async_crud
+from app.db.models import Rule
+from app.services.rule_compiler import (
+    QUARANTINED,
+    SCOPE_FIELDS,
+    SHADOW,
+    CompiledRule,
+    RuleCompileError,
+    compile_rule,
+    parse_scope,
+)
+from app.services.named_lists import ListLookup, is_lookup_key, parse_lookup_key
+from app.services.predicate_index import build_rule_set_evaluator
+from app.services.rule_fusion import FusedEvaluator
+from app.services.velocity import Feature, is_feature_key, parse_feature_key
+
+logger = logging.getLogger(__name__)
+
+
+class RuleSet(NamedTuple):
+    """
+    An immutable snapshot of the compiled rules.
+
+    Attributes:
+        version (int): The rule set generation stored in the database when the snapshot
+            was loaded.
+        rules (Tuple[CompiledRule, ...]): The compiled active rules, in table order.
+        fields (FrozenSet[str]): The transaction fields read by any of the active rules,
+            or routing them to their scope.
+        fused (FusedEvaluator): All the rules that apply to a transaction compiled
+            into a single function, which looks the failing comparison rules up in a
+            predicate index when there are many of them.
+        features (Tuple[Feature, ...]): The velocity features read by any of the active
+            or shadow rules; their values must be added to transactions before
+            evaluation.
+        lookups (Tuple[ListLookup, ...]): The named list lookups made by any of the
+            active or shadow rules; their results must be added to transactions before
+            evaluation.
+        scope (Tuple[str, ...]): For the subsets of a routing index, the scopes whose
+            rules they hold besides the global rules.
+        routes (Optional[RoutingIndex]): The subsets of the rules that apply to each
+            scope, if any rule is scoped.
+        shadow (Tuple[CompiledRule, ...]): The compiled shadow rules, in table order,
+            which never take part in decisions.
+    """
+
+    version: int
+    rules: Tuple[CompiledRule, ...]
+    fields: FrozenSet[str]
+    fused: FusedEvaluator
+    features: Tuple[Feature, ...]
+    lookups: Tuple[ListLookup, ...]
+    scope: Tuple[str, ...] = ()
+    routes: Optional["RoutingIndex"] = None
+    shadow: Tuple[CompiledRule, ...] = ()
+
+    def route(self, transaction: dict) -> "RuleSet":
+        """
+        Return the rules that apply to a transaction.
+
+        Args:
+            transaction (dict): Dictionary containing transaction data.
+
+        Returns:
+            RuleSet: The snapshot of the global rules and of the rules scoped to the
+            transaction, or this snapshot if no rule is scoped.
+        """
+        if self.routes is None:
+            return self
+        return self.routes.select(transaction)
+
+
+class RoutingIndex:
+    """
+    The subsets of a rule set that apply to each scope, compiled in advance.
+
+    The subset of each scope holds the global rules and the rules of that scope, in
+    table order, so a transaction is only checked against the rules that apply to it.
+    Transactions matching both a merchant and a client scope use a subset combining
+    both, compiled on first use; the `max_combined` most recently used of these are
+    kept, the least recently used being evicted one at a time.
+
+    Attributes:
+        fields (Tuple[str, ...]): The fields that scope some of the rules.
+        max_combined (int): Maximum number of combined subsets kept.
+    """
+
+    def __init__(
+        self, rules: Sequence[CompiledRule], version: int, max_combined: int = 1024
+    ):
+        self._rules = tuple(rules)
+        self._version = version
+        self.max_combined = max_combined
+        self._scopes = frozenset(rule.scope for rule in rules if rule.scope)
+        scoped_fields = {parse_scope(scope)[0] for scope in self._scopes}
+        self.fields = tuple(field for field in SCOPE_FIELDS if field in scoped_fields)
+        self._subsets: Dict[Tuple[str, ...], RuleSet] = {(): self._build(())}
+        for scope in self._scopes:
+            self._subsets[(scope,)] = self._build((scope,))
+        self._lock = threading.Lock()
+        self._combined: "OrderedDict[Tuple[str, ...], RuleSet]" = OrderedDict()
+
+    def _build(self, scope: Tuple[str, ...]) -> RuleSet:
+        return assemble_rule_set(
+            [rule for rule in self._rules if rule.scope is None or rule.scope in scope],
+            self._version,
+            scope,
+        )
+
+    def select(self, transaction: dict) -> RuleSet:
+        """
+        Return the subset of the rules that apply to a transaction.
+
+        Args:
+            transaction (dict): Dictionary containing transaction data.
+
+        Returns:
+            RuleSet: The global rules and the rules of the scopes of the transaction.
+        """
+        scopes = self._scopes
+        scope = tuple(
+            key
+            for key in (f"{field}:{transaction[field]}" for field in self.fields)
+            if key in scopes
+        )
+        subset = self._subsets.get(scope)
+        if subset is not None:
+            return subset
+        with self._lock:
+            subset = self._combined.get(scope)
+            if subset is not None:
+                self._combined.move_to_end(scope)
+                return subset
+        # Built outside the lock; threads missing the same scope at once build it twice
+        subset = self._build(scope)
+        with self._lock:
+            self._combined[scope] = subset
+            while len(self._combined) > self.max_combined:
+                self._combined.popitem(last=False)
+        return subset
+
+    def __len__(self) -> int:
+        return len(self._subsets) - 1
+
+
+_lock = asyncio.Lock()
+_current: Optional[RuleSet] = None
+
+
+def load_rule(rule: Rule) -> CompiledRule:
+    """
+    Compile a rule stored in the database.
+
+    Args:
+        rule (Rule): The rule to compile.
+
+    Returns:
+        CompiledRule: The compiled rule. Rules stored before validation existed may not
+        compile; their error is kept so that it is reported when the rule is applied.
+    """
+    try:
+        return compile_rule(
+            rule.id, rule.description, rule.rule, rule.scope, rule.status
+        )
+    except RuleCompileError as e:
+        # A rule with an invalid scope reports its error on every transaction
+        scope = rule.scope
+        if scope is not None:
+            try:
+                parse_scope(scope)
+            except RuleCompileError:
+                scope = None
+        return CompiledRule(
+            rule.id,
+            rule.description,
+            rule.rule,
+            None,
+            frozenset(),
+            None,
+            e,
+            scope,
+            rule.status,
+        )
+
+
+def build_rule_set(rules: List[Rule], version: int) -> RuleSet:
+    """
+    Build a rule set snapshot from rules.
+
+    Args:
+        rules (List[Rule]): The rules to compile.
+        version (int): The version of the snapshot.
+
+    Returns:
+        RuleSet: The compiled snapshot.
+    """
+    return assemble_rule_set([load_rule(rule) for rule in rules], version)
+
+
+def assemble_rule_set(
+    compiled: Sequence[CompiledRule],
+    version: int,
+    scope: Optional[Tuple[str, ...]] = None,
+) -> RuleSet:
+    """
+    Build a rule set snapshot from rules that are already compiled.
+
+    Args:
+        compiled (Sequence[CompiledRule]): The compiled rules, in table order.
+        version (int): The version of the snapshot.
+        scope (Optional[Tuple[str, ...]], optional): For a subset of a routing index,
+            the scopes whose rules it holds. Defaults to None, for a whole rule set,
+            routed to its subsets if any rule is scoped.
+
+    Returns:
+        RuleSet: The snapshot. Shadow rules are set apart from the active rules, so
+        they are never routed, indexed or sent to the executors; quarantined rules are
+        left out.
+    """
+    compiled = [rule for rule in compiled if rule.status != QUARANTINED]
+    shadow = tuple(rule for rule in compiled if rule.status == SHADOW)
+    compiled = tuple(rule for rule in compiled if rule.status != SHADOW)
+    fields = frozenset().union(*(rule.fields for rule in compiled))
+    # Shadow rules read their features and lookups from the checked transactions too
+    extra = frozenset().union(*(rule.fields for rule in shadow))
+    routes = None
+    if scope is None and any(rule.scope for rule in compiled):
+        routes = RoutingIndex(compiled, version)
+        fields |= frozenset(routes.fields)
+    features = tuple(
+        sorted(
+            parse_feature_key(name) for name in fields | extra if is_feature_key(name)
+        )
+    )
+    lookups = tuple(
+        sorted(parse_lookup_key(name) for name in fields | extra if is_lookup_key(name))
+    )
+    if routes is not None:
+        # Each subset has its own evaluator; this one only dispatches to them
+        def evaluate(transaction: dict) -> List[str]:
+            return routes.select(transaction).fused(transaction)
+
+        return RuleSet(
+            version, compiled, fields, evaluate, features, lookups, (), routes, shadow
+        )
+    return RuleSet(
+        version,
+        compiled,
+        fields,
+        build_rule_set_evaluator(compiled),
+        features,
+        lookups,
+        scope or (),
+        None,
+        shadow,
+    )
+
+
+def get_rule_set() -> Optional[RuleSet]:
+    """
+    Return the current rule set snapshot.
+
+    Returns:
+        Optional[RuleSet]: The current snapshot, or None if it has not been loaded yet.
+    """
+    return _current
+
+
+async def refresh_rule_set(db: AsyncSession) -> RuleSet:
+    """
+    Reload and recompile the rules if their generation in the database is newer.
+
+    The new snapshot is fully built before it replaces the current one, so requests
+    that already hold the previous snapshot keep evaluating against it and no request
+    ever sees a partially updated rule set.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+
+    Returns:
+        RuleSet: The current snapshot.
+    """
+    global _current
+    async with _lock:
+        # Read the generation before the rules: a change committed in between is then
+        # picked up by the next refresh instead of being tagged as already loaded
+        generation = await async_crud.get_rule_set_generation(db)
+        # A lagging replica may still serve an older generation, never reloaded
+        if _current is not None and _current.version >= generation:
+            return _current
+        rules = await async_crud.get_rules_(db)
+        rule_set = await asyncio.to_thread(build_rule_set, rules, generation)
+        _current = rule_set
+    logger.info("Loaded rule set generation %s", generation)
+    return rule_set
+
+
+async def get_or_load_rule_set(db: AsyncSession) -> RuleSet:
+    """
+    Return the current rule set snapshot, loading it on first use.
+
+    Args:
+        db (AsyncSession): SQLAlchemy async database session.
+
+    Returns:
+        RuleSet: The current snapshot.
+    """
+    return _current or await refresh_rule_set(db)
+
+
+async def watch_rule_set(session_factory: async_sessionmaker, interval: float):
+    """
+    Keep the snapshot in sync with changes made by other workers.
+
+    Every `interval` seconds the stored generation is compared with the one of the
+    current snapshot, and the rules are only reloaded when it is newer, so that a
+    replica lagging behind the primary never brings back an older rule set.
+
+    Args:
+        session_factory (async_sessionmaker): Factory for async database sessions.
+        interval (float): Seconds between two generation checks.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_factory() as db:
+                await refresh_rule_set(db)
+        except Exception:
+            logger.exception("Failed to refresh the rule set")
@@ -0,0 +1,250 @@
+# app/services/shadow.py
+
+import asyncio
+import logging
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+from app.services.metrics import ERROR, FAIL, PASS
+from app.services.rule_compiler import CompiledRule, RuleCompileError, parse_scope
+from app.services.rule_set import RuleSet
+
+logger = logging.getLogger(__name__)
+
+# Counters of a shadow rule: its outcome against the live decision
+OUTCOMES = ("passed_approved", "failed_rejected", "failed_approved", "passed_rejected")
+COUNTERS = OUTCOMES + ("errors",)
+
+# (rule set, transactions, whether each was approved)
+ShadowWork = Tuple[RuleSet, Sequence[dict], Sequence[bool]]
+
+
+def evaluate_shadow_rule(rule: CompiledRule, transaction: dict) -> str:
+    """
+    Evaluate a shadow rule on a transaction.
+
+    Args:
+        rule (CompiledRule): The rule to evaluate.
+        transaction (dict): Dictionary containing transaction data, with its velocity
+            features and list lookups.
+
+    Returns:
+        str: PASS, FAIL or ERROR.
+    """
+    try:
+        if rule.error is not None:
+            raise rule.error
+        return PASS if rule.fn(transaction) else FAIL
+    except Exception:
+        return ERROR
+
+
+class ShadowEvaluator:
+    """
+    Background evaluation of shadow rules, off the path of the responses.
+
+    The transactions checked against a rule set with shadow rules are queued once their
+    decision is made, and a background task evaluates them in batches on a thread, so
+    shadow rules never delay a response. The queue is bounded: when it is full, the
+    transactions are dropped and counted rather than queued, so shadow rules cannot
+    build up memory or latency under load.
+
+    For each shadow rule, the evaluator counts how often it agrees with the live
+    decision (passing approved transactions, failing rejected ones) and disagrees with
+    it (failing approved transactions, passing rejected ones). Errors count as
+    failures, and are also counted on their own.
+
+    Attributes:
+        max_queue_size (int): Maximum number of checks waiting for evaluation.
+        batch_size (int): Maximum number of checks evaluated per thread hop.
+        dropped (int): Number of transactions dropped because the queue was full.
+    """
+
+    def __init__(self, max_queue_size: int = 10_000, batch_size: int = 256):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # Counters are updated by the evaluation thread and read by the event loop
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._scopes: Dict[str, Tuple[str, str]] = {}
+        self._rules: Dict[Tuple[int, str], CompiledRule] = {}
+        self._counts: Dict[Tuple[int, str], Dict[str, int]] = {}
+        self._transactions = 0
+        self._would_reject = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self) -> None:
+        """
+        Start the background evaluation task on the running event loop.
+        """
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the background task, dropping the checks still queued.
+        """
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def submit(
+        self,
+        rule_set: RuleSet,
+        transactions: Sequence[dict],
+        approved: Sequence[bool],
+    ) -> bool:
+        """
+        Queue checked transactions for the evaluation of the shadow rules.
+
+        Args:
+            rule_set (RuleSet): The rule set the transactions were checked against.
+            transactions (Sequence[dict]): The transactions, with their velocity
+                features and list lookups.
+            approved (Sequence[bool]): Whether each transaction was approved.
+
+        Returns:
+            bool: False if the transactions were dropped because the queue was full,
+            True otherwise, including when the rule set has no shadow rules.
+        """
+        if not rule_set.shadow or not transactions:
+            return True
+        if not self.running:
+            self.start()
+        try:
+            self._queue.put_nowait((rule_set, transactions, approved))
+        except asyncio.QueueFull:
+            self.dropped += len(transactions)
+            return False
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await asyncio.to_thread(self.evaluate, batch)
+            except Exception:
+                logger.exception("Failed to evaluate %s shadow checks", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _use(self, rule_set: RuleSet) -> None:
+        # Forget the rules that are no longer shadow rules when the rule set changes
+        self._version = rule_set.version
+        rules = {(rule.id, rule.rule): rule for rule in rule_set.shadow}
+        with self._lock:
+            self._rules = rules
+            self._counts = {
+                key: self._counts.get(key) or dict.fromkeys(COUNTERS, 0)
+                for key in rules
+            }
+
+    def _applies(self, rule: CompiledRule, transaction: dict) -> bool:
+        if rule.scope is None:
+            return True
+        scope = self._scopes.get(rule.scope)
+        if scope is None:
+            try:
+                scope = self._scopes[rule.scope] = parse_scope(rule.scope)
+            except RuleCompileError:
+                # Reported as an error on every transaction, like active rules
+                return True
+        return transaction.get(scope[0]) == scope[1]
+
+    def evaluate(self, batch: List[ShadowWork]) -> None:
+        """
+        Evaluate the shadow rules on checked transactions and update the counters.
+
+        Args:
+            batch (List[ShadowWork]): The rule sets, transactions and decisions.
+        """
+        for rule_set, transactions, approved in batch:
+            # Checks against an older snapshot only count for rules still in shadow
+            if self._version is None or rule_set.version > self._version:
+                self._use(rule_set)
+            checked = [
+                (
+                    live,
+                    [
+                        (rule, evaluate_shadow_rule(rule, transaction))
+                        for rule in rule_set.shadow
+                        if self._applies(rule, transaction)
+                    ],
+                )
+                for transaction, live in zip(transactions, approved)
+            ]
+            self._record(checked)
+
+    def _record(self, checked: List[Tuple[bool, List[Tuple[CompiledRule, str]]]]):
+        with self._lock:
+            counts = self._counts
+            for live, outcomes in checked:
+                self._transactions += 1
+                rejects = False
+                for rule, outcome in outcomes:
+                    passed = outcome == PASS
+                    rejects = rejects or not passed
+                    count = counts.get((rule.id, rule.rule))
+                    if count is None:
+                        continue
+                    if outcome == ERROR:
+                        count["errors"] += 1
+                    if live:
+                        count["passed_approved" if passed else "failed_approved"] += 1
+                    else:
+                        count["passed_rejected" if passed else "failed_rejected"] += 1
+                if live and rejects:
+                    self._would_reject += 1
+
+    def stats(self) -> dict:
+        """
+        Read the counters of the shadow rules.
+
+        Returns:
+            dict: The rule set version evaluated last, the number of transactions
+            evaluated, dropped and queued, the number of approved transactions some
+            shadow rule would have rejected, and for each shadow rule its counts of
+            agreements and disagreements with the live decisions.
+        """
+        with self._lock:
+            counts = [
+                (rule, dict(self._counts[key])) for key, rule in self._rules.items()
+            ]
+            transactions, would_reject = self._transactions, self._would_reject
+        rules = [
+            {
+                "rule_id": rule.id,
+                "description": rule.description,
+                "rule": rule.rule,
+                "scope": rule.scope,
+                "evaluated": sum(count[name] for name in OUTCOMES),
+                "agreements": count["passed_approved"] + count["failed_rejected"],
+                "disagreements": count["failed_approved"] + count["passed_rejected"],
+                **count,
+            }
+            for rule, count in counts
+        ]
+        return {
+            "version": self._version,
+            "transactions": transactions,
+            "would_reject": would_reject,
+            "dropped": self.dropped,
+            "queued": self.queued,
+            "rules": rules,
+        }
@@ -0,0 +1,283 @@
+# app/services/velocity.py
+
+import re
+import time
+from collections import OrderedDict, deque
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    NamedTuple,
+    Tuple,
+)
+
+# Velocity functions that rules may call, e.g. count(client_id, '10m')
+COUNT = "count"
+TOTAL = "total"
+VELOCITY_FUNCTIONS = (COUNT, TOTAL)
+
+# Field summed by total()
+TOTAL_FIELD = "amount"
+
+# Longest window a rule may ask for, in seconds
+MAX_WINDOW = 7 * 24 * 3600
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+_WINDOW = re.compile(r"^\s*(\d+)\s*([smhd])\s*$")
+
+
+class Feature(NamedTuple):
+    """
+    A velocity aggregate read by rules.
+
+    Compiled rules read it as the transaction field named by `key`, which is filled in
+    before evaluation; real fields never contain ':'.
+
+    Attributes:
+        function (str): "count" or "total".
+        dimension (str): The transaction field grouping the transactions, e.g.
+            "client_id".
+        window (int): The length of the sliding window, in seconds.
+    """
+
+    function: str
+    dimension: str
+    window: int
+
+    @property
+    def key(self) -> str:
+        return f"{self.function}:{self.dimension}:{self.window}"
+
+
+def is_feature_key(name: str) -> bool:
+    return name.partition(":")[0] in VELOCITY_FUNCTIONS
+
+
+def parse_feature_key(name: str) -> Feature:
+    function, dimension, window = name.split(":")
+    return Feature(function, dimension, int(window))
+
+
+def parse_window(text: str) -> int:
+    """
+    Parse a window length such as '30s', '10m', '1h' or '1d'.
+
+    Args:
+        text (str): The window length.
+
+    Returns:
+        int: The window length, in seconds.
+
+    Raises:
+        ValueError: If the length is malformed, zero or longer than MAX_WINDOW.
+    """
+    match = _WINDOW.match(text)
+    if match is None:
+        raise ValueError(f"Invalid window '{text}', expected e.g. '30s', '10m' or '1h'")
+    seconds = int(match.group(1)) * _UNITS[match.group(2)]
+    if not 0 < seconds <= MAX_WINDOW:
+        raise ValueError(f"Window '{text}' must be between 1s and {MAX_WINDOW}s")
+    return seconds
+
+
+class _Series:
+    """
+    Bucketed count and total of the transactions of one key, with their running sums.
+    """
+
+    __slots__ = ("buckets", "count", "total", "last_seen")
+
+    def __init__(self):
+        # [bucket index, count, total], oldest first
+        self.buckets: Deque[List] = deque()
+        self.count = 0
+        self.total = 0.0
+        self.last_seen = 0
+
+    def expire(self, oldest: int) -> None:
+        buckets = self.buckets
+        while buckets and buckets[0][0] < oldest:
+            _, count, total = buckets.popleft()
+            self.count -= count
+            self.total -= total
+        if not buckets:
+            # Start again from exact zeros rather than accumulated rounding errors
+            self.count, self.total = 0, 0.0
+
+    def add(self, index: int, amount: float) -> None:
+        buckets = self.buckets
+        if buckets and buckets[-1][0] == index:
+            bucket = buckets[-1]
+            bucket[1] += 1
+            bucket[2] += amount
+        else:
+            buckets.append([index, 1, amount])
+        self.count += 1
+        self.total += amount
+        self.last_seen = index
+
+
+class VelocityStore:
+    """
+    Sliding-window counts and totals of recent transactions, per key.
+
+    Each window of each dimension, e.g. the last 10 minutes per client_id, keeps one
+    series per key, split into `buckets` buckets, with running sums: recording and
+    reading a value costs O(1), amortized over the expiry of old buckets. Windows are
+    therefore exact to one bucket, 1/`buckets` of their length.
+
+    Memory is bounded by `max_keys` series per window. Keys whose window has no
+    transaction left are dropped, and the least recently updated key is evicted when a
+    window is full. Values are recorded and read from the event loop thread, so no lock
+    is needed.
+
+    Attributes:
+        max_keys (int): Maximum number of keys tracked per window.
+        buckets (int): Number of buckets per window.
+    """
+
+    def __init__(
+        self,
+        max_keys: int = 100_000,
+        buckets: int = 60,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_keys = max_keys
+        self.buckets = buckets
+        self._clock = clock
+        # (dimension, window) -> key -> series, least recently updated first
+        self._windows: Dict[Tuple[str, int], "OrderedDict[str, _Series]"] = {}
+        self._active: FrozenSet[Tuple[str, int]] = frozenset()
+        # transaction_id -> time recorded, oldest first
+        self._recorded: "OrderedDict[str, float]" = OrderedDict()
+        self.evictions = 0
+
+    def _index(self, window: int, now: float) -> int:
+        return int(now * self.buckets / window)
+
+    def record(self, transaction: dict, features: Iterable[Feature]) -> None:
+        """
+        Add a transaction to the windows the features read.
+
+        A transaction_id seen within the longest window is only counted once, so a
+        transaction that is checked and then saved is not counted twice.
+
+        Args:
+            transaction (dict): Dictionary containing transaction data.
+            features (Iterable[Feature]): The features of the rule set.
+        """
+        windows = frozenset((feature.dimension, feature.window) for feature in features)
+        if not windows:
+            return
+        if windows != self._active:
+            # Forget the windows no rule reads anymore
+            self._windows = {
+                window: self._windows.get(window) or OrderedDict() for window in windows
+            }
+            self._active = windows
+        now = self._clock()
+        longest = max(window for _, window in windows)
+        if not self._first_seen(transaction["transaction_id"], now, longest):
+            return
+        amount = transaction[TOTAL_FIELD]
+        for (dimension, window), series_by_key in self._windows.items():
+            index = self._index(window, now)
+            oldest = index - self.buckets + 1
+            key = transaction[dimension]
+            series = series_by_key.get(key)
+            if series is None:
+                series = series_by_key[key] = _Series()
+            else:
+                series_by_key.move_to_end(key)
+            series.expire(oldest)
+            series.add(index, amount)
+            self._evict(series_by_key, oldest)
+
+    def _first_seen(self, transaction_id: str, now: float, longest: int) -> bool:
+        recorded = self._recorded
+        while recorded and (
+            len(recorded) >= self.max_keys
+            or next(iter(recorded.values())) < now - longest
+        ):
+            recorded.popitem(last=False)
+        if transaction_id in recorded:
+            return False
+        recorded[transaction_id] = now
+        return True
+
+    def _evict(self, series_by_key: "OrderedDict[str, _Series]", oldest: int) -> None:
+        # Idle keys first, then the least recently updated ones beyond the limit
+        while series_by_key:
+            key, series = next(iter(series_by_key.items()))
+            if series.last_seen >= oldest and len(series_by_key) <= self.max_keys:
+                return
+            del series_by_key[key]
+            if series.last_seen >= oldest:
+                self.evictions += 1
+
+    def lookup(
+        self, transaction: dict, features: Iterable[Feature]
+    ) -> Dict[str, float]:
+        """
+        Read the value of features for a transaction.
+
+        Args:
+            transaction (dict): Dictionary containing transaction data.
+            features (Iterable[Feature]): The features to read.
+
+        Returns:
+            Dict[str, float]: The value of each feature, keyed by `Feature.key`.
+        """
+        now = self._clock()
+        values = {}
+        for feature in features:
+            series_by_key = self._windows.get((feature.dimension, feature.window))
+            series = (
+                series_by_key.get(transaction[feature.dimension])
+                if series_by_key is not None
+                else None
+            )
+            if series is None:
+                values[feature.key] = 0 if feature.function == COUNT else 0.0
+                continue
+            index = self._index(feature.window, now)
+            series.expire(index - self.buckets + 1)
+            values[feature.key] = (
+                series.count if feature.function == COUNT else series.total
+            )
+        return values
+
+    def observe(self, transaction: dict, features: Tuple[Feature, ...]) -> dict:
+        """
+        Record a transaction, then return it with the value of the features.
+
+        Args:
+            transaction (dict): Dictionary containing transaction data.
+            features (Tuple[Feature, ...]): The features of the rule set.
+
+        Returns:
+            dict: The transaction, extended with one field per feature, or the
+            transaction itself if there are no features.
+        """
+        if not features:
+            return transaction
+        self.record(transaction, features)
+        return {**transaction, **self.lookup(transaction, features)}
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Return the size of the store.
+
+        Returns:
+            Dict[str, int]: The number of windows, of tracked keys over all windows, of
+            remembered transaction_ids, and of keys evicted because a window was full.
+        """
+        return {
+            "windows": len(self._windows),
+            "keys": sum(len(keys) for keys in self._windows.values()),
+            "transaction_ids": len(self._recorded),
+            "evictions": self.evictions,
+        }
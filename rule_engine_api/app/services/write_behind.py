@@ -0,0 +1,208 @@
+# app/services/write_behind.py
+
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from app.db.models import Transaction
+
+logger = logging.getLogger(__name__)
+
+# Acknowledgment policies
+ACK_ENQUEUE = "enqueue"
+ACK_FLUSH = "flush"
+
+
+class QueueFullError(Exception):
+    """
+    Raised when a transaction cannot be queued because the queue stayed full.
+    """
+
+
+class TransactionWriter:
+    """
+    Write-behind queue persisting transactions in multi-row inserts.
+
+    Transactions are queued in memory and flushed by a background task once
+    `batch_size` of them are waiting or `flush_interval` seconds after the first one
+    was queued, whichever comes first.
+
+    Attributes:
+        batch_size (int): Maximum number of transactions per insert.
+        flush_interval (float): Maximum seconds a queued transaction waits for its batch.
+        enqueue_timeout (float): Seconds to wait for room in a full queue before giving up.
+        stop_timeout (float): Seconds to wait for the queued transactions on shutdown.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        batch_size: int = 500,
+        flush_interval: float = 0.05,
+        max_queue_size: int = 10_000,
+        enqueue_timeout: float = 1.0,
+        stop_timeout: float = 10.0,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.enqueue_timeout = enqueue_timeout
+        self.stop_timeout = stop_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # The batch being collected or flushed, dropped if cancelled on shutdown
+        self._flushing: List[Tuple[dict, Optional[asyncio.Future]]] = []
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        """
+        Start the background flush task on the running event loop.
+        """
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Flush every queued transaction, then stop the background task.
+
+        If the flush task died, or the transactions are not flushed within
+        `stop_timeout` seconds, the transactions still queued are dropped and logged.
+        """
+        if self._task is None:
+            return
+        flushed = asyncio.ensure_future(self._queue.join())
+        await asyncio.wait(
+            {flushed, self._task},
+            timeout=self.stop_timeout,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        flushed.cancel()
+        if not self._task.done():
+            self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("Transaction flush task failed")
+        self._drop_queued()
+
+    def _drop_queued(self) -> None:
+        queued = list(self._flushing)
+        while not self._queue.empty():
+            queued.append(self._queue.get_nowait())
+            self._queue.task_done()
+        dropped = []
+        for record, future in queued:
+            dropped.append(record.get("transaction_id"))
+            if future is not None and not future.done():
+                future.set_exception(RuntimeError("Transaction writer stopped"))
+        if dropped:
+            logger.error(
+                "Dropped %s queued transactions on shutdown: %s",
+                len(dropped),
+                ", ".join(map(str, dropped)),
+            )
+
+    async def submit(self, record: dict, wait_for_flush: bool) -> Optional[int]:
+        """
+        Queue a transaction for insertion.
+
+        Args:
+            record (dict): The validated transaction data.
+            wait_for_flush (bool): Whether to wait until the transaction is committed.
+
+        Returns:
+            Optional[int]: The ID of the inserted transaction if waiting for the flush,
+            None otherwise.
+
+        Raises:
+            QueueFullError: If the queue stayed full for `enqueue_timeout` seconds.
+            Exception: The insert error, if waiting for the flush and the insert failed.
+        """
+        if not self.running:
+            self.start()
+        future = asyncio.get_running_loop().create_future() if wait_for_flush else None
+        try:
+            await asyncio.wait_for(
+                self._queue.put((record, future)), timeout=self.enqueue_timeout
+            )
+        except asyncio.TimeoutError:
+            raise QueueFullError("Transaction queue is full")
+        if future is None:
+            return None
+        return await future
+
+    async def _next_batch(self) -> List[Tuple[dict, Optional[asyncio.Future]]]:
+        batch = self._flushing = [await self._queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            try:
+                await self._flush(batch)
+            except asyncio.CancelledError:
+                # Left in _flushing, for stop() to fail and log the batch cut short
+                raise
+            self._flushing = []
+            for _ in batch:
+                self._queue.task_done()
+
+    async def _flush(self, batch: List[Tuple[dict, Optional[asyncio.Future]]]) -> None:
+        statement = insert(Transaction).returning(
+            Transaction.id, sort_by_parameter_order=True
+        )
+        try:
+            async with self.session_factory() as db:
+                result = await db.execute(statement, [record for record, _ in batch])
+                ids = result.scalars().all()
+                await db.commit()
+        except Exception:
+            logger.exception(
+                "Batch insert of %s transactions failed, retrying one by one",
+                len(batch),
+            )
+            await self._flush_one_by_one(batch)
+            return
+        for (_, future), transaction_id in zip(batch, ids):
+            if future is not None and not future.done():
+                future.set_result(transaction_id)
+
+    async def _flush_one_by_one(
+        self, batch: List[Tuple[dict, Optional[asyncio.Future]]]
+    ) -> None:
+        """
+        Insert transactions separately so that one bad row does not fail its batch.
+        """
+        for record, future in batch:
+            try:
+                async with self.session_factory() as db:
+                    result = await db.execute(
+                        insert(Transaction).returning(Transaction.id), record
+                    )
+                    transaction_id = result.scalar_one()
+                    await db.commit()
+            except Exception as e:
+                logger.error(
+                    "Failed to save transaction %s: %s", record.get("transaction_id"), e
+                )
+                if future is not None and not future.done():
+                    future.set_exception(e)
+                continue
+            if future is not None and not future.done():
+                future.set_result(transaction_id)
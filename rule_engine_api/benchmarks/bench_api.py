@@ -0,0 +1,181 @@
+# benchmarks/bench_api.py
+
+"""
+In-process benchmarks of the transaction endpoints, against a local SQLite database.
+
+Requests go through the whole ASGI application, with validation, dependencies and
+serialization, but without a network or a server process.
+
+Usage:
+    python -m benchmarks.bench_api --output api.json
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+from typing import Callable, List
+
+
+def configure_environment(database_path: str) -> None:
+    """
+    Point the application at a SQLite database; must run before `app` is imported.
+    """
+    os.environ["DATABASE_URL"] = f"sqlite:///{database_path}"
+    for name in ("POSTGRES_DB", "POSTGRES_USER", "POSTGRES_PASSWORD"):
+        os.environ.setdefault(name, "benchmark")
+
+
+async def run_case(
+    client,
+    name: str,
+    path: str,
+    make_payload: Callable[[int], dict],
+    requests: int,
+    concurrency: int,
+) -> dict:
+    """
+    Send requests from concurrent clients, each waiting for its previous response.
+
+    Args:
+        client (httpx.AsyncClient): Client bound to the application.
+        name (str): The name of the case.
+        path (str): The endpoint to call.
+        make_payload (Callable[[int], dict]): Builds the body of the n-th request.
+        requests (int): The number of requests to send.
+        concurrency (int): The number of concurrent clients.
+
+    Returns:
+        dict: The summary of the case, with the number of unexpected status codes.
+    """
+    from benchmarks.common import summarize
+
+    payloads = [make_payload(i) for i in range(requests)]
+    latencies: List[int] = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal errors, next_index
+        while next_index < len(payloads):
+            payload = payloads[next_index]
+            next_index += 1
+            start = time.perf_counter_ns()
+            response = await client.post(path, json=payload)
+            latencies.append(time.perf_counter_ns() - start)
+            if response.status_code >= 300:
+                errors += 1
+
+    begin = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - begin
+    return summarize(name, latencies, elapsed, concurrency=concurrency, errors=errors)
+
+
+async def run(requests: int, concurrency: int, warmup: int) -> List[dict]:
+    """
+    Benchmark check-transaction and save-transaction.
+
+    Args:
+        requests (int): The number of requests of each case.
+        concurrency (int): The number of concurrent clients.
+        warmup (int): The number of requests sent before measuring.
+
+    Returns:
+        List[dict]: The summary of each case.
+    """
+    import httpx
+    from app.main import app
+    from benchmarks.common import generate_transaction
+
+    random.seed(0)
+    cases = [
+        (
+            "check-transaction",
+            "/v0/transactions/check-transaction",
+            lambda i: generate_transaction(i, approved=i % 2 == 0),
+        ),
+        (
+            "check-transaction/fail_fast",
+            "/v0/transactions/check-transaction?mode=fail_fast",
+            lambda i: generate_transaction(i, approved=i % 2 == 0),
+        ),
+        (
+            "save-transaction",
+            "/v0/transactions/save-transaction",
+            lambda i: generate_transaction(i, approved=True),
+        ),
+    ]
+    results = []
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark"
+        ) as client:
+            for name, path, make_payload in cases:
+                await run_case(
+                    client, name, path, make_payload, warmup, min(concurrency, warmup)
+                )
+                result = await run_case(
+                    client, name, path, make_payload, requests, concurrency
+                )
+                print(f"{name}: {result['ops_per_sec']:.1f} requests/s")
+                results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the transaction endpoints in process."
+    )
+    parser.add_argument(
+        "--requests", type=int, default=2000, help="Requests sent per case."
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=16, help="Number of concurrent clients."
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=200, help="Requests sent before measuring."
+    )
+    parser.add_argument(
+        "--database",
+        type=str,
+        default=None,
+        help="SQLite database file. Defaults to a new temporary file.",
+    )
+    parser.add_argument(
+        "--with-logging",
+        action="store_true",
+        help="Keep the per-request INFO logs of the endpoints.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="bench_api.json",
+        help="The JSON file to write the results to.",
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        configure_environment(args.database or os.path.join(directory, "bench.db"))
+        if not args.with_logging:
+            logging.disable(logging.INFO)
+
+        from benchmarks.common import print_results, write_results
+
+        results = asyncio.run(run(args.requests, args.concurrency, args.warmup))
+        print_results(results)
+        write_results(
+            args.output,
+            "api",
+            results,
+            requests=args.requests,
+            concurrency=args.concurrency,
+            warmup=args.warmup,
+            with_logging=args.with_logging,
+            rule_executor=os.environ.get("RULE_EXECUTOR", "default"),
+            fast_path=os.environ.get("FAST_PATH_ENABLED", "false"),
+        )
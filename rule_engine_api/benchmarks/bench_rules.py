@@ -0,0 +1,161 @@
+# benchmarks/bench_rules.py
+
+"""
+Microbenchmarks of rule evaluation across rule set sizes and rule shapes.
+
+Usage:
+    python -m benchmarks.bench_rules --output rules.json
+"""
+
+import argparse
+import itertools
+import random
+import time
+from typing import Callable, Dict, List
+from benchmarks.common import (
+    generate_transaction,
+    print_results,
+    summarize,
+    time_calls,
+    write_results,
+)
+from app.services.batch_engine import apply_rules_batch, build_batch_plan
+from app.services.rule_compiler import compile_rule
+from app.services.rule_engine import (
+    AdaptiveScheduler,
+    apply_rule_set,
+    apply_rules,
+    apply_rules_fail_fast,
+)
+from app.services.rule_set import assemble_rule_set
+
+
+def _merchants(i: int) -> str:
+    return ", ".join(repr(str(100 + (i + k) % 900)) for k in range(5))
+
+
+# Rule source generators by shape, taking the index of the rule
+SHAPES: Dict[str, Callable[[int], str]] = {
+    "comparison": lambda i: f"transaction['amount'] < {1_500_000 + i}",
+    "equality": lambda i: f"transaction['merchant_id'] != '{100 + i}'",
+    "string": lambda i: f"transaction['email_address'].lower().endswith('.c{i % 10}')",
+    "membership": lambda i: f"transaction['merchant_id'] not in ({_merchants(i)})",
+    "arithmetic": lambda i: (
+        f"transaction['amount'] * {1 + i % 7} - transaction['transaction_amount'] "
+        f"< {10_000_000 + i}"
+    ),
+}
+SHAPES["mixed"] = lambda i: list(SHAPES.values())[i % 5](i)
+
+DEFAULT_SIZES = [2, 10, 100, 1000, 10_000]
+BATCH_SIZE = 256
+
+
+def build(shape: str, size: int):
+    rules = [
+        compile_rule(i, f"{shape} rule {i}", SHAPES[shape](i)) for i in range(size)
+    ]
+    return assemble_rule_set(rules, 1)
+
+
+def run(sizes: List[int], shapes: List[str], min_time: float) -> List[dict]:
+    """
+    Benchmark every evaluation strategy for each rule set shape and size.
+
+    Args:
+        sizes (List[int]): The numbers of rules.
+        shapes (List[str]): The rule shapes.
+        min_time (float): Seconds spent on each case.
+
+    Returns:
+        List[dict]: The summary of each case.
+    """
+    random.seed(0)
+    transactions = [generate_transaction(i, approved=i % 2 == 0) for i in range(1000)]
+    results = []
+    for shape, size in itertools.product(shapes, sizes):
+        start = time.perf_counter()
+        rule_set = build(shape, size)
+        plan = build_batch_plan(rule_set.rules)
+        compile_seconds = time.perf_counter() - start
+        print(f"{shape}/{size}: compiled in {compile_seconds:.3f}s")
+
+        scheduler = AdaptiveScheduler()
+        cases = {
+            "rules": lambda tx: apply_rules(tx, rule_set.rules),
+            "fused": lambda tx: apply_rule_set(tx, rule_set),
+            "fail_fast": lambda tx: apply_rules_fail_fast(tx, rule_set, scheduler),
+        }
+        # Fewer calls on large rule sets, so that a run stays within minutes
+        max_calls = max(50, 1_000_000 // size)
+        for strategy, evaluate in cases.items():
+            stream = itertools.cycle(transactions)
+            begin = time.perf_counter()
+            latencies = time_calls(lambda: evaluate(next(stream)), min_time, max_calls)
+            results.append(
+                summarize(
+                    f"{strategy}/{shape}/{size}",
+                    latencies,
+                    time.perf_counter() - begin,
+                    rules=size,
+                    compile_seconds=compile_seconds,
+                )
+            )
+
+        batch = transactions[:BATCH_SIZE]
+        begin = time.perf_counter()
+        latencies = time_calls(
+            lambda: apply_rules_batch(batch, plan), min_time, max(5, max_calls // 100)
+        )
+        elapsed = time.perf_counter() - begin
+        results.append(
+            summarize(
+                f"batch{BATCH_SIZE}/{shape}/{size}",
+                latencies,
+                elapsed,
+                rules=size,
+                compile_seconds=compile_seconds,
+                transactions_per_sec=len(latencies) * BATCH_SIZE / elapsed,
+            )
+        )
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark rule evaluation.")
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=DEFAULT_SIZES,
+        help="Comma-separated numbers of rules.",
+    )
+    parser.add_argument(
+        "--shapes",
+        type=lambda value: value.split(","),
+        default=list(SHAPES),
+        help=f"Comma-separated rule shapes among {', '.join(SHAPES)}.",
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.5,
+        help="Seconds spent on each case.",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="bench_rules.json",
+        help="The JSON file to write the results to.",
+    )
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.shapes, args.min_time)
+    print_results(results)
+    write_results(
+        args.output,
+        "rules",
+        results,
+        sizes=args.sizes,
+        shapes=args.shapes,
+        min_time=args.min_time,
+    )
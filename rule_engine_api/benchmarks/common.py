@@ -0,0 +1,147 @@
+# benchmarks/common.py
+
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+
+def generate_transaction(index: int, approved: bool) -> dict:
+    """
+    Generate a transaction accepted or rejected by the initial rules.
+
+    Args:
+        index (int): Makes the transaction_id unique.
+        approved (bool): Whether the transaction should pass the initial rules.
+
+    Returns:
+        dict: The transaction data.
+    """
+    return {
+        "transaction_id": f"bench-{index}-{random.getrandbits(32)}",
+        "transaction_amount": float(random.randint(100, 2_000_000)),
+        "merchant_id": str(random.randint(100, 999)),
+        "client_id": str(random.randint(100, 999)),
+        "phone_number": str(random.randint(1_000_000_000, 9_999_999_999)),
+        "ip_address": f"10.0.{random.randint(0, 255)}.{random.randint(0, 255)}",
+        "email_address": "test@example.ci" if approved else "test@example.com",
+        "amount": float(
+            random.randint(501, 1_250_000)
+            if approved
+            else random.randint(2_000_001, 10_250_000)
+        ),
+    }
+
+
+def summarize(name: str, latencies_ns: List[int], elapsed: float, **extra) -> dict:
+    """
+    Summarize the latencies of a benchmark case.
+
+    Args:
+        name (str): The name of the case, used to match it across runs.
+        latencies_ns (List[int]): The latency of each operation, in nanoseconds.
+        elapsed (float): The wall-clock duration of the case, in seconds.
+        **extra: Additional values to report, e.g. the number of rules.
+
+    Returns:
+        dict: Operations per second and latency percentiles in microseconds.
+    """
+    ordered = sorted(latencies_ns)
+
+    def percentile(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] / 1000
+
+    return {
+        "name": name,
+        "operations": len(ordered),
+        "ops_per_sec": len(ordered) / elapsed if elapsed else 0.0,
+        "mean_us": statistics.fmean(ordered) / 1000,
+        "p50_us": percentile(0.50),
+        "p90_us": percentile(0.90),
+        "p99_us": percentile(0.99),
+        "max_us": ordered[-1] / 1000,
+        **extra,
+    }
+
+
+def time_calls(
+    fn: Callable[[], object], min_time: float, max_calls: int, min_calls: int = 5
+) -> List[int]:
+    """
+    Call a function repeatedly and time each call.
+
+    Args:
+        fn (Callable): The function to time.
+        min_time (float): Seconds to keep calling, unless `max_calls` is reached first.
+        max_calls (int): Maximum number of calls.
+        min_calls (int, optional): Minimum number of calls. Defaults to 5.
+
+    Returns:
+        List[int]: The duration of each call, in nanoseconds.
+    """
+    clock = time.perf_counter_ns
+    latencies = []
+    deadline = clock() + int(min_time * 1e9)
+    while len(latencies) < max_calls and (
+        len(latencies) < min_calls or clock() < deadline
+    ):
+        start = clock()
+        fn()
+        latencies.append(clock() - start)
+    return latencies
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(path: str, suite: str, results: List[dict], **parameters) -> None:
+    """
+    Save benchmark results with the environment they were measured in.
+
+    Args:
+        path (str): The JSON file to write.
+        suite (str): The name of the benchmark suite.
+        results (List[dict]): The summary of each case.
+        **parameters: The parameters of the run.
+    """
+    report: Dict[str, object] = {
+        "suite": suite,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": parameters,
+        "results": results,
+    }
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {path}")
+
+
+def print_results(results: List[dict]) -> None:
+    width = max(len(result["name"]) for result in results)
+    print(
+        f"{'case':<{width}}  {'ops/s':>12}  {'mean us':>10}  {'p50 us':>10}  "
+        f"{'p99 us':>10}"
+    )
+    for result in results:
+        print(
+            f"{result['name']:<{width}}  {result['ops_per_sec']:>12.1f}  "
+            f"{result['mean_us']:>10.1f}  {result['p50_us']:>10.1f}  "
+            f"{result['p99_us']:>10.1f}"
+        )
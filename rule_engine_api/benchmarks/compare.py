@@ -0,0 +1,77 @@
+# benchmarks/compare.py
+
+"""
+Compare two benchmark result files and flag regressions.
+
+Usage:
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+"""
+
+import argparse
+import json
+import sys
+from typing import List, Tuple
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> List[Tuple]:
+    """
+    Compute the throughput and latency change of each case present in both runs.
+
+    Args:
+        baseline (dict): The reference results.
+        candidate (dict): The results to compare with the reference.
+        threshold (float): Percentage of throughput loss or p99 latency increase
+            considered a regression.
+
+    Returns:
+        List[Tuple]: (name, throughput change %, p50 change %, p99 change %, regressed)
+        for each case.
+    """
+    reference = {result["name"]: result for result in baseline["results"]}
+    rows = []
+    for result in candidate["results"]:
+        base = reference.get(result["name"])
+        if base is None:
+            continue
+        throughput = _change(base["ops_per_sec"], result["ops_per_sec"])
+        p50 = _change(base["p50_us"], result["p50_us"])
+        p99 = _change(base["p99_us"], result["p99_us"])
+        regressed = throughput < -threshold or p99 > threshold
+        rows.append((result["name"], throughput, p50, p99, regressed))
+    return rows
+
+
+def _change(before: float, after: float) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark runs.")
+    parser.add_argument("baseline", type=str, help="The reference results file.")
+    parser.add_argument("candidate", type=str, help="The results file to compare.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="Percentage of throughput loss or p99 increase flagged as a regression.",
+    )
+    args = parser.parse_args()
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    with open(args.candidate) as file:
+        candidate = json.load(file)
+
+    print(f"baseline:  {baseline.get('commit')} ({baseline.get('created_at')})")
+    print(f"candidate: {candidate.get('commit')} ({candidate.get('created_at')})")
+    rows = compare(baseline, candidate, args.threshold)
+    width = max([len(row[0]) for row in rows] + [4])
+    print(f"{'case':<{width}}  {'ops/s':>9}  {'p50':>9}  {'p99':>9}")
+    for name, throughput, p50, p99, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(
+            f"{name:<{width}}  {throughput:>+8.1f}%  {p50:>+8.1f}%  {p99:>+8.1f}%{flag}"
+        )
+
+    # A non-zero exit status lets CI block the change
+    sys.exit(1 if any(row[4] for row in rows) else 0)
@@ -1,34 +1,37 @@
-import requests
-import time
-import random
+"""
+Load generator for the Rule Engine API.
+
+In open-loop mode (the default), requests are sent at a fixed arrival rate whatever
+the response times, following a schedule of stages such as "100:30,100-800:120" (100
+requests/s for 30 seconds, then a linear ramp from 100 to 800 requests/s over 120
+seconds). Latency is measured from the time each request was scheduled, so time spent
+waiting behind a saturated server or client is counted (coordinated omission
+correction); the uncorrected service time is reported as well.
+
+In closed-loop mode (--concurrency), each client waits for its response before sending
+the next request; with --expected-interval-ms, latencies longer than the interval are
+corrected by recording the requests that the client could not send meanwhile.
+
+Usage:
+    python scripts/api_load.py --schedule 200:30,200-1000:120 --output load.json
+    python scripts/api_load.py --concurrency 32 --duration 60
+"""
+
 import argparse
-from concurrent.futures import ThreadPoolExecutor
-from tqdm import tqdm
-
-# Define the rules
-rules = [
-    {
-        "description": "Amount less than 1,500,000",
-        "rule": "transaction['amount'] < 1500000",
-        "id": 1,
-    },
-    {
-        "description": "Email address ends with .ci",
-        "rule": "transaction['email_address'].endswith('.ci')",
-        "id": 2,
-    },
-    {
-        "description": "Minimum amount of transaction greater than 500",
-        "rule": "transaction['amount'] > 500",
-        "id": 3,
-    },
-]
+import asyncio
+import json
+import math
+import random
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import httpx
 
 
 # Function to generate a transaction payload
 def generate_transaction(approved=False):
     transaction_data = {
-        "transaction_id": str(random.randint(1000, 9999)),
+        "transaction_id": f"{random.getrandbits(64):x}",
         "transaction_amount": str(random.randint(100, 2000000)),  # Varying amounts
         "merchant_id": str(random.randint(100, 999)),
         "client_id": str(random.randint(100, 999)),
@@ -46,84 +49,410 @@ def generate_transaction(approved=False):
     return transaction_data
 
 
-# Function to apply rules to a transaction
-def apply_rules(transaction, rules):
-    return all(eval(rule["rule"], {"transaction": transaction}) for rule in rules)
+# Scenarios of the payload mix: name -> (path, payload generator)
+SCENARIOS: Dict[str, Tuple[str, Callable[[], dict]]] = {
+    "check_approved": (
+        "/v0/transactions/check-transaction",
+        lambda: generate_transaction(approved=True),
+    ),
+    "check_rejected": (
+        "/v0/transactions/check-transaction",
+        lambda: generate_transaction(approved=False),
+    ),
+    "check_invalid": (
+        "/v0/transactions/check-transaction",
+        lambda: {"transaction_id": "invalid"},
+    ),
+    "save": (
+        "/v0/transactions/save-transaction",
+        lambda: generate_transaction(approved=True),
+    ),
+}
+
+# Percentiles reported for each histogram
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    """
+    Latency distribution in logarithmic buckets, about 1% wide.
+
+    Memory does not grow with the number of requests, and percentiles are accurate to
+    the bucket width.
+    """
+
+    # Ratio between the bounds of consecutive buckets
+    GROWTH = 1.01
+
+    def __init__(self):
+        self.counts: Counter = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def record(self, value_ms: float) -> None:
+        value_ms = max(value_ms, 1e-3)
+        self.counts[math.ceil(math.log(value_ms, self.GROWTH))] += 1
+        self.count += 1
+        self.total += value_ms
+        self.min = min(self.min, value_ms)
+        self.max = max(self.max, value_ms)
+
+    def record_corrected(self, value_ms: float, expected_interval_ms: float) -> None:
+        """
+        Record a latency, plus the requests a closed-loop client could not send while
+        waiting for it.
+        """
+        self.record(value_ms)
+        if expected_interval_ms <= 0:
+            return
+        missed = value_ms - expected_interval_ms
+        while missed >= expected_interval_ms:
+            self.record(missed)
+            missed -= expected_interval_ms
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        self.counts.update(other.counts)
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percentile: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = math.ceil(percentile / 100 * self.count)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self.GROWTH**bucket, self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count if self.count else 0.0,
+            "min_ms": self.min if self.count else 0.0,
+            "max_ms": self.max,
+            **{f"p{p:g}_ms": self.percentile(p) for p in PERCENTILES},
+        }
+
+
+class Stats:
+    """
+    Results of one stage of the load test.
+    """
+
+    def __init__(
+        self, name: str, target_rate: Optional[str], expected_interval_ms: float = 0.0
+    ):
+        self.name = name
+        self.target_rate = target_rate
+        self.expected_interval_ms = expected_interval_ms
+        self.latency = LatencyHistogram()
+        self.service_time = LatencyHistogram()
+        self.by_scenario: Dict[str, LatencyHistogram] = {}
+        self.statuses: Counter = Counter()
+        self.sent = 0
+        self.dropped = 0
+        self.started = time.monotonic()
+        self.finished = self.started
+
+    def record(
+        self, scenario: str, status: str, latency_ms: float, service_ms: float
+    ) -> None:
+        self.latency.record_corrected(latency_ms, self.expected_interval_ms)
+        self.service_time.record(service_ms)
+        self.by_scenario.setdefault(scenario, LatencyHistogram()).record(latency_ms)
+        self.statuses[status] += 1
+        self.finished = time.monotonic()
+
+    def summary(self) -> dict:
+        elapsed = max(self.finished - self.started, 1e-9)
+        return {
+            "stage": self.name,
+            "target_rate": self.target_rate,
+            "sent": self.sent,
+            "completed": self.service_time.count,
+            "dropped": self.dropped,
+            "achieved_rate": self.service_time.count / elapsed,
+            "statuses": dict(self.statuses),
+            "latency": self.latency.summary(),
+            "service_time": self.service_time.summary(),
+            "scenarios": {
+                name: histogram.summary()
+                for name, histogram in sorted(self.by_scenario.items())
+            },
+        }
+
+
+def parse_schedule(schedule: str) -> List[Tuple[float, float, float]]:
+    """
+    Parse stages such as "100:30,100-800:120" into (start rate, end rate, seconds).
+    """
+    stages = []
+    for stage in schedule.split(","):
+        rates, duration = stage.split(":")
+        start, _, end = rates.partition("-")
+        stages.append((float(start), float(end or start), float(duration)))
+    return stages
+
+
+def parse_mix(mix: str) -> Tuple[List[str], List[float]]:
+    """
+    Parse a payload mix such as "check_approved=5,check_rejected=4,save=1".
+    """
+    names, weights = [], []
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(
+                f"Unknown scenario '{name}', expected one of {', '.join(SCENARIOS)}"
+            )
+        names.append(name)
+        weights.append(float(weight or 1))
+    return names, weights
+
+
+def arrivals(
+    start_rate: float, end_rate: float, duration: float, poisson: bool
+) -> Iterator[float]:
+    """
+    Yield the send times of a stage, in seconds from its start.
+    """
+    t = 0.0
+    while True:
+        rate = start_rate + (end_rate - start_rate) * t / duration
+        if rate <= 0:
+            # Nothing to send until the ramp reaches a positive rate
+            t += 0.01
+        else:
+            t += random.expovariate(rate) if poisson else 1 / rate
+        if t >= duration:
+            return
+        yield t
+
 
+async def send(
+    client: httpx.AsyncClient,
+    stats: Stats,
+    scenario: str,
+    scheduled: float,
+    timeout: float,
+) -> None:
+    path, make_payload = SCENARIOS[scenario]
+    payload = make_payload()
+    sent = time.monotonic()
+    try:
+        response = await client.post(path, json=payload, timeout=timeout)
+        status = str(response.status_code)
+    except httpx.TimeoutException:
+        status = "timeout"
+    except httpx.HTTPError as e:
+        status = e.__class__.__name__
+    done = time.monotonic()
+    stats.record(scenario, status, (done - scheduled) * 1000, (done - sent) * 1000)
 
-# Function to send a request
-def send_request(url, data):
-    start_time = time.time()
-    response = requests.post(url, json=data)
-    end_time = time.time()
-    return response.json()["status_code"], end_time - start_time
 
+async def run_open_loop(
+    client: httpx.AsyncClient,
+    stages: List[Tuple[float, float, float]],
+    scenarios: Tuple[List[str], List[float]],
+    max_in_flight: int,
+    poisson: bool,
+    timeout: float,
+) -> List[Stats]:
+    """
+    Send requests at the scheduled arrival times, without waiting for responses.
 
-# Function to send multiple requests in parallel
-def send_requests_parallel(endpoint, payloads):
+    Requests that would exceed `max_in_flight` outstanding requests are not sent and
+    are counted as dropped, a sign that the target is saturated.
+    """
     results = []
-    times = []
-    with ThreadPoolExecutor() as executor, tqdm(total=len(payloads)) as pbar:
-        for result, time_taken in executor.map(
-            send_request, [endpoint] * len(payloads), payloads
-        ):
-            results.append(result)
-            times.append(time_taken)
-            pbar.update(1)
-    return results, times
-
-
-def main(endpoint, num_requests=100):
-
-    # Generate payloads
-    approved_payloads = [
-        generate_transaction(approved=True) for _ in range(num_requests // 2)
-    ]
-    rejected_payloads = [
-        generate_transaction(approved=False) for _ in range(num_requests // 2)
-    ]
-    payloads = approved_payloads + rejected_payloads
-
-    # Send requests in parallel
-    results, times = send_requests_parallel(endpoint, payloads)
-
-    # Calculate and print execution time
-    execution_time = sum(times)
+    in_flight = set()
+    for start_rate, end_rate, duration in stages:
+        label = (
+            f"{start_rate:g}"
+            if start_rate == end_rate
+            else f"{start_rate:g}-{end_rate:g}"
+        )
+        stats = Stats(f"{label}/s for {duration:g}s", label)
+        results.append(stats)
+        stage_start = time.monotonic()
+        for offset in arrivals(start_rate, end_rate, duration, poisson):
+            scheduled = stage_start + offset
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if len(in_flight) >= max_in_flight:
+                stats.dropped += 1
+                continue
+            scenario = random.choices(*scenarios)[0]
+            task = asyncio.create_task(
+                send(client, stats, scenario, scheduled, timeout)
+            )
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+            stats.sent += 1
+        # Keep the schedule of the next stage even if this one is late
+        remaining = stage_start + duration - time.monotonic()
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+    if in_flight:
+        await asyncio.wait(in_flight)
+    return results
+
+
+async def run_closed_loop(
+    client: httpx.AsyncClient,
+    concurrency: int,
+    duration: float,
+    scenarios: Tuple[List[str], List[float]],
+    expected_interval_ms: float,
+    timeout: float,
+) -> List[Stats]:
+    """
+    Run clients that each send a request as soon as their previous one completes.
+    """
+    stats = Stats(
+        f"{concurrency} clients for {duration:g}s", None, expected_interval_ms
+    )
+    deadline = time.monotonic() + duration
+
+    async def client_loop():
+        while time.monotonic() < deadline:
+            scenario = random.choices(*scenarios)[0]
+            stats.sent += 1
+            await send(client, stats, scenario, time.monotonic(), timeout)
+
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return [stats]
+
+
+def print_report(results: List[Stats]) -> None:
     print(
-        f"Total time taken to send {num_requests} requests: {execution_time:.2f} seconds"
+        f"{'stage':<28} {'sent':>8} {'done':>8} {'drop':>6} {'rate/s':>9} "
+        f"{'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'p99.9 ms':>9}  statuses"
     )
+    for stats in results:
+        summary = stats.summary()
+        latency = summary["latency"]
+        statuses = ", ".join(
+            f"{k}: {v}" for k, v in sorted(summary["statuses"].items())
+        )
+        print(
+            f"{stats.name:<28} {summary['sent']:>8} {summary['completed']:>8} "
+            f"{summary['dropped']:>6} {summary['achieved_rate']:>9.1f} "
+            f"{latency['p50_ms']:>9.2f} {latency['p90_ms']:>9.2f} "
+            f"{latency['p99_ms']:>9.2f} {latency['p99.9_ms']:>9.2f}  {statuses}"
+        )
 
-    # Count successful and failed requests
-    success_count = results.count(200)
-    failure_count = len(results) - success_count
-    print(f"Successful requests: {success_count}, Failed requests: {failure_count}")
 
-    # Calculate and print average, min, and max request times
-    if times:
-        min_time = min(times)
-        max_time = max(times)
-        avg_time = sum(times) / len(times)
-        print(f"Min request time: {min_time:.2f} seconds")
-        print(f"Max request time: {max_time:.2f} seconds")
-        print(f"Average request time: {avg_time:.2f} seconds")
+async def main(args):
+    scenarios = parse_mix(args.mix)
+    limits = httpx.Limits(
+        max_connections=args.connections, max_keepalive_connections=args.connections
+    )
+    # A single client reuses its keep-alive connections across requests
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits) as client:
+        if args.concurrency:
+            results = await run_closed_loop(
+                client,
+                args.concurrency,
+                args.duration,
+                scenarios,
+                args.expected_interval_ms,
+                args.timeout,
+            )
+        else:
+            results = await run_open_loop(
+                client,
+                parse_schedule(args.schedule),
+                scenarios,
+                args.max_in_flight,
+                args.poisson,
+                args.timeout,
+            )
+
+    print_report(results)
+    if args.output:
+        overall = LatencyHistogram()
+        for stats in results:
+            overall.merge(stats.latency)
+        report = {
+            "mode": "closed" if args.concurrency else "open",
+            "parameters": vars(args),
+            "overall": overall.summary(),
+            "stages": [stats.summary() for stats in results],
+        }
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Results written to {args.output}")
 
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(
-        description="Send multiple requests to an endpoint."
+    parser = argparse.ArgumentParser(description="Send load to the Rule Engine API.")
+    parser.add_argument(
+        "--base-url",
+        type=str,
+        default="http://localhost:8000",
+        help="The URL of the API.",
+    )
+    parser.add_argument(
+        "--schedule",
+        type=str,
+        default="50:30",
+        help="Open-loop stages 'rate:seconds' or 'start-end:seconds', comma-separated.",
+    )
+    parser.add_argument(
+        "--poisson",
+        action="store_true",
+        help="Use exponentially distributed gaps between arrivals.",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=10_000,
+        help="Outstanding requests beyond which open-loop arrivals are dropped.",
     )
     parser.add_argument(
-        "--endpoint",
+        "--concurrency",
+        type=int,
+        default=0,
+        help="Run in closed-loop mode with this many clients instead.",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=30.0,
+        help="Seconds of the closed-loop run.",
+    )
+    parser.add_argument(
+        "--expected-interval-ms",
+        type=float,
+        default=0.0,
+        help="Intended time between requests of a closed-loop client, for correction.",
+    )
+    parser.add_argument(
+        "--mix",
         type=str,
-        default="http://localhost:8000/v0/transactions/check-transaction",
-        help="The endpoint to send requests to.",
+        default="check_approved=1,check_rejected=1",
+        help=f"Weighted scenarios among {', '.join(SCENARIOS)}.",
     )
     parser.add_argument(
-        "--num_requests",
+        "--connections",
         type=int,
         default=100,
-        help="The number of requests to send.",
+        help="Maximum number of connections to the API.",
+    )
+    parser.add_argument(
+        "--timeout", type=float, default=10.0, help="Request timeout in seconds."
+    )
+    parser.add_argument(
+        "--output", type=str, default=None, help="The JSON file to write results to."
     )
     args = parser.parse_args()
 
-    main(args.endpoint, args.num_requests)
+    asyncio.run(main(args))
@@ -0,0 +1,122 @@
+"""
+Replay stored transactions against a rule set and report its approval rate and the
+failures of each rule.
+
+Transactions are streamed from the database in chunks and evaluated by a pool of
+worker processes, so memory use stays flat whatever the number of transactions.
+Without --rules, the stored rules are replayed; with it, the proposed rules of a JSON
+file shaped like app/initial_data/initial_rules.json.
+
+Usage:
+    python -m scripts.backtest --rules proposed_rules.json --output backtest.json
+    python -m scripts.backtest --start-id 1000000 --workers 8
+"""
+
+import argparse
+import json
+import sys
+import time
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.config import settings
+from app.db import crud
+from app.schemas.rule import RuleCreate
+from app.services.backtest import rule_definitions, run_backtest
+
+
+def print_progress(started: float):
+    def progress(processed: int, total: int) -> None:
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed else 0.0
+        share = 100 * processed / total if total else 100.0
+        print(
+            f"\r{processed}/{total} transactions ({share:.1f}%), {rate:,.0f}/s",
+            end="",
+            file=sys.stderr,
+            flush=True,
+        )
+
+    return progress
+
+
+def main(args):
+    engine = create_engine(
+        args.database_url or settings.database_replica_url or settings.database_url
+    )
+    session_factory = sessionmaker(bind=engine)
+    if args.rules:
+        with open(args.rules) as file:
+            rules = [RuleCreate(**rule) for rule in json.load(file)]
+    else:
+        with session_factory() as db:
+            rules = crud.get_rules_(db)
+    rules = rule_definitions(rules)
+
+    started = time.perf_counter()
+    stats = run_backtest(
+        session_factory,
+        rules,
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        start_id=args.start_id,
+        end_id=args.end_id,
+        progress=print_progress(started),
+    )
+    elapsed = time.perf_counter() - started
+    print(file=sys.stderr)
+
+    report = stats.report(rules)
+    print(
+        f"{report['transactions']} transactions in {elapsed:.1f}s: "
+        f"{report['approved']} approved, {report['rejected']} rejected "
+        f"({report['approval_rate']:.2%} approved)"
+    )
+    print(f"{'Rule':>6} {'Failures':>10} {'Rate':>8} {'Errors':>8}  Description")
+    for rule in report["rules"]:
+        print(
+            f"{rule['rule_id']:>6} {rule['failures']:>10} "
+            f"{rule['failure_rate']:>8.2%} {rule['errors']:>8}  {rule['description']}"
+        )
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({**report, "seconds": elapsed}, file, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Backtest rules on stored transactions."
+    )
+    parser.add_argument(
+        "--rules",
+        type=str,
+        default=None,
+        help="JSON file of proposed rules; defaults to the stored rules.",
+    )
+    parser.add_argument(
+        "--database-url",
+        type=str,
+        default=None,
+        help="The database to read; defaults to the replica, or the primary database.",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, default=10_000, help="Transactions per chunk."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Worker processes, 0 to evaluate in this process; defaults to the CPUs.",
+    )
+    parser.add_argument(
+        "--start-id", type=int, default=None, help="The first transaction ID replayed."
+    )
+    parser.add_argument(
+        "--end-id", type=int, default=None, help="The last transaction ID replayed."
+    )
+    parser.add_argument(
+        "--output", type=str, default=None, help="The JSON file to write the report to."
+    )
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import pytest
+
+# The settings are read when `app` is imported: point it at a throwaway SQLite database
+os.environ["DATABASE_URL"] = (
+    f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='rule-engine-tests-'), 'test.db')}"
+)
+for name in ("POSTGRES_DB", "POSTGRES_USER", "POSTGRES_PASSWORD"):
+    os.environ.setdefault(name, "test")
+
+
+@pytest.fixture(scope="module")
+def application():
+    """
+    The application served by `client`.
+    """
+    from app.main import app
+
+    return app
+
+
+def clear_database() -> None:
+    """
+    Delete everything but the rule set generation, which is bumped instead, so that
+    no snapshot or cached decision of an earlier test is taken for the current one.
+    """
+    from sqlalchemy.orm import Session
+    from app.db import crud
+    from app.db.models import Base, RuleSetGeneration
+    from app.db.session import engine
+
+    with Session(engine) as db, db.begin():
+        Base.metadata.create_all(db.connection())
+        for table in reversed(Base.metadata.sorted_tables):
+            if table is not RuleSetGeneration.__table__:
+                db.execute(table.delete())
+        crud.ensure_rule_set_generation(db)
+        crud.bump_rule_set_generation(db)
+
+
+@pytest.fixture(scope="module")
+def client(application):
+    """
+    A client of the application, bootstrapped and warmed up by its lifespan on an
+    empty database.
+    """
+    from fastapi.testclient import TestClient
+    from app.services import rule_set
+
+    clear_database()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        # Not the snapshot some other test installed, of a newer generation
+        monkeypatch.setattr(rule_set, "_current", None)
+        with TestClient(application) as client:
+            yield client
@@ -0,0 +1,123 @@
+import asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from app.db import async_crud
+from app.db.models import Base
+from app.schemas.rule import RuleCreate, RuleUpdate
+from app.schemas.transaction import TransactionCreate
+
+transaction = TransactionCreate(
+    transaction_id="1",
+    transaction_amount=100,
+    merchant_id="456",
+    client_id="789",
+    phone_number="1234567890",
+    ip_address="127.0.0.1",
+    email_address="test@example.ci",
+    amount=1000,
+)
+
+
+def run_with_session(tmp_path, test):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'crud.db'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        try:
+            async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+                return await test(db)
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+def test_async_crud_saves_transactions(tmp_path):
+    """
+    Test that transactions saved through the async session are returned with their ID.
+    """
+
+    async def test(db):
+        first = await async_crud.create_transaction(db, transaction)
+        second = await async_crud.create_transaction(
+            db, transaction.model_copy(update={"transaction_id": "2"})
+        )
+        return first, second
+
+    first, second = run_with_session(tmp_path, test)
+    assert (first.id, second.id) == (1, 2)
+    assert first.email_address == "test@example.ci"
+    assert second.transaction_id == "2"
+
+
+def test_async_crud_creates_reads_updates_and_deletes_rules(tmp_path):
+    """
+    Test the async rule CRUD: creation, paging by offset and by ID, partial updates,
+    deletion, and the None answered for unknown rules.
+    """
+
+    async def test(db):
+        created = await async_crud.create_rule(
+            db, RuleCreate(description="Limit", rule="transaction['amount'] < 100")
+        )
+        many = await async_crud.create_multiple_rules(
+            db,
+            [
+                RuleCreate(description=f"Rule {i}", rule=f"transaction['amount'] > {i}")
+                for i in range(3)
+            ],
+        )
+        page = [rule.id for rule in await async_crud.get_rules(db, skip=1, limit=2)]
+        after = [rule.id for rule in await async_crud.get_rules(db, after=2)]
+        updated = await async_crud.update_rule(
+            db, created.id, RuleUpdate(description="New limit")
+        )
+        deleted = await async_crud.delete_rule(db, many[0].id)
+        missing = (
+            await async_crud.get_rule(db, many[0].id),
+            await async_crud.update_rule(db, 99, RuleUpdate(description="None")),
+            await async_crud.delete_rule(db, 99),
+        )
+        remaining = [rule.id for rule in await async_crud.get_rules_(db)]
+        return created, many, page, after, updated, deleted, missing, remaining
+
+    created, many, page, after, updated, deleted, missing, remaining = run_with_session(
+        tmp_path, test
+    )
+    assert created.id == 1 and [rule.id for rule in many] == [2, 3, 4]
+    assert page == [2, 3] and after == [3, 4]
+    assert (updated.description, updated.rule) == (
+        "New limit",
+        "transaction['amount'] < 100",
+    )
+    assert deleted.id == 2
+    assert missing == (None, None, None)
+    assert remaining == [1, 3, 4]
+
+
+def test_concurrent_upserts_count_each_transaction_inserted_once(tmp_path):
+    """
+    Test that two ingests upserting the same new transactions at once count each of
+    them inserted by one and updated by the other.
+    """
+    records = [
+        transaction.model_copy(update={"transaction_id": str(i)}).model_dump()
+        for i in range(50)
+    ]
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'crud.db'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+        async def ingest(records):
+            async with sessions() as db:
+                return await async_crud.ingest_transactions(db, records, "upsert")
+
+        try:
+            return await asyncio.gather(ingest(records), ingest(records[::-1]))
+        finally:
+            await engine.dispose()
+
+    counts = asyncio.run(run())
+    assert sorted(counts) == [(0, 50, 0), (50, 0, 0)]
@@ -0,0 +1,143 @@
+import asyncio
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from app.db.models import Base, NamedList, NamedListEntry, Transaction
+from app.schemas.rule import RuleCreate
+from app.services.backtest import (
+    BacktestError,
+    BacktestJobs,
+    BacktestQueueFullError,
+    BacktestStats,
+    ChunkEvaluator,
+    rule_definitions,
+    run_backtest,
+)
+
+rules = rule_definitions(
+    [
+        RuleCreate(
+            description="Amount below limit", rule="transaction['amount'] < 900"
+        ),
+        RuleCreate(
+            description="Merchant 1 limit",
+            rule="transaction['amount'] < 100",
+            scope="merchant_id:1",
+        ),
+        RuleCreate(
+            description="Not blocked",
+            rule="not in_list('blocked', transaction['client_id'])",
+        ),
+    ]
+)
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'backtest.db'}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(Transaction),
+            [
+                {
+                    "transaction_id": str(i),
+                    "transaction_amount": 1.0,
+                    "merchant_id": str(i % 4),
+                    "client_id": str(i % 10),
+                    "phone_number": "1234567890",
+                    "ip_address": "127.0.0.1",
+                    "email_address": "test@example.ci",
+                    "amount": float(i),
+                }
+                for i in range(1000)
+            ],
+        )
+        connection.execute(insert(NamedList), [{"name": "blocked", "kind": "exact"}])
+        connection.execute(insert(NamedListEntry), [{"list_id": 1, "value": "7"}])
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def test_backtest_aggregates_failures_per_rule(session_factory):
+    """
+    Test that a backtest counts the approvals and the failures of each rule, scoped
+    rules and list lookups included, with the same results inline and in processes.
+    """
+    progress = []
+    stats = run_backtest(
+        session_factory,
+        rules,
+        chunk_size=64,
+        workers=0,
+        progress=lambda processed, total: progress.append((processed, total)),
+    )
+    assert stats.transactions == 1000
+    assert stats.last_id == 1000
+    assert stats.failures == {1: 100, 2: 225, 3: 100}
+    # Amounts from 900 fail rule 1, merchant 1 fails rule 2 from 100, client 7 rule 3
+    rejected = {
+        i for i in range(1000) if i >= 900 or (i % 4 == 1 and i >= 100) or i % 10 == 7
+    }
+    assert stats.approved == 1000 - len(rejected)
+    assert progress[:2] == [(0, 1000), (64, 1000)] and progress[-1] == (1000, 1000)
+
+    pooled = run_backtest(session_factory, rules, chunk_size=64, workers=1)
+    assert pooled.report(rules) == stats.report(rules)
+
+    partial = run_backtest(session_factory, rules, workers=0, start_id=901)
+    assert partial.transactions == 100
+
+
+def test_backtest_stats_merge_partial_aggregates():
+    """
+    Test that partial aggregates of chunks merge into the aggregates of the whole.
+    """
+    evaluate = ChunkEvaluator(rules, {"blocked": ("exact", ["7"])})
+    rows = [
+        (i + 1, str(i), 1.0, "1", str(i % 10), "1", "127.0.0.1", "a@b.ci", float(i))
+        for i in range(200)
+    ]
+    whole = evaluate(rows)
+    merged = BacktestStats()
+    for start in range(0, 200, 30):
+        merged.merge(evaluate(rows[start : start + 30]))
+    assert merged.report(rules) == whole.report(rules)
+    assert whole.report(rules)["rules"][1]["failures"] == 100
+
+
+def test_backtest_rejects_velocity_rules(session_factory):
+    """
+    Test that rules using velocity functions cannot be backtested, since stored
+    transactions have no timestamp.
+    """
+    velocity = rule_definitions(
+        [RuleCreate(description="Velocity", rule="count(client_id, '10m') <= 5")]
+    )
+    with pytest.raises(BacktestError):
+        run_backtest(session_factory, velocity, workers=0)
+
+
+def test_backtest_jobs_refuse_jobs_beyond_max_jobs(session_factory):
+    """
+    Test that no more than `max_jobs` backtests are pending or running at once.
+    """
+
+    async def run():
+        jobs = BacktestJobs(session_factory, max_jobs=2, workers=0)
+        first, second = jobs.submit(rules), jobs.submit(rules)
+        with pytest.raises(BacktestQueueFullError):
+            jobs.submit(rules)
+        jobs.cancel(second.id)
+        await asyncio.gather(*jobs._tasks)
+        # Finished jobs no longer count
+        third = jobs.submit(rules)
+        await asyncio.gather(*jobs._tasks)
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert (first.status, second.status, third.status) == (
+        "succeeded",
+        "cancelled",
+        "succeeded",
+    )
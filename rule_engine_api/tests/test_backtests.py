@@ -0,0 +1,73 @@
+import time
+from app.api.v0.endpoints.backtests import backtest_jobs
+
+transaction = {
+    "transaction_amount": 100,
+    "merchant_id": "456",
+    "client_id": "789",
+    "phone_number": "1234567890",
+    "ip_address": "127.0.0.1",
+    "email_address": "test@example.ci",
+}
+
+
+def wait_for(client, job_id: str) -> dict:
+    for _ in range(200):
+        job = client.get(f"/v0/backtests/{job_id}").json()
+        if job["status"] not in ("pending", "running"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Backtest {job_id} did not finish")
+
+
+def test_backtests_replay_the_stored_transactions(client, monkeypatch):
+    """
+    Test that a backtest of proposed rules reports their approval and failure rates
+    over the stored transactions, and can be read back by its ID.
+    """
+    # On a thread, rather than in worker processes
+    monkeypatch.setattr(backtest_jobs, "workers", 0)
+    for i, amount in enumerate([10, 500, 5000, 50_000]):
+        saved = client.post(
+            "/v0/transactions/save-transaction",
+            json={**transaction, "transaction_id": f"backtest-{i}", "amount": amount},
+        )
+        assert saved.status_code == 200
+
+    submitted = client.post(
+        "/v0/backtests/",
+        json={
+            "rules": [
+                {"description": "Below 1000", "rule": "transaction['amount'] < 1000"},
+                {"description": "Above 100", "rule": "transaction['amount'] > 100"},
+            ]
+        },
+    )
+    assert submitted.status_code == 202
+    job = wait_for(client, submitted.json()["id"])
+
+    assert job["status"] == "succeeded"
+    report = job["report"]
+    assert (report["transactions"], report["approved"], report["rejected"]) == (
+        4,
+        1,
+        3,
+    )
+    assert [(rule["description"], rule["failures"]) for rule in report["rules"]] == [
+        ("Below 1000", 2),
+        ("Above 100", 1),
+    ]
+    assert job["id"] in [job["id"] for job in client.get("/v0/backtests/").json()]
+
+
+def test_backtests_of_rules_that_cannot_be_replayed_are_rejected(client):
+    """
+    Test that invalid rules and velocity rules are answered 422, and unknown jobs 404.
+    """
+    for rule in ["transaction['amount'] <", "count(client_id, '1h') < 3"]:
+        response = client.post(
+            "/v0/backtests/", json={"rules": [{"description": "Bad", "rule": rule}]}
+        )
+        assert response.status_code == 422
+    assert client.get("/v0/backtests/unknown").status_code == 404
+    assert client.delete("/v0/backtests/unknown").status_code == 404
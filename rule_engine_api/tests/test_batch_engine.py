@@ -0,0 +1,82 @@
+import random
+from app.services.batch_engine import (
+    apply_rule_set_batch,
+    apply_rules_batch,
+    build_batch_plan,
+)
+from app.services.rule_compiler import compile_rule
+from app.services.rule_engine import apply_rule_set, apply_rules
+from app.services.rule_set import assemble_rule_set
+
+rule_sources = [
+    "transaction['amount'] < 1500000",
+    "transaction['email_address'].lower().endswith('.ci')",
+    "500 < transaction['amount'] <= 1000000",
+    "transaction['merchant_id'] in ['1', '2', '3'] or transaction['amount'] * 2 > 100",
+    "not transaction['ip_address'].startswith('10.')",
+    "transaction['amount'] / (transaction['transaction_amount'] - 100) < 10",
+    "len(transaction['phone_number']) == 10",
+]
+
+
+def generate_transaction(index):
+    return {
+        "transaction_id": str(index),
+        "transaction_amount": float(random.choice([100, 200, 300])),
+        "merchant_id": str(random.randint(1, 5)),
+        "client_id": str(random.randint(1, 5)),
+        "phone_number": str(random.randint(10**8, 10**10)),
+        "ip_address": random.choice(["10.0.0.1", "127.0.0.1"]),
+        "email_address": random.choice(["a@b.CI", "a@b.com", " a@b.ci "]),
+        "amount": float(random.randint(0, 3000000)),
+    }
+
+
+def test_apply_rules_batch_matches_apply_rules():
+    """
+    Test that batch evaluation gives the same result as checking transactions one by one.
+    """
+    random.seed(0)
+    rules = [
+        compile_rule(index, f"Rule {index}", source)
+        for index, source in enumerate(rule_sources)
+    ]
+    transactions = [generate_transaction(index) for index in range(500)]
+    plan = build_batch_plan(rules)
+
+    assert plan.vectorized[0] is not None
+    assert plan.vectorized[1] is not None
+    assert plan.vectorized[5] is None
+    assert apply_rules_batch(transactions, plan) == [
+        apply_rules(transaction, rules) for transaction in transactions
+    ]
+
+
+def test_case_mappings_that_lengthen_strings_match_apply_rule_set():
+    """
+    Test that batch evaluation does not truncate strings whose case mapping is longer,
+    as NumPy case mappings do.
+    """
+    rule_set = assemble_rule_set(
+        [
+            compile_rule(
+                1, "CI", "transaction['email_address'].lower().endswith('.ci')"
+            ),
+            compile_rule(2, "Upper", "transaction['client_id'].upper().endswith('SS')"),
+            compile_rule(3, "Ligature", "transaction['merchant_id'].upper() == 'FI'"),
+        ],
+        # Batch plans are cached per version, which other tests use
+        version=-1,
+    )
+    base = generate_transaction(0)
+    transactions = [
+        {**base, "email_address": email, "client_id": client, "merchant_id": merchant}
+        for email, client, merchant in [
+            ("İSTANBUL@X.CI", "straße", "\ufb01"),
+            ("a@b.ci", "ss", "fi"),
+            ("İ@X.COM", "strasse", "f"),
+        ]
+    ]
+    assert apply_rule_set_batch(transactions, rule_set) == [
+        apply_rule_set(transaction, rule_set) for transaction in transactions
+    ]
@@ -0,0 +1,89 @@
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+from app.db.bootstrap import bootstrap_database
+from app.db.crud import get_rule_set_generation
+from app.db.models import Rule
+
+rules = [
+    {"description": "Small amount", "rule": "transaction['amount'] < 1500000"},
+    {"description": "Ivorian email", "rule": "transaction['email_address'] != ''"},
+]
+
+
+def make_engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'bootstrap.db'}")
+
+
+def stored_rules(engine):
+    with Session(engine) as db:
+        return db.execute(select(Rule.description, Rule.rule).order_by(Rule.id)).all()
+
+
+def test_bootstrap_creates_tables_and_inserts_rules(tmp_path):
+    engine = make_engine(tmp_path)
+
+    assert bootstrap_database(engine, rules) == 2
+
+    assert stored_rules(engine) == [
+        (rule["description"], rule["rule"]) for rule in rules
+    ]
+    with Session(engine) as db:
+        assert get_rule_set_generation(db) == 1
+
+
+def test_bootstrap_only_inserts_missing_rules(tmp_path):
+    engine = make_engine(tmp_path)
+    bootstrap_database(engine, rules[:1])
+
+    assert bootstrap_database(engine, rules) == 1
+    assert bootstrap_database(engine, rules) == 0
+
+    assert [row.description for row in stored_rules(engine)] == [
+        "Small amount",
+        "Ivorian email",
+    ]
+    # Only the bootstraps that inserted rules changed the generation
+    with Session(engine) as db:
+        assert get_rule_set_generation(db) == 2
+
+
+def test_bootstrap_keeps_the_first_of_duplicate_descriptions(tmp_path):
+    engine = make_engine(tmp_path)
+    duplicate = {"description": "Small amount", "rule": "transaction['amount'] < 1"}
+
+    assert bootstrap_database(engine, [rules[0], duplicate]) == 1
+
+    assert stored_rules(engine) == [("Small amount", rules[0]["rule"])]
+
+
+def test_bootstrap_without_rules_creates_the_generation(tmp_path):
+    engine = make_engine(tmp_path)
+
+    assert bootstrap_database(engine, []) == 0
+
+    with Session(engine) as db:
+        assert get_rule_set_generation(db) == 0
+
+
+def test_bootstrap_adds_rule_columns_to_older_databases(tmp_path):
+    engine = make_engine(tmp_path)
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE rules (id INTEGER PRIMARY KEY, "
+                "description VARCHAR, rule VARCHAR)"
+            )
+        )
+        connection.execute(
+            text("INSERT INTO rules (description, rule) VALUES ('Old', 'True')")
+        )
+
+    assert bootstrap_database(engine, rules) == 2
+    assert bootstrap_database(engine, rules) == 0
+
+    with Session(engine) as db:
+        assert db.execute(select(Rule.description, Rule.scope, Rule.status)).all() == [
+            ("Old", None, "active"),
+            ("Small amount", None, "active"),
+            ("Ivorian email", None, "active"),
+        ]
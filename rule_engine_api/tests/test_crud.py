@@ -0,0 +1,52 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from app.db.bootstrap import bootstrap_database
+from app.db.crud import create_rule, get_rules, update_rule
+from app.schemas.rule import RuleCreate, RuleUpdate
+
+rules = [
+    {"description": f"Rule {i}", "rule": f"transaction['amount'] > {i}"}
+    for i in range(7)
+]
+
+
+def test_get_rules_pages_by_id_after_a_cursor(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'crud.db'}")
+    bootstrap_database(engine, rules)
+
+    with Session(engine) as db:
+        pages, after = [], None
+        while True:
+            page = get_rules(db, limit=3, after=after)
+            if not page:
+                break
+            pages.append([rule.id for rule in page])
+            after = page[-1].id
+
+        assert pages == [[1, 2, 3], [4, 5, 6], [7]]
+        assert [rule.id for rule in get_rules(db, skip=1, limit=2)] == [2, 3]
+
+
+def test_update_rule_only_changes_the_fields_given(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'crud.db'}")
+    bootstrap_database(engine, [])
+
+    with Session(engine) as db:
+        rule = create_rule(
+            db,
+            RuleCreate(
+                description="Merchant limit",
+                rule="transaction['amount'] < 100",
+                scope="merchant_id:1",
+                status="shadow",
+            ),
+        )
+        update_rule(db, rule.id, RuleUpdate(rule="transaction['amount'] < 200"))
+        assert (rule.rule, rule.scope, rule.status) == (
+            "transaction['amount'] < 200",
+            "merchant_id:1",
+            "shadow",
+        )
+
+        update_rule(db, rule.id, RuleUpdate(scope=None))
+        assert (rule.description, rule.scope) == ("Merchant limit", None)
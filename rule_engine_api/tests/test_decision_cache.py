@@ -0,0 +1,95 @@
+from app.services.decision_cache import DecisionCache
+from app.services.named_lists import NamedListRegistry
+from app.services.rule_compiler import compile_rule
+from app.services.rule_set import build_rule_set
+
+rules = (compile_rule(1, "Amount below limit", "transaction['amount'] < 1500000"),)
+
+transaction = {
+    "transaction_id": "123",
+    "phone_number": "1234567890",
+    "amount": 1000.0,
+}
+approved = {"has_succeeded": True, "message": ""}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_decision_cache_ignores_fields_rules_do_not_read():
+    """
+    Test that transactions differing only in unused fields share a cache entry.
+    """
+    cache = DecisionCache()
+    rule_set = build_rule_set(rules, 1)
+
+    cache.put(cache.key(rule_set, transaction, "full"), approved)
+    other = {**transaction, "transaction_id": "456", "phone_number": "0"}
+
+    assert cache.get(cache.key(rule_set, other, "full")) == approved
+    assert cache.get(cache.key(rule_set, other, "fail_fast")) is None
+    assert cache.get(cache.key(rule_set, {**other, "amount": 1.0}, "full")) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_decision_cache_is_invalidated_by_a_new_rule_set():
+    """
+    Test that entries of a previous rule set version are dropped.
+    """
+    cache = DecisionCache()
+    cache.put(cache.key(build_rule_set(rules, 1), transaction, "full"), approved)
+
+    key = cache.key(build_rule_set(rules, 2), transaction, "full")
+
+    assert cache.get(key) is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_decision_cache_evicts_and_expires_entries():
+    """
+    Test that the least recently used entries are evicted and old entries expire.
+    """
+    clock = FakeClock()
+    cache = DecisionCache(max_entries=2, ttl=10.0, clock=clock)
+    rule_set = build_rule_set(rules, 1)
+    keys = [
+        cache.key(rule_set, {**transaction, "amount": float(amount)}, "full")
+        for amount in range(3)
+    ]
+
+    for key in keys:
+        cache.put(key, approved)
+    assert cache.get(keys[0]) is None
+    assert cache.stats()["evictions"] == 1
+
+    clock.now = 11.0
+    assert cache.get(keys[2]) is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_decision_cache_keys_lookups_in_unknown_lists_by_value():
+    """
+    Test that transactions looked up in a list that does not exist share a cache
+    entry, although each lookup returns its own UnknownList.
+    """
+    cache = DecisionCache()
+    rule_set = build_rule_set(
+        (
+            compile_rule(
+                1, "Not blocked", "not in_list('blocked', transaction['phone_number'])"
+            ),
+        ),
+        1,
+    )
+    registry = NamedListRegistry()
+    first, second = (registry.resolve(transaction, rule_set.lookups) for _ in range(2))
+
+    cache.put(cache.key(rule_set, first, "full"), approved)
+    assert cache.get(cache.key(rule_set, second, "full")) == approved
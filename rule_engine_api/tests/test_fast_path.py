@@ -0,0 +1,81 @@
+import json
+from typing import List
+import pytest
+from fastapi import FastAPI
+from app.api.v0.endpoints import transaction as endpoints
+from app.main import lifespan
+from app.schemas.responses import StandardResponse
+
+transaction = {
+    "transaction_id": "fast-1",
+    "transaction_amount": 100,
+    "merchant_id": "456",
+    "client_id": "789",
+    "phone_number": "1234567890",
+    "ip_address": "127.0.0.1",
+    "email_address": "test@example.ci",
+    "amount": 1000,
+}
+rejected = {**transaction, "transaction_id": "fast-2", "email_address": "a@b.com"}
+
+# Both implementations of each endpoint, whatever FAST_PATH_ENABLED is
+app = FastAPI(lifespan=lifespan)
+for path, handler, response_model in [
+    ("/model/check-transaction", endpoints.check_transaction, StandardResponse),
+    ("/fast/check-transaction", endpoints.check_transaction_fast, StandardResponse),
+    (
+        "/model/check-transactions",
+        endpoints.check_transactions,
+        List[StandardResponse],
+    ),
+    (
+        "/fast/check-transactions",
+        endpoints.check_transactions_fast,
+        List[StandardResponse],
+    ),
+]:
+    app.add_api_route(path, handler, methods=["POST"], response_model=response_model)
+
+
+@pytest.fixture(scope="module")
+def application():
+    return app
+
+
+JSON = {"content-type": "application/json"}
+
+
+@pytest.mark.parametrize(
+    "endpoint, body, headers",
+    [
+        ("check-transaction", json.dumps(transaction), JSON),
+        ("check-transaction", json.dumps(rejected), JSON),
+        ("check-transaction", '{"transaction_id": "1",', JSON),
+        ("check-transaction", "", JSON),
+        ("check-transaction", "", {}),
+        ("check-transaction", json.dumps({**transaction, "amount": "a lot"}), JSON),
+        ("check-transaction", json.dumps({"transaction_id": "1"}), JSON),
+        ("check-transaction", json.dumps([transaction]), JSON),
+        ("check-transaction", json.dumps(transaction), {"content-type": "text/plain"}),
+        ("check-transactions", json.dumps([transaction, rejected]), JSON),
+        ("check-transactions", json.dumps([]), JSON),
+        ("check-transactions", "[{", JSON),
+        ("check-transactions", "", JSON),
+        (
+            "check-transactions",
+            json.dumps([transaction, {**rejected, "client_id": None}]),
+            JSON,
+        ),
+        ("check-transactions", json.dumps(transaction), JSON),
+    ],
+)
+def test_fast_path_answers_as_the_model_path(client, endpoint, body, headers):
+    """
+    Test that the fast path gives the same responses, and the same validation errors,
+    as validating the body into models.
+    """
+    model = client.post(f"/model/{endpoint}", content=body, headers=headers)
+    fast = client.post(f"/fast/{endpoint}", content=body, headers=headers)
+
+    assert fast.status_code == model.status_code
+    assert fast.json() == model.json()
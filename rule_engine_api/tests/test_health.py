@@ -0,0 +1,27 @@
+from fastapi.testclient import TestClient
+from app.services import rule_set
+
+
+def test_probes_report_readiness_for_the_lifetime_of_the_application(
+    application, monkeypatch
+):
+    """
+    Test that the worker is alive from the start, but only ready between the warm-up
+    and the start of the shutdown.
+    """
+    monkeypatch.setattr(rule_set, "_current", None)
+    # Without its lifespan, the application is never bootstrapped
+    starting = TestClient(application)
+    assert starting.get("/health/live").json() == {"status": "alive"}
+    assert starting.get("/health/ready").status_code == 503
+
+    with TestClient(application) as client:
+        ready = client.get("/health/ready")
+        assert client.get("/health/live").status_code == 200
+    assert ready.status_code == 200
+    assert ready.json() == {
+        "status": "ready",
+        "rule_set_version": rule_set.get_rule_set().version,
+    }
+
+    assert starting.get("/health/ready").json() == {"status": "starting"}
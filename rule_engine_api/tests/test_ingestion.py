@@ -0,0 +1,74 @@
+import asyncio
+import json
+import pytest
+from app.services.ingestion import (
+    IngestionError,
+    InvalidRecord,
+    deduplicate,
+    iter_json_array,
+    iter_ndjson,
+)
+
+records = [
+    {"transaction_id": str(i), "amount": i * 1.5, "note": "é" * i} for i in range(20)
+]
+
+
+async def stream(body: bytes, size: int):
+    for start in range(0, len(body), size):
+        yield body[start : start + size]
+
+
+def collect(records_iterator):
+    async def run():
+        return [record async for record in records_iterator]
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("size", [1, 7, 1024])
+def test_iter_json_array_reads_records_split_across_pieces(size):
+    """
+    Test that array elements, including multi-byte characters, are decoded whatever the
+    piece boundaries.
+    """
+    body = json.dumps(records + [12345, None], indent=2).encode()
+
+    assert collect(iter_json_array(stream(body, size))) == records + [12345, None]
+    assert collect(iter_json_array(stream(b" [ ] ", 1))) == []
+
+
+@pytest.mark.parametrize("body", [b"", b"{}", b"[1,", b"[1 2]", b"[1] 2"])
+def test_iter_json_array_rejects_malformed_bodies(body):
+    """
+    Test that a body which is not a single JSON array raises an IngestionError.
+    """
+    with pytest.raises(IngestionError):
+        collect(iter_json_array(stream(body, 2)))
+
+
+def test_iter_ndjson_reports_invalid_lines():
+    """
+    Test that an invalid line becomes an InvalidRecord without stopping the stream.
+    """
+    body = b'{"transaction_id": "1"}\n\n{bad\n{"transaction_id": "2"}'
+
+    result = collect(iter_ndjson(stream(body, 3)))
+
+    assert result[0] == {"transaction_id": "1"}
+    assert isinstance(result[1], InvalidRecord)
+    assert result[2] == {"transaction_id": "2"}
+
+
+def test_deduplicate_keeps_first_or_last_record():
+    """
+    Test that repeated transaction_ids keep the first record, or the last one.
+    """
+    chunk = [
+        {"transaction_id": "1", "amount": 1},
+        {"transaction_id": "1", "amount": 2},
+        {"transaction_id": "2", "amount": 3},
+    ]
+
+    assert deduplicate(chunk, keep_last=False) == ([chunk[0], chunk[2]], 1)
+    assert deduplicate(chunk, keep_last=True) == ([chunk[1], chunk[2]], 1)
@@ -0,0 +1,86 @@
+transaction = {
+    "transaction_id": "lists-1",
+    "transaction_amount": 100,
+    "merchant_id": "456",
+    "client_id": "789",
+    "phone_number": "1234567890",
+    "ip_address": "10.1.2.3",
+    "email_address": "test@example.ci",
+    "amount": 1000,
+}
+
+
+def test_named_lists_are_created_updated_and_deleted(client):
+    """
+    Test the life of a named list through the API: creation, changes of its values,
+    lookups and deletion.
+    """
+    created = client.post("/v0/lists/", json={"name": "blocked_ips", "kind": "cidr"})
+    assert created.status_code == 201
+    assert created.json() == {"name": "blocked_ips", "kind": "cidr", "size": 0}
+    assert client.post("/v0/lists/", json={"name": "blocked_ips"}).status_code == 409
+
+    update = client.post(
+        "/v0/lists/blocked_ips/entries",
+        json={"add": ["10.0.0.0/8", "192.168.1.1", "10.0.0.0/8"]},
+    )
+    assert update.status_code == 200
+    assert update.json()["added"] == 2
+    assert client.get("/v0/lists/").json() == [
+        {"name": "blocked_ips", "kind": "cidr", "size": 2}
+    ]
+    contains = client.get(
+        "/v0/lists/blocked_ips/contains", params={"value": "10.1.2.3"}
+    )
+    assert contains.json() == {
+        "list": "blocked_ips",
+        "value": "10.1.2.3",
+        "match": True,
+    }
+
+    invalid = client.post("/v0/lists/blocked_ips/entries", json={"add": ["nope"]})
+    assert invalid.status_code == 422
+    removed = client.post(
+        "/v0/lists/blocked_ips/entries", json={"remove": ["10.0.0.0/8", "10.0.0.0/9"]}
+    )
+    assert (removed.json()["added"], removed.json()["removed"]) == (0, 1)
+    assert not client.get(
+        "/v0/lists/blocked_ips/contains", params={"value": "10.1.2.3"}
+    ).json()["match"]
+
+    assert client.delete("/v0/lists/blocked_ips").status_code == 204
+    assert client.delete("/v0/lists/blocked_ips").status_code == 404
+    assert (
+        client.get("/v0/lists/blocked_ips/contains", params={"value": "1.1.1.1"})
+    ).status_code == 404
+    assert client.post("/v0/lists/unknown/entries", json={}).status_code == 404
+
+
+def test_rules_look_values_up_in_named_lists(client):
+    """
+    Test that a rule using a list rejects the transactions whose values it holds,
+    from the next check on.
+    """
+    client.post("/v0/lists/", json={"name": "blocked_emails", "kind": "domain"})
+    rule = client.post(
+        "/v0/rules/",
+        json={
+            "description": "Not blocked",
+            "rule": "not in_list('blocked_emails', transaction['email_address'])",
+        },
+    )
+    assert rule.status_code == 200
+
+    def check(transaction_id: str) -> dict:
+        return client.post(
+            "/v0/transactions/check-transaction",
+            json={**transaction, "transaction_id": transaction_id},
+        ).json()
+
+    assert check("lists-2")["status"] == "approved"
+    client.post("/v0/lists/blocked_emails/entries", json={"add": ["example.ci"]})
+    assert check("lists-3") == {
+        "status": "rejected",
+        "status_code": 400,
+        "message": "Transaction rejected: Not blocked",
+    }
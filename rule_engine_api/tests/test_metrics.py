@@ -0,0 +1,98 @@
+from app.api.v0.endpoints import transaction as endpoints
+from app.services.metrics import FAIL, PASS, Histogram, Metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    """
+    Test that bucket counts are cumulative and end with the +Inf bucket.
+    """
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 5.0):
+        histogram.observe(value)
+
+    lines = histogram.render("latency_seconds", 'stage="total"')
+
+    assert lines == [
+        'latency_seconds_bucket{stage="total",le="0.1"} 1',
+        'latency_seconds_bucket{stage="total",le="1"} 3',
+        'latency_seconds_bucket{stage="total",le="+Inf"} 4',
+        'latency_seconds_sum{stage="total"} 6.25',
+        'latency_seconds_count{stage="total"} 4',
+    ]
+
+
+def test_metrics_counts_rule_outcomes():
+    """
+    Test that rule observations are counted per rule and outcome.
+    """
+    metrics = Metrics(sample_rate=1)
+    metrics.record_rules([(1, PASS, 1000), (1, FAIL, 2000), (2, PASS, 500)])
+
+    lines = metrics.render()
+
+    assert 'rule_engine_rule_evaluations_total{rule_id="1",outcome="fail"} 1' in lines
+    assert 'rule_engine_rule_evaluations_total{rule_id="2",outcome="pass"} 1' in lines
+    assert 'rule_engine_rule_evaluation_seconds_count{rule_id="1"} 2' in lines
+
+
+def test_metrics_sampling_can_be_turned_off():
+    """
+    Test that a sample rate of 0 measures no request and 1 measures every request.
+    """
+    assert not any(Metrics(sample_rate=0).sample() for _ in range(100))
+    assert all(Metrics(sample_rate=1).sample() for _ in range(100))
+
+
+def test_metrics_endpoint_exposes_the_sampled_checks(client, monkeypatch):
+    """
+    Test that /metrics renders the rule outcomes and stage times of sampled checks,
+    with the counters of the other components of the worker.
+    """
+    monkeypatch.setattr(endpoints.metrics, "sample_rate", 1)
+    rule = client.post(
+        "/v0/rules/",
+        json={"description": "Small", "rule": "transaction['amount'] < 100"},
+    ).json()
+    check = client.post(
+        "/v0/transactions/check-transaction",
+        json={
+            "transaction_id": "metrics-1",
+            "transaction_amount": 100,
+            "merchant_id": "456",
+            "client_id": "789",
+            "phone_number": "1234567890",
+            "ip_address": "127.0.0.1",
+            "email_address": "test@example.ci",
+            "amount": 1000,
+        },
+    )
+    assert check.json()["status"] == "rejected"
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    assert (
+        f'rule_engine_rule_evaluations_total{{rule_id="{rule["id"]}",outcome="fail"}} 1'
+        in lines
+    )
+    assert any(
+        line.startswith('rule_engine_check_transaction_seconds_count{stage="total"}')
+        for line in lines
+    )
+    for metric in [
+        "rule_engine_decision_cache_misses_total",
+        "rule_engine_velocity_keys",
+        "rule_engine_shadow_transactions_total",
+        "rule_engine_deadline_exceeded_total",
+        "rule_engine_evaluations_abandoned",
+        "rule_engine_db_pool_checked_out",
+    ]:
+        assert any(line.startswith(metric) for line in lines), metric
+
+    # The same counters, as JSON
+    assert client.get("/v0/transactions/decision-cache").json()["misses"] >= 1
+    assert {"timeouts", "quarantined", "shed"} <= set(
+        client.get("/v0/transactions/cost-guard").json()
+    )
+    assert "rules" in client.get("/v0/transactions/shadow-rules").json()
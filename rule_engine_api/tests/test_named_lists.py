@@ -0,0 +1,184 @@
+import asyncio
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from app.db import async_crud
+from app.db.models import Base
+from app.services.batch_engine import apply_rules_batch, build_batch_plan
+from app.services.named_lists import (
+    CidrIndex,
+    DomainIndex,
+    ExactIndex,
+    ListLookup,
+    NamedListRegistry,
+    normalize,
+)
+from app.services.rule_compiler import RuleCompileError, compile_rule
+from app.services.rule_engine import apply_rule_set, apply_rules
+from app.services.rule_set import assemble_rule_set
+
+
+def test_normalize():
+    assert normalize("exact", " A@B.com ") == "a@b.com"
+    assert normalize("cidr", "10.1.2.3/8") == "10.0.0.0/8"
+    assert normalize("cidr", "192.168.0.1") == "192.168.0.1/32"
+    assert normalize("domain", "@Example.COM") == "example.com"
+    for kind, value in [("exact", " "), ("cidr", "not an ip"), ("domain", "@")]:
+        with pytest.raises(ValueError):
+            normalize(kind, value)
+
+
+def test_indexes_match_values():
+    exact = ExactIndex()
+    exact.add("+2250700000000")
+    assert exact.contains(" +2250700000000")
+    assert not exact.contains("+2250700000001")
+
+    domains = DomainIndex()
+    domains.add("example.com")
+    assert domains.contains("a@Example.com")
+    assert domains.contains("a@mail.example.com")
+    assert not domains.contains("a@example.com.evil")
+    assert not domains.contains("a@notexample.com")
+
+    networks = CidrIndex()
+    for value in ["10.0.0.0/8", "192.168.1.7/32", "2001:db8::/32"]:
+        networks.add(value)
+    assert networks.contains("10.200.3.4")
+    assert networks.contains("192.168.1.7")
+    assert not networks.contains("192.168.1.8")
+    assert networks.contains("2001:db8::1")
+    assert not networks.contains("not an ip")
+    networks.discard("10.0.0.0/8")
+    assert not networks.contains("10.200.3.4")
+    assert len(networks) == 2
+
+
+def test_list_rules_compile_to_lookup_fields():
+    rule = compile_rule(
+        1, "Not blocked", "not in_list('blocked_ips', transaction['ip_address'])"
+    )
+
+    assert rule.fields == {"in_list:blocked_ips:ip_address"}
+    assert rule.fn({"in_list:blocked_ips:ip_address": False}) is True
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "in_list('blocked_ips')",
+        "in_list(blocked_ips, transaction['ip_address'])",
+        "in_list('blocked ips', transaction['ip_address'])",
+        "in_list('blocked_ips', transaction['amount'])",
+        "in_list('blocked_ips', transaction['ip_address'].lower())",
+    ],
+)
+def test_list_rules_reject_invalid_arguments(source):
+    with pytest.raises(RuleCompileError):
+        compile_rule(1, "Invalid", source)
+
+
+def test_registry_loads_and_applies_changes_incrementally(tmp_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'lists.db'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        loaded, updated = NamedListRegistry(), NamedListRegistry()
+        async with sessions() as db:
+            ips = await async_crud.create_named_list(db, "blocked_ips", "cidr")
+            assert (
+                await async_crud.create_named_list(db, "blocked_ips", "exact") is None
+            )
+            assert await async_crud.update_named_list_entries(
+                db, ips, ["10.0.0.0/8", "1.2.3.4/32"], []
+            ) == (2, 0)
+            await loaded.load(db)
+            await updated.load(db)
+
+            assert await async_crud.update_named_list_entries(
+                db, ips, ["1.2.3.4/32", "5.6.7.8/32"], ["10.0.0.0/8", "9.9.9.9/32"]
+            ) == (1, 1)
+            assert await updated.refresh(db) == 2
+            await async_crud.delete_named_list(db, "blocked_ips")
+            await loaded.refresh(db)
+        await engine.dispose()
+        return loaded, updated
+
+    loaded, updated = asyncio.run(run())
+
+    assert updated.contains("blocked_ips", "5.6.7.8")
+    assert not updated.contains("blocked_ips", "10.1.1.1")
+    assert updated.describe() == [("blocked_ips", "cidr", 2)]
+    assert loaded.describe() == []
+    assert loaded.revision == updated.revision + 1
+
+
+def test_registry_reloads_once_its_changes_are_pruned(tmp_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'lists.db'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        behind, current = NamedListRegistry(), NamedListRegistry()
+        async with sessions() as db:
+            ips = await async_crud.create_named_list(db, "blocked_ips", "exact")
+            await behind.load(db)
+            for value in ["1", "2", "3", "4"]:
+                await async_crud.update_named_list_entries(
+                    db, ips, [value], [], keep_changes=3
+                )
+                await current.refresh(db)
+            await async_crud.update_named_list_entries(
+                db, ips, ["5"], ["1"], keep_changes=3
+            )
+            logged = await async_crud.get_named_list_changes(db, 0, 100)
+            # The registry kept up replays the log, the other one missed pruned changes
+            assert await current.refresh(db) == 2
+            assert await behind.refresh(db) == 0
+        await engine.dispose()
+        return behind, current, logged
+
+    behind, current, logged = asyncio.run(run())
+
+    assert [(change.operation, change.value) for change in logged] == [
+        ("add", "4"),
+        ("add", "5"),
+        ("remove", "1"),
+    ]
+    assert behind.describe() == current.describe() == [("blocked_ips", "exact", 4)]
+    assert behind.revision == current.revision == logged[-1].id
+
+
+def test_list_rules_evaluate_alike_on_every_path():
+    registry = NamedListRegistry()
+    registry._apply("blocked_ips", "create", "cidr")
+    registry._apply("blocked_ips", "add", "10.0.0.0/8")
+    rules = [
+        compile_rule(
+            1, "Not blocked", "not in_list('blocked_ips', transaction['ip_address'])"
+        ),
+        compile_rule(
+            2, "Not trusted", "in_list('trusted', transaction['email_address'])"
+        ),
+    ]
+    rule_set = assemble_rule_set(rules, 1)
+    assert rule_set.lookups == (
+        ListLookup("blocked_ips", "ip_address"),
+        ListLookup("trusted", "email_address"),
+    )
+
+    transactions = [
+        registry.resolve(
+            {"ip_address": ip, "email_address": "a@example.com"}, rule_set.lookups
+        )
+        for ip in ["10.1.2.3", "11.1.2.3"]
+    ]
+
+    expected = [apply_rules(transaction, rules) for transaction in transactions]
+    # The list that does not exist fails its rule with an error
+    assert [check["message"] for check in expected] == [
+        "Not blocked\n'Not trusted' ==> Unknown list 'trusted'",
+        "'Not trusted' ==> Unknown list 'trusted'",
+    ]
+    assert [apply_rule_set(t, rule_set) for t in transactions] == expected
+    assert apply_rules_batch(transactions, build_batch_plan(rules)) == expected
@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from app.db.pool import PoolStats, TimedAsyncAdaptedQueuePool, render_pool_metrics
+
+
+def make_engine(tmp_path):
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}",
+        poolclass=TimedAsyncAdaptedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=0.05,
+    )
+    engine.pool.stats = PoolStats(1)
+    return engine
+
+
+def test_pool_records_checkouts_timeouts_and_saturation(tmp_path):
+    async def run():
+        engine = make_engine(tmp_path)
+        async with engine.connect():
+            saturated = render_pool_metrics({"primary": engine.pool})
+            with pytest.raises(PoolTimeoutError):
+                async with engine.connect():
+                    pass
+        stats = engine.pool.stats
+        await engine.dispose()
+        return saturated, stats
+
+    saturated, stats = asyncio.run(run())
+
+    assert 'rule_engine_db_pool_checked_out{pool="primary"} 1' in saturated
+    assert 'rule_engine_db_pool_saturation{pool="primary"} 1' in saturated
+    assert stats.timeouts == 1
+    assert sum(stats.wait.counts) == 2
+    assert stats.wait.sum >= 0.05
+
+
+def test_pool_stats_survive_dispose(tmp_path):
+    async def run():
+        engine = make_engine(tmp_path)
+        stats = engine.pool.stats
+        await engine.dispose()
+        async with engine.connect():
+            pass
+        assert engine.pool.stats is stats
+        await engine.dispose()
+
+    asyncio.run(run())
+
+
+def test_render_skips_pools_without_stats():
+    lines = render_pool_metrics({"primary": object()})
+
+    assert not [line for line in lines if not line.startswith("#")]
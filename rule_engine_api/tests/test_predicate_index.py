@@ -0,0 +1,100 @@
+import random
+from app.services.predicate_index import (
+    PredicateIndex,
+    Predicate,
+    build_rule_set_evaluator,
+    match_predicate,
+)
+from app.services.rule_compiler import compile_rule
+from app.services.rule_engine import apply_rule_set, apply_rules
+from app.services.rule_fusion import build_fused_evaluator
+from app.services.rule_set import assemble_rule_set
+
+
+def make_rules(count, seed=0):
+    """
+    Comparison and equality rules over a few thresholds, mixed with other rules.
+    """
+    generator = random.Random(seed)
+    templates = [
+        "transaction['amount'] < {n}",
+        "transaction['amount'] <= {n}",
+        "{n} < transaction['amount']",
+        "transaction['amount'] >= {n}",
+        "transaction['amount'] == {n}",
+        "transaction['amount'] != {n}.0",
+        "transaction['merchant_id'] != 'm{n}'",
+        "transaction['merchant_id'] == 'm{n}'",
+        "'m{n}' <= transaction['merchant_id']",
+        "transaction['email_address'].endswith('.c{n}')",
+        "transaction['amount'] > 'text'",
+    ]
+    return [
+        compile_rule(
+            i,
+            f"Rule {i}",
+            generator.choice(templates).format(n=generator.randint(0, 9)),
+        )
+        for i in range(count)
+    ]
+
+
+def test_match_predicate():
+    def match(source):
+        return match_predicate(compile_rule(1, "Rule", source))
+
+    assert match("transaction['amount'] < 100") == Predicate("amount", "<", 100)
+    assert match("100 < transaction['amount']") == Predicate("amount", ">", 100)
+    assert match("transaction['merchant_id'] != 'm1'") == Predicate(
+        "merchant_id", "!=", "m1"
+    )
+    assert match("transaction['amount'] < 10 * 10") == Predicate("amount", "<", 100)
+    assert match("transaction['amount'] < '100'") is None
+    assert match("transaction['merchant_id'] < 100") is None
+    assert match("transaction['amount'] < transaction['transaction_amount']") is None
+    assert match("0 < transaction['amount'] < 100") is None
+    assert match("transaction['merchant_id'] in ('m1', 'm2')") is None
+
+
+def test_index_matches_rule_by_rule_evaluation():
+    rules = make_rules(300)
+    index = PredicateIndex(rules)
+    assert index.indexed > 200
+
+    generator = random.Random(1)
+    for _ in range(500):
+        transaction = {
+            "amount": generator.choice(
+                [generator.randint(-1, 10), generator.random() * 10, float("nan")]
+            ),
+            "merchant_id": f"m{generator.randint(0, 10)}",
+            "email_address": f"a@b.c{generator.randint(0, 9)}",
+        }
+        expected = apply_rules(transaction, rules)["message"].split("\n")
+        assert index(transaction) == [m for m in expected if m]
+
+
+def test_index_reports_missing_fields_and_unexpected_types():
+    rules = make_rules(50)
+    index = PredicateIndex(rules)
+    fused = build_fused_evaluator(rules)
+
+    for transaction in [
+        {"merchant_id": "m1", "email_address": "a@b.c1"},
+        {"amount": "5", "merchant_id": None, "email_address": "a@b.c1"},
+        {"amount": True, "merchant_id": "m1", "email_address": "a@b.c1"},
+    ]:
+        assert index(transaction) == fused(transaction)
+
+
+def test_rule_sets_index_many_comparison_rules():
+    few = [
+        compile_rule(i, f"Rule {i}", f"transaction['amount'] < {i}") for i in range(3)
+    ]
+    many = make_rules(100)
+
+    assert not isinstance(build_rule_set_evaluator(few), PredicateIndex)
+    rule_set = assemble_rule_set(many, 1)
+    assert isinstance(rule_set.fused, PredicateIndex)
+    transaction = {"amount": 5, "merchant_id": "m5", "email_address": "a@b.c5"}
+    assert apply_rule_set(transaction, rule_set) == apply_rules(transaction, many)
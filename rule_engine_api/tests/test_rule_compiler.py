@@ -0,0 +1,77 @@
+import ast
+import pytest
+from app.services.rule_compiler import RuleCompileError, compile_rule
+
+transaction = {
+    "transaction_id": "123",
+    "transaction_amount": 100.0,
+    "merchant_id": "456",
+    "client_id": "789",
+    "phone_number": "1234567890",
+    "ip_address": "127.0.0.1",
+    "email_address": "Test@Example.CI",
+    "amount": 1000.0,
+}
+
+
+def test_compile_rule_evaluates_and_records_fields():
+    """
+    Test that a compiled rule evaluates like the expression and records the fields it reads.
+    """
+    rule = compile_rule(
+        1,
+        "Small .ci transaction",
+        "transaction['amount'] < 1500000 and transaction['email_address'].lower().endswith('.ci')",
+    )
+
+    assert rule.fn(transaction) is True
+    assert rule.fn({**transaction, "amount": 2000000.0}) is False
+    assert rule.fields == {"amount", "email_address"}
+
+
+def test_compile_rule_folds_constants():
+    """
+    Test that constant sub-expressions are folded at compile time.
+    """
+    rule = compile_rule(1, "Folded", "transaction['amount'] < 1500 * 1000")
+
+    assert isinstance(rule.expression.comparators[0], ast.Constant)
+    assert rule.expression.comparators[0].value == 1500000
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "__import__('os').system('id')",
+        "transaction.__class__",
+        "transaction['unknown'] == 1",
+        "[x for x in transaction]",
+        "open('/etc/passwd')",
+        "transaction['amount'] <",
+        "'a' * 10 ** 9",
+        "'%999999999d' % 1 == ''",
+        "b'%.999999999f' % 1.0 == b''",
+        "'%*d' % (999999999, 1) == ''",
+    ],
+)
+def test_compile_rule_rejects_unsafe_rules(source):
+    """
+    Test that rules outside the whitelist are rejected.
+    """
+    with pytest.raises(RuleCompileError):
+        compile_rule(1, "Unsafe", source)
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "((9 ** 999) ** 999) ** 99 > 0",
+        "(9 ** 999) * (9 ** 999) * (9 ** 999) ** 99 > 0",
+    ],
+)
+def test_compile_rule_bounds_folded_integers(source):
+    """
+    Test that folding refuses integers too large before computing them.
+    """
+    with pytest.raises(RuleCompileError, match="too large"):
+        compile_rule(1, "Huge", source)
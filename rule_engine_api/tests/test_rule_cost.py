@@ -0,0 +1,133 @@
+import asyncio
+import time
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from app.db import async_crud
+from app.db.models import Base
+from app.schemas.rule import RuleCreate
+from app.services.cost_guard import CostGuard
+from app.services.rule_compiler import (
+    QUARANTINED,
+    RuleCompileError,
+    compile_rule,
+    validate_rule,
+)
+from app.services.rule_cost import check_rule_cost, estimate_rule_cost
+from app.services.rule_set import assemble_rule_set
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "len(transaction['email_address'] * int(transaction['amount'])) > 0",
+        "int(transaction['amount']) ** int(transaction['amount']) > 0",
+        "'%*d' % (int(transaction['amount']), 1) == ''",
+    ],
+)
+def test_rules_of_unbounded_cost_are_rejected(source):
+    with pytest.raises(RuleCompileError, match="Unbounded cost"):
+        check_rule_cost(validate_rule(source), 10_000)
+
+
+def test_rule_cost_grows_with_scanned_constants():
+    small = validate_rule("transaction['merchant_id'] in ('1', '2')")
+    large = validate_rule(
+        "transaction['merchant_id'] in ("
+        + ", ".join(f"'{i}'" for i in range(20_000))
+        + ")"
+    )
+    assert estimate_rule_cost(small).cost < 10
+    with pytest.raises(RuleCompileError, match="exceeds the limit"):
+        check_rule_cost(large, 10_000)
+    # Numbers multiply freely, only sequences are repeated
+    assert check_rule_cost(
+        validate_rule("transaction['amount'] * int(transaction['client_id']) > 0"),
+        10_000,
+    )
+
+
+def test_quarantined_rules_are_not_evaluated():
+    rules = [
+        compile_rule(1, "Limit", "transaction['amount'] < 100"),
+        compile_rule(2, "Slow", "transaction['amount'] < 10", status=QUARANTINED),
+    ]
+    rule_set = assemble_rule_set(rules, version=1)
+    assert [rule.id for rule in rule_set.rules] == [1]
+    assert rule_set.shadow == ()
+
+
+def test_cost_guard_quarantines_rules_over_budget(tmp_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'rules.db'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        async with sessions() as db:
+            for description, source in [
+                ("Fast", "transaction['amount'] < 100"),
+                ("Slow", "len(transaction['email_address'] * 200_000) > 0"),
+            ]:
+                await async_crud.create_rule(
+                    db, RuleCreate(description=description, rule=source)
+                )
+            rules = [
+                compile_rule(rule.id, rule.description, rule.rule)
+                for rule in await async_crud.get_rules_(db)
+            ]
+        rule_set = assemble_rule_set(rules, version=1)
+        guard = CostGuard(sessions, rule_budget_ms=0.1, quarantine_strikes=2)
+        transaction = {"amount": 1.0, "email_address": "a@b.ci" * 10}
+
+        slow = guard.replay(rule_set, [transaction])
+        assert [rule.id for rule, _ in slow] == [2]
+        guard._strike(slow)
+        assert guard.stats()["strikes"] == [{"rule_id": 2, "strikes": 1}]
+        guard._strike(slow)
+        await guard.stop()
+
+        async with sessions() as db:
+            statuses = {
+                rule.id: rule.status for rule in await async_crud.get_rules_(db)
+            }
+            # A rule already quarantined is not quarantined again
+            again = await async_crud.quarantine_rules(db, [(2, rules[1].rule)])
+        await engine.dispose()
+        return guard.stats(), statuses, again
+
+    stats, statuses, again = asyncio.run(run())
+    assert statuses == {1: "active", 2: QUARANTINED}
+    assert again == []
+    assert [rule["rule_id"] for rule in stats["quarantined"]] == [2]
+    assert stats["strikes"] == []
+
+
+def test_cost_guard_replays_are_bounded():
+    """
+    Test that a replay stops after its timeout, striking the rule it is stuck in
+    without waiting for it, and that checks are dropped until that rule returns.
+    """
+    # A rule taking 80 ms without holding the GIL, so the event loop runs meanwhile
+    rules = [
+        compile_rule(id, "Slow", "transaction['amount'] > 0")._replace(
+            fn=lambda transaction: time.sleep(0.08)
+        )
+        for id in (1, 2)
+    ]
+    rule_set = assemble_rule_set(rules, version=1)
+    transaction = {"amount": 3.0}
+
+    guard = CostGuard(None, rule_budget_ms=5, replay_timeout_ms=20)
+    # Both rules run over budget, but the replay stops after the first one
+    assert [rule.id for rule, _ in guard.replay(rule_set, [transaction])] == [1]
+
+    async def run():
+        guard.submit(rule_set, [transaction])
+        await asyncio.sleep(0.04)
+        strikes = guard.stats()["strikes"]
+        guard.submit(rule_set, [transaction])
+        await asyncio.sleep(0)
+        await guard.stop()
+        return strikes
+
+    assert asyncio.run(run()) == [{"rule_id": 1, "strikes": 1}]
+    assert guard.stats()["dropped"] == 1
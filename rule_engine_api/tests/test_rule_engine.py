@@ -0,0 +1,178 @@
+import pytest
+from app.db.models import Rule
+from app.services.batch_engine import apply_rule_set_batch
+from app.services.rule_compiler import RuleCompileError, compile_rule
+from app.services.rule_engine import (
+    AdaptiveScheduler,
+    apply_rule_set,
+    apply_rules,
+    apply_rules_fail_fast,
+)
+from app.services.rule_set import RoutingIndex, build_rule_set
+
+transaction = {
+    "transaction_id": "123",
+    "transaction_amount": 100.0,
+    "merchant_id": "456",
+    "client_id": "789",
+    "phone_number": "1234567890",
+    "ip_address": "127.0.0.1",
+    "email_address": "test@example.com",
+    "amount": 2000000.0,
+}
+
+rules = (
+    compile_rule(1, "Phone number is set", "len(transaction['phone_number']) > 0"),
+    compile_rule(2, "Amount below limit", "transaction['amount'] < 1500000"),
+    compile_rule(3, "Email from .ci", "transaction['email_address'].endswith('.ci')"),
+)
+rule_set = build_rule_set(rules, 1)
+
+
+def test_apply_rules_reports_every_failure():
+    """
+    Test that full evaluation reports every failing rule, in table order.
+    """
+    assert apply_rules(transaction, rules) == {
+        "has_succeeded": False,
+        "message": "Amount below limit\nEmail from .ci",
+    }
+
+
+def test_apply_rules_fail_fast_prefers_rules_that_fail():
+    """
+    Test that fail-fast evaluation stops at one failure and learns to try failing rules first.
+    """
+    scheduler = AdaptiveScheduler(reorder_interval=10)
+
+    for _ in range(100):
+        check = apply_rules_fail_fast(transaction, rule_set, scheduler)
+        assert check["has_succeeded"] is False
+        assert check["message"] in ("Amount below limit", "Email from .ci")
+
+    assert scheduler.order(rule_set)[-1].id == 1
+
+
+def test_apply_rules_fail_fast_approves_when_all_rules_pass():
+    """
+    Test that fail-fast evaluation approves a transaction that passes every rule.
+    """
+    approved = {**transaction, "amount": 1000.0, "email_address": "test@example.ci"}
+
+    assert apply_rules_fail_fast(approved, rule_set, AdaptiveScheduler()) == {
+        "has_succeeded": True,
+        "message": "",
+    }
+
+
+def test_apply_rule_set_matches_apply_rules():
+    """
+    Test that the fused evaluator gives the same result as evaluating rules one by one.
+    """
+    shared_rules = rules + (
+        compile_rule(
+            4,
+            "Email from .com",
+            "transaction['email_address'].lower().endswith('.com')",
+        ),
+        compile_rule(
+            5,
+            "Amount ratio",
+            "transaction['amount'] / transaction['transaction_amount'] < 10",
+        ),
+        compile_rule(
+            6,
+            "Amount ratio or .ci",
+            "transaction['email_address'].lower().endswith('.ci')"
+            " or transaction['amount'] / transaction['transaction_amount'] < 100",
+        ),
+    )
+    shared_rule_set = build_rule_set(shared_rules, 1)
+
+    for variant in (
+        transaction,
+        {**transaction, "transaction_amount": 0.0},
+        {**transaction, "email_address": "TEST@EXAMPLE.CI", "amount": 1.0},
+    ):
+        assert apply_rule_set(variant, shared_rule_set) == apply_rules(
+            variant, shared_rules
+        )
+
+
+scoped_rules = (
+    compile_rule(1, "Amount below limit", "transaction['amount'] < 1500000"),
+    compile_rule(
+        2, "Merchant 456 limit", "transaction['amount'] < 1000", "merchant_id:456"
+    ),
+    compile_rule(
+        3, "Merchant 999 limit", "transaction['amount'] < 1", "merchant_id:999"
+    ),
+    compile_rule(4, "Client 789 limit", "transaction['amount'] < 500", "client_id:789"),
+)
+# Batch plans are cached per version, which the application and other tests use
+scoped_rule_set = build_rule_set(scoped_rules, -2)
+
+
+def test_scoped_rules_only_apply_to_their_transactions():
+    """
+    Test that transactions are only checked against the global rules and the rules of
+    their merchant and client, in table order.
+    """
+    cases = [
+        ({"merchant_id": "1", "client_id": "1"}, [1]),
+        ({"merchant_id": "456", "client_id": "1"}, [1, 2]),
+        ({"merchant_id": "1", "client_id": "789"}, [1, 4]),
+        ({"merchant_id": "456", "client_id": "789"}, [1, 2, 4]),
+    ]
+    assert {"merchant_id", "client_id"} <= scoped_rule_set.fields
+    assert len(scoped_rule_set.routes) == 3
+
+    for scope, expected in cases:
+        scoped = {**transaction, **scope}
+        subset = scoped_rule_set.route(scoped)
+        assert [rule.id for rule in subset.rules] == expected
+        assert subset is scoped_rule_set.route(scoped)
+
+        check = apply_rules(scoped, subset.rules)
+        assert apply_rule_set(scoped, scoped_rule_set) == check
+        assert apply_rule_set_batch([scoped], scoped_rule_set) == [check]
+        failed = apply_rules_fail_fast(scoped, scoped_rule_set, AdaptiveScheduler())
+        assert failed["message"] in check["message"].split("\n")
+
+
+def test_combined_scopes_evict_the_least_recently_used():
+    """
+    Test that combined merchant and client subsets are evicted one at a time, least
+    recently used first, rather than all at once.
+    """
+    scopes = ["merchant_id:1", "merchant_id:2", "merchant_id:3", "client_id:1"]
+    rules = [compile_rule(1, "Global", "transaction['amount'] < 1500000")] + [
+        compile_rule(2 + i, scope, "transaction['amount'] < 1000", scope)
+        for i, scope in enumerate(scopes)
+    ]
+    routes = RoutingIndex(rules, version=1, max_combined=2)
+    first, second, third = (
+        {**transaction, "merchant_id": merchant, "client_id": "1"}
+        for merchant in ("1", "2", "3")
+    )
+    one, two = routes.select(first), routes.select(second)
+    assert [rule.id for rule in one.rules] == [1, 2, 5]
+    assert routes.select(first) is one
+
+    routes.select(third)
+    assert routes.select(first) is one
+    assert routes.select(second) is not two
+
+
+def test_scoped_rules_with_an_invalid_scope_fail_everywhere():
+    """
+    Test that a stored rule with an invalid scope reports its error on every transaction.
+    """
+    with pytest.raises(RuleCompileError):
+        compile_rule(1, "Bad scope", "transaction['amount'] > 0", "phone_number:1")
+    stored = Rule(id=1, description="Bad scope", rule="True", scope="merchant_id")
+
+    result = apply_rule_set(transaction, build_rule_set([stored], 1))
+
+    assert result["has_succeeded"] is False
+    assert "Invalid scope 'merchant_id'" in result["message"]
@@ -0,0 +1,153 @@
+import asyncio
+import pytest
+from app.services import rule_executor
+from app.services.rule_executor import (
+    INLINE,
+    PROCESS,
+    THREAD,
+    DeadlineExceeded,
+    RuleExecutor,
+    Stale,
+    field_order,
+    make_delta,
+)
+from app.services.rule_compiler import compile_rule
+from app.services.rule_set import build_rule_set
+
+amount_rule = compile_rule(1, "Amount below limit", "transaction['amount'] < 1000")
+email_rule = compile_rule(
+    2, "Email from .ci", "transaction['email_address'].endswith('.ci')"
+)
+transaction = {"transaction_id": "1", "amount": 2000.0, "email_address": "a@b.ci"}
+
+
+def worker_values(rule_set):
+    return tuple(transaction[name] for name in field_order(rule_set))
+
+
+def test_worker_answers_stale_until_it_gets_the_delta():
+    """
+    Test that a worker only evaluates the version it holds, and catches up from a delta.
+    """
+    v1 = build_rule_set([amount_rule], 1)
+    v2 = build_rule_set([email_rule], 2)
+    rule_executor._init_worker(make_delta(None, None, v1))
+
+    result = rule_executor._evaluate_in_worker(1, "full", worker_values(v1))
+    assert result == ({"has_succeeded": False, "message": "Amount below limit"}, None)
+    assert rule_executor._evaluate_in_worker(2, "full", worker_values(v2)) == Stale(1)
+
+    delta = make_delta(1, rule_executor.definitions(v1), v2)
+    assert [rule.id for rule in delta.changed] == [2]
+    assert delta.removed == (1,)
+    result = rule_executor._evaluate_in_worker(2, "full", worker_values(v2), delta)
+    assert result == ({"has_succeeded": True, "message": ""}, None)
+
+
+def test_worker_ignores_delta_for_another_base_version():
+    """
+    Test that a delta computed from another version is not applied.
+    """
+    v1 = build_rule_set([amount_rule], 1)
+    v3 = build_rule_set([amount_rule, email_rule], 3)
+    rule_executor._init_worker(make_delta(None, None, v1))
+
+    delta = make_delta(2, {}, v3)
+    result = rule_executor._evaluate_in_worker(3, "full", worker_values(v3), delta)
+
+    assert result == Stale(1)
+
+
+def test_inline_executor_matches_direct_evaluation():
+    """
+    Test that the inline backend returns the result of the rule engine, and that timing
+    each rule does not change it.
+    """
+    rule_set = build_rule_set([amount_rule, email_rule], 1)
+    executor = RuleExecutor(INLINE)
+    observations = []
+
+    result = asyncio.run(executor.evaluate(transaction, rule_set, "full"))
+    sampled = asyncio.run(
+        executor.evaluate(transaction, rule_set, "full", observations)
+    )
+
+    assert result == sampled
+    assert result == {"has_succeeded": False, "message": "Amount below limit"}
+    assert [(rule_id, outcome) for rule_id, outcome, _ in observations] == [
+        (1, "fail"),
+        (2, "pass"),
+    ]
+
+
+def test_worker_routes_scoped_rules():
+    """
+    Test that workers receive the scope of the rules and the fields routing them.
+    """
+    scoped_rule = compile_rule(
+        3, "Merchant limit", "transaction['amount'] < 10", "merchant_id:m1"
+    )
+    rule_set = build_rule_set([email_rule, scoped_rule], 4)
+    rule_executor._init_worker(make_delta(None, None, rule_set))
+
+    for merchant_id, message in [("m1", "Merchant limit"), ("m2", "")]:
+        values = tuple(
+            {**transaction, "merchant_id": merchant_id}[name]
+            for name in field_order(rule_set)
+        )
+        result = rule_executor._evaluate_in_worker(4, "full", values)
+        assert result == ({"has_succeeded": not message, "message": message}, None)
+
+
+slow_rule = compile_rule(
+    5, "Slow", "int(transaction['amount']) ** 1_000_000 > transaction['amount']"
+)
+
+
+def test_thread_executor_bounds_abandoned_evaluations():
+    """
+    Test that evaluations past their deadline are abandoned, and that no evaluation
+    starts while `max_abandoned` of them are still running.
+    """
+    slow_set = build_rule_set([slow_rule], 1)
+    fast_set = build_rule_set([amount_rule], 1)
+
+    async def run():
+        executor = RuleExecutor(THREAD, max_abandoned=1)
+        with pytest.raises(DeadlineExceeded):
+            await executor.evaluate(transaction, slow_set, "full", timeout=0.001)
+        assert executor.abandoned == 1
+        with pytest.raises(DeadlineExceeded):
+            await executor.evaluate(transaction, fast_set, "full", timeout=10)
+        while executor.abandoned:
+            await asyncio.sleep(0.01)
+        result = await executor.evaluate(transaction, fast_set, "full", timeout=10)
+        executor.shutdown()
+        return result, executor.stats()
+
+    result, stats = asyncio.run(run())
+    assert result == {"has_succeeded": False, "message": "Amount below limit"}
+    assert stats == {"abandoned": 0, "shed": 1, "recycled": 0}
+
+
+def test_process_executor_replaces_workers_running_abandoned_evaluations():
+    """
+    Test that worker processes stuck in abandoned evaluations are replaced instead of
+    leaving later evaluations without workers.
+    """
+    slow_set = build_rule_set([slow_rule], 1)
+    fast_set = build_rule_set([amount_rule], 2)
+
+    async def run():
+        executor = RuleExecutor(PROCESS, max_workers=1, max_abandoned=1)
+        # Start the worker process before timing evaluations
+        await executor.evaluate(transaction, fast_set, "full")
+        with pytest.raises(DeadlineExceeded):
+            await executor.evaluate(transaction, slow_set, "full", timeout=0.01)
+        result = await executor.evaluate(transaction, fast_set, "full", timeout=10)
+        executor.shutdown()
+        return result, executor.stats()
+
+    result, stats = asyncio.run(run())
+    assert result == {"has_succeeded": False, "message": "Amount below limit"}
+    assert stats == {"abandoned": 0, "shed": 0, "recycled": 1}
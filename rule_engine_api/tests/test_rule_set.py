@@ -0,0 +1,156 @@
+import asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from app.db import async_crud
+from app.db.models import Base
+from app.schemas.rule import RuleCreate, RuleUpdate
+from app.services import rule_set
+from app.services.rule_engine import apply_rule_set
+
+
+def test_refresh_never_loads_an_older_generation(tmp_path, monkeypatch):
+    """
+    Test that a replica lagging behind the primary does not replace the rule set
+    loaded from the primary with an older generation.
+    """
+    monkeypatch.setattr(rule_set, "_current", None)
+
+    async def run():
+        engines, sessions = [], []
+        for name in ("primary", "replica"):
+            engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / name}.db")
+            async with engine.begin() as connection:
+                await connection.run_sync(Base.metadata.create_all)
+            engines.append(engine)
+            sessions.append(async_sessionmaker(engine, expire_on_commit=False))
+        primary, replica = sessions
+        async with primary() as db:
+            for limit in (100, 200):
+                await async_crud.create_rule(
+                    db,
+                    RuleCreate(
+                        description="Limit", rule=f"transaction['amount'] < {limit}"
+                    ),
+                )
+            loaded = await rule_set.refresh_rule_set(db)
+        # The replica has only replicated the first rule
+        async with replica() as db:
+            await async_crud.create_rule(
+                db, RuleCreate(description="Limit", rule="transaction['amount'] < 100")
+            )
+            lagging = await rule_set.refresh_rule_set(db)
+        for engine in engines:
+            await engine.dispose()
+        return loaded, lagging
+
+    loaded, lagging = asyncio.run(run())
+    assert loaded.version == 2 and len(loaded.rules) == 2
+    assert lagging is loaded
+
+
+async def create_sessions(path) -> tuple:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(engine, expire_on_commit=False)
+
+
+def test_refresh_swaps_in_a_new_snapshot(tmp_path, monkeypatch):
+    """
+    Test that a refresh replaces the current snapshot by a new compiled one, while the
+    snapshot held by a request in flight keeps evaluating the rules it was built from.
+    """
+    monkeypatch.setattr(rule_set, "_current", None)
+    transaction = {"amount": 150.0}
+
+    async def run():
+        engine, sessions = await create_sessions(tmp_path / "rules.db")
+        async with sessions() as db:
+            await async_crud.create_rule(
+                db, RuleCreate(description="Limit", rule="transaction['amount'] < 200")
+            )
+            held = await rule_set.get_or_load_rule_set(db)
+            assert await rule_set.get_or_load_rule_set(db) is held
+            await async_crud.create_rule(
+                db, RuleCreate(description="Lower", rule="transaction['amount'] < 100")
+            )
+            current = await rule_set.refresh_rule_set(db)
+        await engine.dispose()
+        return held, current
+
+    held, current = asyncio.run(run())
+    assert rule_set.get_rule_set() is current
+    assert [rule.description for rule in held.rules] == ["Limit"]
+    assert apply_rule_set(transaction, held)["has_succeeded"] is True
+    assert apply_rule_set(transaction, current) == {
+        "has_succeeded": False,
+        "message": "Lower",
+    }
+
+
+def test_every_change_to_the_rules_bumps_the_generation(tmp_path):
+    """
+    Test that creating, updating, quarantining and deleting rules each increment the
+    stored generation once, and that changes to unknown rules do not.
+    """
+
+    async def run():
+        engine, sessions = await create_sessions(tmp_path / "rules.db")
+        generations = []
+        async with sessions() as db:
+            generations.append(await async_crud.get_rule_set_generation(db))
+            rule = await async_crud.create_rule(
+                db, RuleCreate(description="Limit", rule="transaction['amount'] < 200")
+            )
+            await async_crud.create_multiple_rules(
+                db, [RuleCreate(description="Other", rule="True")] * 2
+            )
+            await async_crud.update_rule(db, rule.id, RuleUpdate(description="New"))
+            await async_crud.quarantine_rules(db, [(rule.id, rule.rule)])
+            await async_crud.delete_rule(db, rule.id)
+            for change in (
+                async_crud.update_rule(db, 99, RuleUpdate(description="None")),
+                async_crud.quarantine_rules(db, [(99, "True")]),
+                async_crud.delete_rule(db, 99),
+            ):
+                await change
+                generations.append(await async_crud.get_rule_set_generation(db))
+        await engine.dispose()
+        return generations
+
+    assert asyncio.run(run()) == [0, 5, 5, 5]
+
+
+def test_watch_reloads_the_rules_changed_by_another_worker(tmp_path, monkeypatch):
+    """
+    Test that the watcher swaps in the rules changed through another session, without
+    a request of this worker triggering the reload.
+    """
+    monkeypatch.setattr(rule_set, "_current", None)
+
+    async def run():
+        engine, sessions = await create_sessions(tmp_path / "rules.db")
+        async with sessions() as db:
+            loaded = await rule_set.get_or_load_rule_set(db)
+        watcher = asyncio.create_task(rule_set.watch_rule_set(sessions, 0.01))
+        try:
+            # Another worker, with its own engine on the same database
+            other_engine, other = await create_sessions(tmp_path / "rules.db")
+            async with other() as db:
+                await async_crud.create_rule(
+                    db,
+                    RuleCreate(description="Limit", rule="transaction['amount'] < 1"),
+                )
+            await other_engine.dispose()
+            for _ in range(200):
+                if rule_set.get_rule_set() is not loaded:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            watcher.cancel()
+        await engine.dispose()
+        return loaded
+
+    loaded = asyncio.run(run())
+    reloaded = rule_set.get_rule_set()
+    assert (loaded.version, reloaded.version) == (0, 1)
+    assert [rule.description for rule in reloaded.rules] == ["Limit"]
@@ -0,0 +1,94 @@
+import json
+from app.db import crud
+from app.db.session import SessionLocal
+from app.schemas.rule import RuleCreate
+from app.services.rule_set import get_rule_set
+
+
+def create_rules(client, count: int) -> list:
+    response = client.post(
+        "/v0/rules/",
+        json=[
+            {"description": f"Limit {i}", "rule": f"transaction['amount'] < {i}"}
+            for i in range(count)
+        ],
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_rules_are_paged_by_id_through_the_link_header(client):
+    """
+    Test that following the Link header of full pages reads every rule once, in order.
+    """
+    create_rules(client, 5)
+    every = [rule["id"] for rule in client.get("/v0/rules/?limit=1000").json()]
+
+    ids, url = [], "/v0/rules/?limit=2"
+    while url:
+        response = client.get(url)
+        ids += [rule["id"] for rule in response.json()]
+        link = response.headers.get("link")
+        url = link[1 : link.index(">")] if link else None
+    assert ids == every == sorted(every)
+    assert client.get(f"/v0/rules/?after={every[-2]}").json()[0]["id"] == every[-1]
+
+
+def test_rules_are_not_resent_while_the_stored_generation_is_unchanged(client):
+    """
+    Test that If-None-Match is answered 304 for the tag of the same page, and that a
+    change made through another worker changes the tag before this one reloads.
+    """
+    first = client.get("/v0/rules/?limit=2")
+    etag = first.headers["etag"]
+    assert client.get("/v0/rules/?limit=3").headers["etag"] != etag
+
+    cached = client.get("/v0/rules/?limit=2", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    # Another page is sent, although the rules did not change
+    assert (
+        client.get("/v0/rules/?limit=3", headers={"If-None-Match": etag}).status_code
+        == 200
+    )
+
+    # Another worker changes the rules, this one has not reloaded them yet
+    version = get_rule_set().version
+    with SessionLocal() as db:
+        crud.create_rule(db, RuleCreate(description="Other", rule="True"))
+    assert get_rule_set().version == version
+    changed = client.get("/v0/rules/?limit=2", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_rules_export_streams_every_rule_as_ndjson(client):
+    """
+    Test that the export has one rule per line, ordered by ID, and supports
+    If-None-Match.
+    """
+    create_rules(client, 2)
+
+    response = client.get("/v0/rules/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert exported == client.get("/v0/rules/?limit=1000").json()
+
+    etag = response.headers["etag"]
+    cached = client.get("/v0/rules/export", headers={"If-None-Match": f"W/{etag}"})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+
+def test_rules_that_do_not_compile_are_rejected(client):
+    """
+    Test that invalid or unbounded rules are answered 422 and not stored.
+    """
+    count = len(client.get("/v0/rules/?limit=1000").json())
+
+    for rule in ["transaction['amount'] <", "((9 ** 999) ** 999) ** 99 > 0"]:
+        response = client.post("/v0/rules/", json={"description": "Bad", "rule": rule})
+        assert response.status_code == 422
+        assert response.json()["detail"].startswith("Invalid rule 'Bad': ")
+    assert len(client.get("/v0/rules/?limit=1000").json()) == count
@@ -0,0 +1,132 @@
+import asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from app.db import async_crud
+from app.db.models import Base
+from app.schemas.rule import RuleCreate, RuleUpdate
+from app.services.rule_compiler import SHADOW, compile_rule
+from app.services.rule_engine import apply_rule_set
+from app.services.rule_set import build_rule_set
+from app.services.shadow import ShadowEvaluator
+
+transaction = {
+    "transaction_id": "123",
+    "transaction_amount": 100.0,
+    "merchant_id": "456",
+    "client_id": "789",
+    "phone_number": "1234567890",
+    "ip_address": "127.0.0.1",
+    "email_address": "test@example.com",
+    "amount": 1000.0,
+}
+
+rules = (
+    compile_rule(1, "Amount below limit", "transaction['amount'] < 1500000"),
+    compile_rule(2, "Lower limit", "transaction['amount'] < 5000", status=SHADOW),
+    compile_rule(
+        3,
+        "Merchant 456 limit",
+        "transaction['amount'] < 500",
+        "merchant_id:456",
+        SHADOW,
+    ),
+    compile_rule(4, "Broken", "1 / (transaction['amount'] * 0) > 0", status=SHADOW),
+)
+rule_set = build_rule_set(rules, 1)
+
+
+def test_shadow_rules_do_not_decide():
+    """
+    Test that shadow rules are kept apart from the rules deciding on transactions.
+    """
+    assert [rule.id for rule in rule_set.rules] == [1]
+    assert [rule.id for rule in rule_set.shadow] == [2, 3, 4]
+    assert rule_set.fields == {"amount"}
+    check = apply_rule_set({**transaction, "amount": 10000.0}, rule_set)
+    assert check == {"has_succeeded": True, "message": ""}
+
+
+def test_shadow_rules_are_compared_with_live_decisions():
+    """
+    Test that the outcomes of shadow rules are counted against the live decisions, in
+    the background.
+    """
+    evaluator = ShadowEvaluator()
+    checked = [
+        ({**transaction, "amount": 100.0}, True),
+        ({**transaction, "amount": 1000.0}, True),
+        ({**transaction, "amount": 10000.0, "merchant_id": "1"}, True),
+        ({**transaction, "amount": 2000000.0}, False),
+    ]
+
+    async def run():
+        for values, approved in checked:
+            assert evaluator.submit(rule_set, [values], [approved])
+        await evaluator._queue.join()
+        await evaluator.stop()
+
+    asyncio.run(run())
+    stats = evaluator.stats()
+    assert stats["transactions"] == 4
+    assert stats["would_reject"] == 3
+    counts = {rule["rule_id"]: rule for rule in stats["rules"]}
+    assert counts[2]["passed_approved"] == 2
+    assert counts[2]["failed_approved"] == 1
+    assert counts[2]["failed_rejected"] == 1
+    assert counts[2]["agreements"] == 3
+    # The merchant rule only sees the transactions of its merchant
+    assert counts[3]["evaluated"] == 3
+    assert counts[3]["disagreements"] == 1
+    assert counts[4]["errors"] == 4
+    assert counts[4]["failed_approved"] == 3
+
+
+def test_shadow_evaluator_drops_work_when_full():
+    """
+    Test that checks are dropped and counted when the queue is full.
+    """
+    evaluator = ShadowEvaluator(max_queue_size=1)
+
+    async def run():
+        submitted = [
+            evaluator.submit(rule_set, [transaction], [True]) for _ in range(3)
+        ]
+        await evaluator.stop()
+        return submitted
+
+    assert asyncio.run(run()) == [True, False, False]
+    assert evaluator.stats()["dropped"] == 2
+    # Rule sets without shadow rules queue nothing
+    assert ShadowEvaluator().submit(build_rule_set(rules[:1], 1), [transaction], [True])
+
+
+def test_editing_a_shadow_rule_keeps_it_shadow(tmp_path):
+    """
+    Test that updating the logic of a shadow rule does not make it decide.
+    """
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'rules.db'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+        async with sessions() as db:
+            rule = await async_crud.create_rule(
+                db,
+                RuleCreate(
+                    description="Lower limit",
+                    rule="transaction['amount'] < 5000",
+                    status=SHADOW,
+                ),
+            )
+            edited = await async_crud.update_rule(
+                db, rule.id, RuleUpdate(rule="transaction['amount'] < 2000")
+            )
+            edited_status = edited.status
+            promoted = await async_crud.update_rule(
+                db, rule.id, RuleUpdate(status="active")
+            )
+            statuses = (edited_status, promoted.status, promoted.rule)
+        await engine.dispose()
+        return statuses
+
+    assert asyncio.run(run()) == (SHADOW, "active", "transaction['amount'] < 2000")
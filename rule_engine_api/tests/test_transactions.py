@@ -1,25 +1,27 @@
-from fastapi.testclient import TestClient
-from app.main import app
+import asyncio
+import json
+import time
+from app.api.v0.endpoints import transaction
+from app.core.config import settings
+from app.services.rule_executor import THREAD, RuleExecutor
 
-client = TestClient(app)
+transaction_data = {
+    "transaction_id": "123",
+    "transaction_amount": "100",
+    "merchant_id": "456",
+    "client_id": "789",
+    "phone_number": "1234567890",
+    "ip_address": "127.0.0.1",
+    "email_address": "test@example.ci",
+    "amount": 1000,
+}
 
 
-def test_check_transaction_approved():
+def test_check_transaction_approved(client):
     """
     Test the check_transaction endpoint with an approved transaction.
     """
-    transaction_data = {
-        "transaction_id": "123",
-        "transaction_amount": "100",
-        "merchant_id": "456",
-        "client_id": "789",
-        "phone_number": "1234567890",
-        "ip_address": "127.0.0.1",
-        "email_address": "test@example.ci",
-        "amount": 1000,
-    }
-
-    response = client.post("/v0/check-transaction", json=transaction_data)
+    response = client.post("/v0/transactions/check-transaction", json=transaction_data)
 
     assert response.status_code == 200
     assert response.json() == {
@@ -29,23 +31,155 @@ def test_check_transaction_approved():
     }
 
 
-def test_check_transaction_rejected():
+def test_check_transaction_rejected(client):
     """
     Test the check_transaction endpoint with a rejected transaction.
     """
-    transaction_data = {
-        "transaction_id": "123",
+    transaction = {
+        **transaction_data,
         "transaction_amount": "1500001",
-        "merchant_id": "456",
-        "client_id": "789",
-        "phone_number": "1234567890",
-        "ip_address": "127.0.0.1",
         "email_address": "test@example.com",
         "amount": 1500001,
     }
 
-    response = client.post("/v0/check-transaction", json=transaction_data)
+    response = client.post("/v0/transactions/check-transaction", json=transaction)
     response_json = response.json()
-    assert response.status_code == 400
+    # The decision is in the body, the request itself succeeded
+    assert response.status_code == 200
     assert response_json["status"] == "rejected"
     assert response_json["status_code"] == 400
+    assert response_json["message"] == (
+        "Transaction rejected: Transaction amount must be less than 1,500,000\n"
+        "Email address must be from Côte d'Ivoire (ends with .ci domain)"
+    )
+
+
+def test_check_transactions_answers_each_transaction_in_order(client):
+    """
+    Test that the batch endpoint answers as check-transaction does, per transaction.
+    """
+    transactions = [
+        {**transaction_data, "transaction_id": "b1"},
+        {**transaction_data, "transaction_id": "b2", "email_address": "a@b.com"},
+        {**transaction_data, "transaction_id": "b3", "amount": 2_000_000},
+    ]
+
+    response = client.post("/v0/transactions/check-transactions", json=transactions)
+
+    assert response.status_code == 200
+    assert response.json() == [
+        client.post("/v0/transactions/check-transaction", json=transaction).json()
+        for transaction in transactions
+    ]
+    assert [check["status"] for check in response.json()] == [
+        "approved",
+        "rejected",
+        "rejected",
+    ]
+    assert client.post("/v0/transactions/check-transactions", json=[]).json() == []
+
+
+def ndjson(*records) -> str:
+    return "\n".join(json.dumps(record) for record in records) + "\n"
+
+
+def test_ingest_transactions_skips_or_upserts_existing_transactions(client):
+    """
+    Test that a backfill sent again skips the transactions already saved, or
+    overwrites them with on_conflict=upsert, and counts invalid records as failed.
+    """
+    records = [{**transaction_data, "transaction_id": f"ingest-{i}"} for i in range(3)]
+    headers = {"content-type": "application/x-ndjson"}
+    url = "/v0/transactions/ingest-transactions"
+
+    first = client.post(
+        url, params={"chunk_size": 2}, content=ndjson(*records), headers=headers
+    )
+    assert first.status_code == 200
+    assert first.json()["inserted"] == 3
+    assert [chunk["inserted"] for chunk in first.json()["chunks"]] == [2, 1]
+
+    again = client.post(
+        url,
+        content=ndjson(*records, {"transaction_id": "ingest-3"}),
+        headers=headers,
+    )
+    assert again.status_code == 200
+    assert {
+        key: again.json()[key] for key in ("inserted", "updated", "skipped", "failed")
+    } == {"inserted": 0, "updated": 0, "skipped": 3, "failed": 1}
+    assert again.json()["chunks"][0]["errors"][0].startswith("Record 3: ")
+
+    upserted = client.post(
+        url,
+        params={"on_conflict": "upsert"},
+        json=records[:2] + [{**transaction_data, "transaction_id": "ingest-4"}],
+    )
+    assert upserted.status_code == 200
+    assert {
+        key: upserted.json()[key] for key in ("inserted", "updated", "skipped")
+    } == {"inserted": 1, "updated": 2, "skipped": 0}
+
+
+def test_ingest_transactions_reports_the_chunks_saved_before_a_malformed_body(
+    client,
+):
+    """
+    Test that a body that cannot be read to the end is answered 400, with the chunks
+    committed before the error.
+    """
+    record = {**transaction_data, "transaction_id": "ingest-5"}
+    # Cut short after the first record
+    body = f'[{json.dumps(record)}, {{"transaction_id": '
+
+    response = client.post(
+        "/v0/transactions/ingest-transactions",
+        params={"chunk_size": 1},
+        content=body,
+        headers={"content-type": "application/json"},
+    )
+
+    assert response.status_code == 400
+    assert response.json()["inserted"] == 1
+    assert "records from position 1 on were not saved" in response.json()["error"]
+
+
+def test_check_batch_gives_the_fallback_only_to_the_transactions_not_evaluated(
+    monkeypatch,
+):
+    """
+    Test that past the deadline of a batch, the chunks already evaluated keep their
+    decisions, and that the deadline of a large batch is capped.
+    """
+
+    def apply_rule_set_batch(transactions, rule_set):
+        if any(transaction["amount"] < 0 for transaction in transactions):
+            time.sleep(1)
+        return [{"has_succeeded": True, "message": "Evaluated"} for _ in transactions]
+
+    submitted = []
+    monkeypatch.setattr(transaction, "apply_rule_set_batch", apply_rule_set_batch)
+    monkeypatch.setattr(transaction, "rule_executor", RuleExecutor(THREAD))
+    monkeypatch.setattr(
+        transaction.cost_guard,
+        "submit",
+        lambda rule_set, checks: submitted.extend(checks),
+    )
+    monkeypatch.setattr(settings, "evaluation_deadline_ms", 100.0)
+    monkeypatch.setattr(settings, "evaluation_batch_deadline_ms", 200.0)
+    monkeypatch.setattr(settings, "evaluation_batch_chunk_size", 2)
+    monkeypatch.setattr(settings, "evaluation_fallback", "reject")
+    transactions = [{"amount": amount} for amount in (1, 2, 3, 4, -1, 5)]
+
+    start = time.perf_counter()
+    checks = asyncio.run(transaction.check_batch(transactions, None))
+    elapsed = time.perf_counter() - start
+    transaction.rule_executor.shutdown()
+
+    assert [check["message"] for check in checks] == ["Evaluated"] * 4 + [
+        transaction.DEADLINE_MESSAGE
+    ] * 2
+    assert [check.get("fallback") for check in checks] == [None] * 4 + [True] * 2
+    assert submitted == transactions[4:]
+    # 200ms for the batch, not 100ms for each of its transactions
+    assert elapsed < 0.5
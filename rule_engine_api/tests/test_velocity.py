@@ -0,0 +1,143 @@
+import pytest
+from app.services.batch_engine import apply_rules_batch, build_batch_plan
+from app.services.rule_compiler import RuleCompileError, compile_rule
+from app.services.rule_engine import apply_rule_set, apply_rules
+from app.services.rule_set import assemble_rule_set
+from app.services.velocity import Feature, VelocityStore, parse_window
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_transaction(index, client_id="c1", amount=100.0):
+    return {"transaction_id": str(index), "client_id": client_id, "amount": amount}
+
+
+count_10m = Feature("count", "client_id", 600)
+total_10m = Feature("total", "client_id", 600)
+
+
+def test_parse_window():
+    assert parse_window("30s") == 30
+    assert parse_window("10m") == 600
+    assert parse_window("2h") == 7200
+    with pytest.raises(ValueError):
+        parse_window("0s")
+    with pytest.raises(ValueError):
+        parse_window("ten minutes")
+
+
+def test_store_counts_and_totals_per_key_within_the_window():
+    clock = FakeClock()
+    store = VelocityStore(buckets=60, clock=clock)
+    features = (count_10m, total_10m)
+
+    for index in range(3):
+        store.record(make_transaction(index), features)
+        clock.now += 60
+    store.record(make_transaction(3, client_id="c2", amount=5.0), features)
+
+    assert store.lookup(make_transaction(9), features) == {
+        "count:client_id:600": 3,
+        "total:client_id:600": 300.0,
+    }
+    assert store.lookup(make_transaction(9, client_id="c2"), features) == {
+        "count:client_id:600": 1,
+        "total:client_id:600": 5.0,
+    }
+
+    # The first transaction leaves the window 10 minutes after it was recorded
+    clock.now = 1000.0 + 600 + 10
+    assert store.lookup(make_transaction(9), features)["count:client_id:600"] == 2
+    clock.now += 3600
+    assert store.lookup(make_transaction(9), features)["count:client_id:600"] == 0
+
+
+def test_store_counts_a_transaction_id_once():
+    store = VelocityStore(clock=FakeClock())
+
+    store.record(make_transaction(1), (count_10m,))
+    store.record(make_transaction(1), (count_10m,))
+
+    assert store.lookup(make_transaction(1), (count_10m,)) == {"count:client_id:600": 1}
+
+
+def test_store_evicts_idle_and_least_recently_updated_keys():
+    clock = FakeClock()
+    store = VelocityStore(max_keys=2, clock=clock)
+
+    for index, client_id in enumerate(["c1", "c2", "c3"]):
+        store.record(make_transaction(index, client_id), (count_10m,))
+
+    assert store.stats()["keys"] == 2
+    assert store.stats()["evictions"] == 1
+    assert store.lookup(make_transaction(9, "c1"), (count_10m,)) == {
+        "count:client_id:600": 0
+    }
+
+    # Keys with nothing left in their window are dropped without counting evictions
+    clock.now += 3600
+    store.record(make_transaction(9, "c4"), (count_10m,))
+    assert store.stats()["keys"] == 1
+    assert store.stats()["evictions"] == 1
+
+
+def test_velocity_rules_compile_to_feature_fields():
+    rule = compile_rule(1, "At most 2 per 10 minutes", "count(client_id, '10m') <= 2")
+
+    assert rule.fields == {"count:client_id:600"}
+    assert rule.fn({"count:client_id:600": 2}) is True
+    assert rule.fn({"count:client_id:600": 3}) is False
+
+
+@pytest.mark.parametrize(
+    "source",
+    [
+        "count(client_id) > 1",
+        "count('client_id', '10m') > 1",
+        "count(amount, '10m') > 1",
+        "count(unknown, '10m') > 1",
+        "total(client_id, '10 minutes') > 1",
+        "total(client_id, '30d') > 1",
+    ],
+)
+def test_velocity_rules_reject_invalid_arguments(source):
+    with pytest.raises(RuleCompileError):
+        compile_rule(1, "Invalid", source)
+
+
+def test_velocity_rules_evaluate_alike_on_every_path():
+    rules = [
+        compile_rule(1, "Few transactions", "count(client_id, '10m') <= 2"),
+        compile_rule(2, "Small total", "total(merchant_id, '1h') < 1000"),
+        compile_rule(3, "Small amount", "transaction['amount'] < 500"),
+    ]
+    rule_set = assemble_rule_set(rules, 1)
+    assert rule_set.features == (
+        Feature("count", "client_id", 600),
+        Feature("total", "merchant_id", 3600),
+    )
+
+    store = VelocityStore(clock=FakeClock())
+    transactions = [
+        store.observe(
+            {**make_transaction(index, amount=300.0), "merchant_id": "m1"},
+            rule_set.features,
+        )
+        for index in range(4)
+    ]
+
+    expected = [apply_rules(transaction, rules) for transaction in transactions]
+    assert [check["has_succeeded"] for check in expected] == [
+        True,
+        True,
+        False,
+        False,
+    ]
+    assert [apply_rule_set(t, rule_set) for t in transactions] == expected
+    assert apply_rules_batch(transactions, build_batch_plan(rules)) == expected
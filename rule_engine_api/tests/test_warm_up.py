@@ -0,0 +1,36 @@
+import asyncio
+from app.main import warm_up_transaction
+from app.services.rule_compiler import compile_rule
+from app.services.rule_executor import PROCESS, RuleExecutor
+from app.services.rule_set import build_rule_set
+
+
+def test_warm_up_evaluates_velocity_and_list_rules_in_worker_processes():
+    """
+    Test that the warm-up transaction has the features and lookups of the rule set,
+    which the worker processes read as fields, and is not counted in the windows.
+    """
+    rule_set = build_rule_set(
+        [
+            compile_rule(1, "At most 2 per hour", "count(client_id, '1h') <= 2"),
+            compile_rule(
+                2,
+                "Not blocked",
+                "not in_list('blocked_ips', transaction['ip_address'])",
+            ),
+        ],
+        -19,
+    )
+    blank = warm_up_transaction(rule_set)
+    assert blank["count:client_id:3600"] == 0
+    # An unknown list fails its rule, not the warm-up
+    assert "in_list:blocked_ips:ip_address" in blank
+    assert warm_up_transaction(rule_set)["count:client_id:3600"] == 0
+
+    executor = RuleExecutor(PROCESS, max_workers=1)
+    try:
+        check = asyncio.run(executor.evaluate(blank, rule_set, "full"))
+    finally:
+        executor.shutdown()
+    assert check["has_succeeded"] is False
+    assert check["message"] == "'Not blocked' ==> Unknown list 'blocked_ips'"
@@ -0,0 +1,74 @@
+import asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from app.db.models import Base
+from app.services.write_behind import TransactionWriter
+
+record = {
+    "transaction_id": "1",
+    "transaction_amount": 1.0,
+    "merchant_id": "1",
+    "client_id": "1",
+    "phone_number": "1234567890",
+    "ip_address": "127.0.0.1",
+    "email_address": "a@b.ci",
+    "amount": 1.0,
+}
+
+
+def test_stop_flushes_queued_transactions(tmp_path):
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'wb.db'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        writer = TransactionWriter(async_sessionmaker(engine), flush_interval=0.01)
+        ids = await asyncio.gather(
+            writer.submit(record, wait_for_flush=True),
+            writer.submit({**record, "transaction_id": "2"}, wait_for_flush=False),
+        )
+        await writer.stop()
+        await engine.dispose()
+        return ids
+
+    assert asyncio.run(run()) == [1, None]
+
+
+def test_stop_does_not_hang_when_the_flush_task_died(caplog):
+    async def run():
+        writer = TransactionWriter(None, stop_timeout=0.5)
+        await writer.submit(record, wait_for_flush=False)
+        # The flush task dies before taking the transaction off the queue
+        writer._task.cancel()
+        await asyncio.sleep(0)
+        future = asyncio.get_running_loop().create_future()
+        writer._queue.put_nowait(({**record, "transaction_id": "2"}, future))
+        await asyncio.wait_for(writer.stop(), timeout=5)
+        return future
+
+    future = asyncio.run(run())
+    assert isinstance(future.exception(), RuntimeError)
+    assert "Dropped 2 queued transactions on shutdown: 1, 2" in caplog.text
+
+
+class HangingSession:
+    async def __aenter__(self):
+        await asyncio.Event().wait()
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+
+def test_stop_fails_the_batch_of_a_flush_cut_short(caplog):
+    async def run():
+        writer = TransactionWriter(
+            HangingSession, flush_interval=0.01, stop_timeout=0.2
+        )
+        submitted = asyncio.create_task(writer.submit(record, wait_for_flush=True))
+        await asyncio.sleep(0.05)
+        # The flush in progress is cancelled on shutdown
+        await asyncio.wait_for(writer.stop(), timeout=5)
+        await asyncio.sleep(0)
+        return submitted
+
+    submitted = asyncio.run(run())
+    assert isinstance(submitted.exception(), RuntimeError)
+    assert "Dropped 1 queued transactions on shutdown: 1" in caplog.text